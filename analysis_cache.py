@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """
+    Persistent on-disk cache of parsed receipt JSON keyed by image content hash.
+
+    An entry's file mtime is its last use (refreshed on every hit); it decides both expiry
+    and which entries are evicted first. The directory is only scanned when the running
+    count/size passes a limit or evict_interval has passed, and eviction then goes down to
+    90% of the limits so the next scan is many writes away.
+    """
+
+    LOW_WATER = 0.9
+
+    def __init__(self, cache_dir=".analysis_cache", max_entries=5000, max_bytes=50 * 1024 * 1024, max_age_days=180,
+                 evict_interval=3600.0):
+        """
+        Args:
+            cache_dir: Directory holding one JSON file per cache entry
+            max_entries: Maximum number of entries kept
+            max_bytes: Maximum total size of the cache directory
+            max_age_days: Entries not used for this long are discarded
+            evict_interval: Seconds between directory scans for expired entries
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 86400
+        self.evict_interval = evict_interval
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Running totals since the last scan (None: not scanned yet)
+        self.entry_count = None
+        self.total_bytes = 0
+        self.last_evict = 0.0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash, version_tag):
+        """Combines the content hash with a prompt/model version tag."""
+        tag = hashlib.sha256(version_tag.encode('utf-8')).hexdigest()[:16]
+        return f"{content_hash}-{tag}"
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached data for a key, or None if missing or expired."""
+        path = self._entry_path(key)
+        with self.lock:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            except Exception as e:
+                logging.warning(f"Corrupt analysis cache entry {key}: {e}")
+                self._remove(path)
+                self.misses += 1
+                return None
+            try:
+                expired = time.time() - os.path.getmtime(path) > self.max_age_seconds
+            except OSError:
+                expired = True
+            if expired:
+                self._remove(path)
+                self.misses += 1
+                return None
+            self.hits += 1
+            try:
+                # 최근 사용 시각 갱신 (용량 초과 시 오래 안 쓴 항목부터 삭제)
+                os.utime(path, None)
+            except OSError:
+                pass
+            return entry.get("data")
+
+    def put(self, key, data):
+        """Stores data for a key and evicts old entries if limits are exceeded."""
+        path = self._entry_path(key)
+        tmp_path = path + ".tmp"
+        entry = {"created": time.time(), "data": data}
+        with self.lock:
+            try:
+                old_size = os.path.getsize(path) if os.path.exists(path) else None
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entry, f, ensure_ascii=False)
+                size = os.path.getsize(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logging.error(f"Error saving analysis cache entry: {e}")
+                self._remove(tmp_path)
+                return
+            if self.entry_count is not None:
+                self.entry_count += 1 if old_size is None else 0
+                self.total_bytes += size - (old_size or 0)
+            if (self.entry_count is None or self.entry_count > self.max_entries or self.total_bytes > self.max_bytes
+                    or time.time() - self.last_evict >= self.evict_interval):
+                self._evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        # Caller holds self.lock
+        now = time.time()
+        self.last_evict = now
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age_seconds:
+                self._remove(entry.path)
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        entries.sort(reverse=True)
+        if len(entries) > self.max_entries or total_bytes > self.max_bytes:
+            max_entries = int(self.max_entries * self.LOW_WATER)
+            max_bytes = int(self.max_bytes * self.LOW_WATER)
+            while entries and (len(entries) > max_entries or total_bytes > max_bytes):
+                _, size, path = entries.pop()
+                self._remove(path)
+                total_bytes -= size
+        self.entry_count = len(entries)
+        self.total_bytes = total_bytes
+
+    def get_count(self):
+        """Returns the number of cached entries."""
+        with self.lock:
+            return sum(1 for name in os.listdir(self.cache_dir) if name.endswith(".json"))
@@ -56,7 +56,7 @@ class FileArchiver:
             return None
 
     def is_in_archive(self, filepath):
-        """Checks if a file is already within the Archive structure."""
-        abs_path = os.path.abspath(filepath)
-        abs_archive = os.path.abspath(self.archive_root)
-        return abs_path.startswith(abs_archive)
+        """Checks if a file (or directory) is already within the Archive structure."""
+        abs_path = os.path.normcase(os.path.abspath(filepath))
+        abs_archive = os.path.normcase(os.path.abspath(self.archive_root))
+        return abs_path == abs_archive or abs_path.startswith(abs_archive + os.sep)
@@ -0,0 +1,236 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from notion_api import NotionClient, RequestRetry, endpoint_name
+from retry_policy import RetryPolicy
+from stability import file_signature
+
+async def wait_until_stable_async(filepath, initial_delay=0.5, max_delay=10.0, max_wait=120.0):
+    """
+    Async variant of stability.wait_until_stable: polls size/mtime with exponential backoff.
+
+    Returns:
+        True once size/mtime are unchanged between two polls, False on timeout
+    """
+    deadline = time.monotonic() + max_wait
+    delay = initial_delay
+    last_sig = file_signature(filepath)
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        sig = file_signature(filepath)
+        if sig is not None and sig == last_sig:
+            return True
+        last_sig = sig
+        delay = min(delay * 2, max_delay)
+    return False
+
+class AsyncNotionClient:
+    """Notion API client over a shared httpx.AsyncClient, with the same retry rules as NotionClient."""
+
+    def __init__(self, token: str, max_connections: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 30.0, base_url: str = None, rate_limiter=None,
+                 retry_policies: Optional[Dict[str, RetryPolicy]] = None):
+        """
+        Args:
+            token: Notion integration token
+            max_connections: Maximum number of kept-alive connections
+            connect_timeout/read_timeout: Timeouts in seconds
+            base_url: Override of the API base URL (used by tests)
+            rate_limiter: Optional TokenBucket, may be shared with the blocking NotionClient
+            retry_policies: Retry budgets by endpoint name, with a "default" entry
+        """
+        self.base_url = (base_url or NotionClient.BASE_URL).rstrip("/")
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Notion-Version": NotionClient.NOTION_VERSION
+        }
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.rate_limiter = rate_limiter
+        self.retry_policies = retry_policies or {"default": RetryPolicy()}
+        self.request_count = 0
+        self.retry_count = 0
+
+    def url(self, path: str) -> str:
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def request(self, method: str, path: str,
+                      applied_check: Optional[Callable[[], Awaitable[Optional[dict]]]] = None,
+                      **kwargs) -> httpx.Response:
+        """
+        Sends a request, retrying throttling and transient errors (see NotionClient.request).
+
+        applied_check is awaited after an ambiguous page-create failure and must return
+        the created page if the write went through.
+        """
+        url = self.url(path)
+        policy = self.retry_policies.get(endpoint_name(method, path)) or self.retry_policies["default"]
+        retry = RequestRetry(policy, method, path, self.rate_limiter, applied_check is not None)
+        while True:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            self.request_count += 1
+            response, error = None, None
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+
+            step = retry.next_step(response, error, isinstance(error, httpx.ConnectTimeout))
+            if step is None:
+                return response
+            if step == RequestRetry.STOP:
+                break
+            if step == RequestRetry.CHECK:
+                page = await applied_check()
+                if page:
+                    logging.info(f"{method} {path}: write was applied despite the error, not retrying")
+                    return httpx.Response(200, json=page, request=httpx.Request(method, url))
+
+            self.retry_count += 1
+            await asyncio.sleep(retry.advance(error or f"HTTP {response.status_code}"))
+
+        if error is not None:
+            raise error
+        return response
+
+    async def post(self, path: str, json=None, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, json=json, **kwargs)
+
+    async def patch(self, path: str, json=None, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", path, json=json, **kwargs)
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+class AsyncReceiptEngine:
+    """
+    Runs an asyncio event loop in a background thread.
+
+    Other threads (watchdog observer, periodic scan) only hand file paths to submit();
+    the coroutine given as `process` then runs on the loop for each file.
+    """
+
+    def __init__(self, process: Callable[[str], Awaitable[None]], max_in_flight: int = 200):
+        """
+        Args:
+            process: Coroutine function called with the absolute path of each file
+            max_in_flight: Maximum number of files being processed at once; submit()
+                           blocks beyond that (backpressure)
+        """
+        self.process = process
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.accepting = False
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        """Starts the event loop thread."""
+        if self.thread:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="async-receipt-engine", daemon=True)
+        self.thread.start()
+        ready.wait()
+        self.accepting = True
+        logging.info(f"Async receipt engine started (max {self.max_in_flight} files in flight)")
+
+    def run(self, coro, timeout=None):
+        """Runs a coroutine on the engine loop from another thread and returns its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, filepath, timeout=None):
+        """
+        Schedules a file on the event loop. Files already in flight are ignored.
+
+        Returns:
+            True if the file was scheduled, False otherwise
+        """
+        abs_path = os.path.abspath(filepath)
+        with self.lock:
+            if not self.accepting or abs_path in self.in_flight:
+                return False
+            self.in_flight.add(abs_path)
+        if not self.slots.acquire(timeout=timeout):
+            with self.lock:
+                self.in_flight.discard(abs_path)
+                self.idle.notify_all()
+            logging.warning(f"[대기열 가득 참] 나중에 다시 시도: {abs_path}")
+            return False
+        asyncio.run_coroutine_threadsafe(self._run(abs_path), self.loop)
+        return True
+
+    def is_in_flight(self, filepath):
+        with self.lock:
+            return os.path.abspath(filepath) in self.in_flight
+
+    def pending_count(self):
+        with self.lock:
+            return len(self.in_flight)
+
+    async def _run(self, abs_path):
+        try:
+            await self.process(abs_path)
+        except Exception as e:
+            logging.exception(f"Async pipeline error processing {abs_path}: {e}")
+        finally:
+            self.slots.release()
+            with self.lock:
+                self.in_flight.discard(abs_path)
+                self.idle.notify_all()
+
+    def shutdown(self, wait=True, timeout=None, cleanup=None):
+        """
+        Stops accepting files, optionally waits for in-flight files, then stops the loop.
+
+        Args:
+            wait: Wait for files already in flight to finish
+            timeout: Maximum seconds to wait for them
+            cleanup: Optional coroutine function run on the loop before it stops
+                     (e.g. closing HTTP clients)
+        """
+        with self.lock:
+            self.accepting = False
+            if wait:
+                self.idle.wait_for(lambda: not self.in_flight, timeout)
+        if self.loop is None:
+            return
+        if cleanup is not None:
+            try:
+                self.run(cleanup(), timeout)
+            except Exception as e:
+                logging.error(f"Async engine cleanup failed: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        if not self.loop.is_running():
+            self.loop.close()
+        self.thread = None
+        logging.info("Async receipt engine stopped.")
@@ -0,0 +1,217 @@
+import io
+import os
+import json
+import time
+import logging
+import threading
+
+from openai.types.chat import ChatCompletion
+
+class BatchImporter:
+    """
+    Bulk analysis of old receipts through the OpenAI Batch API.
+
+    Every batch and the files in it are recorded in a JSON manifest, so an interrupted
+    import resumes where it stopped: submitted files are not submitted again, unfinished
+    batches are polled again and results that were already handled are skipped. A file
+    whose result could not be handled is submitted again by the next run.
+    """
+
+    TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+    ENDPOINT = "/v1/chat/completions"
+
+    def __init__(self, client, manifest_path=".batch_import.json", max_files_per_batch=500,
+                 max_bytes_per_batch=190 * 1024 * 1024, poll_interval=60.0, sleep=time.sleep):
+        """
+        Args:
+            client: OpenAI client
+            manifest_path: JSON file recording the batches and the state of each file
+            max_files_per_batch: Files per batch job
+            max_bytes_per_batch: Size of a batch input file (the API rejects files over 200 MB);
+                                 every line carries a whole image, so this is usually the limit that applies
+            poll_interval: Seconds between batch status checks
+            sleep: Injectable for tests
+        """
+        self.client = client
+        self.manifest_path = manifest_path
+        self.max_files_per_batch = max(1, int(max_files_per_batch))
+        self.max_bytes_per_batch = max(1, int(max_bytes_per_batch))
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.manifest = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return {"jobs": []}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Cannot read batch manifest {self.manifest_path}: {e}")
+
+    def _save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def jobs(self):
+        return self.manifest["jobs"]
+
+    def known_paths(self):
+        """Returns the absolute paths of every file already in a batch, except failed ones."""
+        return {entry["path"] for job in self.jobs for entry in job["files"].values() if entry["state"] != "failed"}
+
+    def submit(self, filepaths, build_request):
+        """
+        Submits the files that are not in the manifest yet, or whose result handling
+        failed last time. A new batch is started before one would go over
+        max_files_per_batch files or max_bytes_per_batch bytes.
+
+        Args:
+            filepaths: Candidate image paths
+            build_request: build_request(path) -> chat.completions.create arguments,
+                           or None to leave the file out
+
+        Returns:
+            Number of files submitted
+        """
+        known = self.known_paths()
+        pending = [path for path in dict.fromkeys(os.path.abspath(path) for path in filepaths) if path not in known]
+        submitted = 0
+        entry_count = sum(len(job["files"]) for job in self.jobs)
+        lines = []
+        files = {}
+        size = 0
+        for path in pending:
+            try:
+                body = build_request(path)
+            except Exception as e:
+                logging.warning(f"[배치] 요청 생성 실패, 제외: {path} ({e})")
+                continue
+            if body is None:
+                continue
+            custom_id = f"receipt-{entry_count + submitted + len(files)}"
+            line = (json.dumps({"custom_id": custom_id, "method": "POST", "url": self.ENDPOINT, "body": body},
+                               ensure_ascii=False) + "\n").encode("utf-8")
+            if len(line) > self.max_bytes_per_batch:
+                logging.warning(f"[배치] 요청이 배치 파일 크기 제한보다 큼, 제외: {path} ({len(line) / 1024 / 1024:.1f} MB)")
+                continue
+            if files and (len(files) >= self.max_files_per_batch or size + len(line) > self.max_bytes_per_batch):
+                # custom_id stays the same: the flushed files move from `files` to `submitted`
+                submitted += self._submit_chunk(lines, files)
+                lines, files, size = [], {}, 0
+            files[custom_id] = {"path": path, "state": "submitted"}
+            lines.append(line)
+            size += len(line)
+        if files:
+            submitted += self._submit_chunk(lines, files)
+        return submitted
+
+    def _submit_chunk(self, lines, files):
+        """Uploads one JSONL input file, creates its batch and records it. Returns the number of files."""
+        data = b"".join(lines)
+        input_file = self.client.files.create(file=("receipts.jsonl", io.BytesIO(data)), purpose="batch")
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=self.ENDPOINT,
+                                           completion_window="24h")
+        with self.lock:
+            self.jobs.append({"batch_id": batch.id, "input_file_id": input_file.id, "status": batch.status,
+                              "output_file_id": None, "error_file_id": None, "files": files})
+            self._save()
+        logging.info(f"[배치] {batch.id}: {len(files)}개 파일 제출 ({len(data) / 1024 / 1024:.1f} MB)")
+        return len(files)
+
+    def unfinished_jobs(self):
+        return [job for job in self.jobs if job["status"] not in self.TERMINAL_STATUSES]
+
+    def poll(self):
+        """Updates the status of unfinished batches. Returns the number still running."""
+        for job in self.unfinished_jobs():
+            batch = self.client.batches.retrieve(job["batch_id"])
+            with self.lock:
+                job["status"] = batch.status
+                job["output_file_id"] = batch.output_file_id
+                job["error_file_id"] = batch.error_file_id
+                self._save()
+            counts = batch.request_counts
+            done = f" ({counts.completed + counts.failed}/{counts.total})" if counts else ""
+            logging.info(f"[배치] {job['batch_id']}: {batch.status}{done}")
+        return len(self.unfinished_jobs())
+
+    def wait(self, timeout=None):
+        """
+        Polls until every batch has finished.
+
+        Returns:
+            True if all batches finished, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self.sleep(self.poll_interval)
+        return True
+
+    def _read_results(self, file_id):
+        """Returns {custom_id: output line} of a batch output or error file."""
+        if not file_id:
+            return {}
+        results = {}
+        for line in self.client.files.content(file_id).text.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                results[record["custom_id"]] = record
+        return results
+
+    def handle_results(self, handle):
+        """
+        Hands every finished, not yet handled file to `handle`, in submission order.
+
+        Args:
+            handle: handle(path, completion) with the file's ChatCompletion, or None if
+                    the batch produced no usable answer for it. Returns True once the file
+                    is done with; False (or an exception) marks it failed, so the next
+                    submit() sends it again
+
+        Returns:
+            Number of files handled
+        """
+        handled = 0
+        for job in self.jobs:
+            if job["status"] not in self.TERMINAL_STATUSES:
+                continue
+            waiting = [(custom_id, entry) for custom_id, entry in job["files"].items() if entry["state"] == "submitted"]
+            if not waiting:
+                continue
+            results = self._read_results(job["output_file_id"])
+            results.update(self._read_results(job["error_file_id"]))
+            for custom_id, entry in waiting:
+                completion = None
+                record = results.get(custom_id)
+                response = (record or {}).get("response") or {}
+                if response.get("status_code") == 200:
+                    completion = ChatCompletion.model_validate(response["body"])
+                else:
+                    error = (record or {}).get("error") or response.get("body") or job["status"]
+                    logging.warning(f"[배치] 결과 없음: {entry['path']} ({error})")
+                try:
+                    if handle(entry["path"], completion):
+                        entry["state"] = "done"
+                    else:
+                        logging.warning(f"[배치] 업로드 실패, 다음 실행에서 다시 제출: {entry['path']}")
+                        entry["state"] = "failed"
+                        entry["error"] = "not uploaded"
+                except Exception as e:
+                    logging.exception(f"[배치] 결과 처리 실패: {entry['path']}: {e}")
+                    entry["state"] = "failed"
+                    entry["error"] = str(e)
+                with self.lock:
+                    self._save()
+                handled += 1
+        return handled
+
+    def pending_count(self):
+        """Number of submitted files whose result has not been handled yet."""
+        return sum(1 for job in self.jobs for entry in job["files"].values() if entry["state"] == "submitted")
@@ -0,0 +1,91 @@
+"""
+Memory / load-time / lookup benchmark for the processed-file history.
+
+Compares the old in-memory set of path strings (loaded from the flat .processed_history
+file) with the FingerprintSet used by HistoryManager (loaded from its saved snapshot or
+rebuilt from the database).
+
+    python bench_history.py [N]      (default N = 200000)
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import sqlite3
+import tracemalloc
+
+from fingerprint_set import path_fingerprint
+from history_manager import HistoryManager
+
+PREFIX = "C:\\Users\\household\\OneDrive\\사진\\카메라 앨범"
+
+
+def make_paths(n):
+    return [f"{PREFIX}\\{2015 + i % 10}\\{1 + i % 12:02d}\\IMG_{20150101 + i}_{i:06d}.jpg" for i in range(n)]
+
+
+def measure(label, load):
+    """Runs load() under tracemalloc; returns the loaded object."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{label:<34} load {elapsed * 1000:8.1f} ms   kept {current / 2**20:7.1f} MiB   peak {peak / 2**20:7.1f} MiB")
+    return result
+
+
+def time_lookups(label, contains, probes):
+    start = time.perf_counter()
+    hits = sum(1 for path in probes if contains(path))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / len(probes) * 1e6:6.2f} µs/lookup ({hits} hits)")
+
+
+def main(n):
+    paths = make_paths(n)
+    print(f"{n} paths, average length {sum(map(len, paths)) // n} characters\n")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history_file = os.path.join(tmpdir, ".processed_history")
+        with open(history_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(paths) + "\n")
+        # Builds the database (flat-file import), then saves the snapshot on close
+        HistoryManager(history_file=history_file).close()
+
+        def load_flat():
+            with open(history_file, "r", encoding="utf-8") as f:
+                return set(line.strip() for line in f if line.strip())
+
+        def load_rebuild():
+            # As after a crash: the snapshot is marked stale
+            with sqlite3.connect(history_file + ".db") as conn:
+                conn.execute("UPDATE meta SET value = '0' WHERE key = 'snapshot_valid'")
+            conn.close()
+            manager = HistoryManager(history_file=history_file)
+            fingerprints = manager.fingerprints
+            manager.close()
+            return fingerprints
+
+        def load_snapshot():
+            manager = HistoryManager(history_file=history_file)
+            fingerprints = manager.fingerprints
+            manager.conn.close()
+            return fingerprints
+
+        path_set = measure("set of str (flat file)", load_flat)
+        measure("FingerprintSet (rebuilt from db)", load_rebuild)
+        fingerprints = measure("FingerprintSet (snapshot)", load_snapshot)
+        print(f"\nFingerprintSet table: {len(fingerprints.table) * 8 / 2**20:.1f} MiB for {len(fingerprints)} entries")
+
+        rng = random.Random(1)
+        probes = rng.sample(paths, min(n, 50000)) + [path + ".new" for path in rng.sample(paths, min(n, 50000))]
+        print()
+        time_lookups("set of str", path_set.__contains__, probes)
+        time_lookups("FingerprintSet", lambda path: path_fingerprint(path) in fingerprints, probes)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
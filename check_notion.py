@@ -4,18 +4,12 @@
 """
 import os
 import json
-import requests
 from dotenv import load_dotenv
+from notion_api import NotionClient
 
 load_dotenv()
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
-BASE = "https://api.notion.com/v1"
-HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28",
-}
 
 def main():
     print("=" * 60)
@@ -26,10 +20,11 @@ def main():
         return
     print(f"NOTION_DATABASE_ID: {NOTION_DATABASE_ID[:8]}...")
     print()
+    notion = NotionClient(NOTION_TOKEN)
 
     # 1. DB 스키마 조회
     print("[1] 데이터베이스 스키마 조회 (GET /databases/{id})")
-    r = requests.get(f"{BASE}/databases/{NOTION_DATABASE_ID}", headers=HEADERS)
+    r = notion.get(f"/databases/{NOTION_DATABASE_ID}")
     print(f"    상태 코드: {r.status_code}")
     if r.status_code != 200:
         print(f"    응답: {r.text[:500]}")
@@ -82,7 +77,7 @@ def main():
             "사용처": {"rich_text": [{"text": {"content": "테스트 매장"}}]},
         },
     }
-    r2 = requests.post(f"{BASE}/pages", headers=HEADERS, json=payload)
+    r2 = notion.post("/pages", json=payload)
     print(f"    상태 코드: {r2.status_code}")
     if r2.status_code != 200:
         print(f"    응답 본문: {r2.text}")
@@ -100,6 +95,9 @@ def main():
         return
     print("    성공: 테스트 페이지가 생성되었습니다. (노션에서 '[진단] 테스트 항목' 페이지 삭제 가능)")
     print()
+    stats = notion.get_stats()
+    print(f"[3] HTTP 연결: 요청 {stats['requests']}회, 새 연결 {stats['connections_opened']}개, 재사용 {stats['connections_reused']}회")
+    print()
     print("=" * 60)
     print("진단 완료. 위에서 속성 이름/타입이 OK가 아니거나 페이지 생성이 실패한 항목을 수정하세요.")
     print("=" * 60)
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import logging
+
+class SnapshotDiff:
+    """Changes found by one scan, named like watchdog's DirectorySnapshotDiff."""
+
+    def __init__(self, full=False):
+        self.full = full
+        self.files_created = []
+        self.files_modified = []
+        self.files_moved = []    # (src, dest)
+        self.files_deleted = []
+
+    def paths_to_check(self):
+        """Files that may hold a new receipt: created, modified and move destinations."""
+        return self.files_created + self.files_modified + [dest for src, dest in self.files_moved]
+
+    def __len__(self):
+        return len(self.files_created) + len(self.files_modified) + len(self.files_moved) + len(self.files_deleted)
+
+    def __str__(self):
+        return (f"{len(self.files_created)} created, {len(self.files_modified)} modified, "
+                f"{len(self.files_moved)} moved, {len(self.files_deleted)} deleted")
+
+class IncrementalScanner:
+    """
+    Persisted directory snapshot that is brought up to date without walking all of it.
+
+    Each directory's mtime, its matching files (size, mtime, inode) and its subdirectories
+    are saved in a JSON file. A scan diffs the tree against it, also across restarts, so
+    changes made while the program was down are caught up. A directory whose mtime did not
+    change is not listed again; only its known subdirectories are stat'ed, because a change
+    deeper in the tree does not touch the parent's mtime. Directories in `exclude_dirs`
+    (the archive) are never entered. A file that disappears and shows up elsewhere with the
+    same inode is reported as moved. A directory that cannot be read for a moment (access
+    denied, sync lock) keeps its cached entry instead of being reported as emptied.
+
+    Rewriting a file in place does not change its directory's mtime; the periodic full
+    scan, which lists every directory, catches that.
+    """
+
+    VERSION = 2
+
+    RECENT_NS = 2 * 10**9
+
+    def __init__(self, root, cache_path=".scan_cache.json", exclude_dirs=(), match=None,
+                 full_scan_interval=3600.0, clock=time.monotonic):
+        """
+        Args:
+            root: Directory to scan
+            cache_path: JSON file with the per-directory cache (None: memory only)
+            exclude_dirs: Directories that are skipped with everything below them
+            match: match(filename) -> bool, files to report (default: all)
+            full_scan_interval: Seconds between full scans (0: only when asked)
+            clock: Injectable for tests
+        """
+        self.root = os.path.abspath(root)
+        self.cache_path = cache_path
+        self.exclude_dirs = {os.path.normcase(os.path.abspath(d)) for d in exclude_dirs}
+        self.match = match or (lambda name: True)
+        self.full_scan_interval = full_scan_interval
+        self.clock = clock
+        self.last_full_scan = clock()
+        # relative dir path ("" = root) -> {"mtime": ns, "files": {name: [size, mtime ns, inode]}, "subdirs": [names]}
+        self.dirs = self._load()
+        self.dirty = False
+        self.stats = {"scans": 0, "full_scans": 0, "dirs_listed": 0, "dirs_skipped": 0, "changes": 0}
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable scan cache {self.cache_path}: {e}")
+            return {}
+        if cache.get("root") != self.root or cache.get("version") != self.VERSION:
+            return {}
+        return cache.get("dirs", {})
+
+    def save(self):
+        """Writes the cache if a scan changed it."""
+        if not self.cache_path or not self.dirty:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "root": self.root, "dirs": self.dirs}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+    def scan(self, full=None):
+        """
+        Args:
+            full: List every directory, not only those whose mtime changed (default: when
+                full_scan_interval has passed since the last full scan)
+
+        Returns:
+            SnapshotDiff of the matching files since the last scan
+        """
+        now = self.clock()
+        if full is None:
+            full = self.full_scan_interval > 0 and now - self.last_full_scan >= self.full_scan_interval
+        if full:
+            self.last_full_scan = now
+            self.stats["full_scans"] += 1
+        self.stats["scans"] += 1
+        diff = SnapshotDiff(full)
+        created, deleted = [], {}
+        seen = set()
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(self.root, rel) if rel else self.root
+            cached = self.dirs.get(rel)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.warning(f"Cannot stat {path}: {e}")
+                mtime = None
+            seen.add(rel)
+            if not full and cached is not None and mtime is not None and cached["mtime"] == mtime:
+                self.stats["dirs_skipped"] += 1
+                stack.extend(os.path.join(rel, name) for name in cached["subdirs"])
+                continue
+            listed = self._list(path, mtime) if mtime is not None else None
+            if listed is None:
+                # Unreadable for now: keep what is known and try again next scan
+                if cached is not None:
+                    cached["mtime"] = None
+                    self.dirty = True
+                    stack.extend(os.path.join(rel, name) for name in cached["subdirs"])
+                continue
+            known_files = cached["files"] if cached is not None else {}
+            for name, signature in listed["files"].items():
+                old = known_files.get(name)
+                if old is None:
+                    created.append((os.path.join(path, name), signature))
+                elif old != signature:
+                    diff.files_modified.append(os.path.join(path, name))
+            for name, signature in known_files.items():
+                if name not in listed["files"]:
+                    deleted[os.path.join(path, name)] = signature
+            self.dirs[rel] = listed
+            self.dirty = True
+            stack.extend(os.path.join(rel, name) for name in listed["subdirs"])
+        for rel in [rel for rel in self.dirs if rel not in seen]:
+            path = os.path.join(self.root, rel) if rel else self.root
+            for name, signature in self.dirs.pop(rel)["files"].items():
+                deleted[os.path.join(path, name)] = signature
+            self.dirty = True
+        # A deleted and a created file with the same inode and size: moved or renamed
+        moved_from = {(signature[2], signature[0]): src for src, signature in deleted.items() if signature[2]}
+        for dest, signature in created:
+            src = moved_from.pop((signature[2], signature[0]), None) if signature[2] else None
+            if src is not None:
+                diff.files_moved.append((src, dest))
+                del deleted[src]
+            else:
+                diff.files_created.append(dest)
+        diff.files_deleted = list(deleted)
+        self.stats["changes"] += len(diff)
+        return diff
+
+    def _list(self, path, mtime):
+        """Lists one directory. Returns its cache entry, or None if it cannot be read."""
+        self.stats["dirs_listed"] += 1
+        files, subdirs = {}, []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.normcase(entry.path) not in self.exclude_dirs:
+                                subdirs.append(entry.name)
+                        elif entry.is_file() and self.match(entry.name):
+                            st = entry.stat()
+                            # entry.inode() is also filled in on Windows, unlike st_ino here
+                            files[entry.name] = [st.st_size, st.st_mtime_ns, entry.inode()]
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning(f"Cannot list {path}: {e}")
+            return None
+        if time.time_ns() - mtime < self.RECENT_NS:
+            # Changed just now: on coarse-timestamp filesystems another file could be added
+            # without moving the mtime, so list it again next time
+            mtime = None
+        return {"mtime": mtime, "files": files, "subdirs": subdirs}
+
+    def known_files(self):
+        """Paths of every matching file in the snapshot (no disk access)."""
+        for rel, entry in self.dirs.items():
+            path = os.path.join(self.root, rel) if rel else self.root
+            for name in entry["files"]:
+                yield os.path.join(path, name)
+
+    def get_stats(self):
+        return dict(self.stats, dirs_cached=len(self.dirs))
@@ -0,0 +1,136 @@
+import os
+import time
+import heapq
+import logging
+import threading
+
+from watchdog.events import FileSystemEventHandler, EVENT_TYPE_MOVED, EVENT_TYPE_DELETED, EVENT_TYPE_OPENED
+
+class EventCoalescer(FileSystemEventHandler):
+    """
+    Filters and merges watchdog events before they reach the receipt pipeline.
+
+    Events under an excluded directory (the archive, which our own moves would otherwise
+    feed back) and for non-matching files are dropped on arrival. A sync client emits a
+    burst for one photo (created, several modified, moved from a temporary name); those
+    are merged per path and on_ready is called once, `window` seconds after the last one.
+    A file that is moved away or deleted within the window is not reported.
+    """
+
+    def __init__(self, on_ready, exclude_dirs=(), match=None, window=1.0, clock=time.monotonic):
+        """
+        Args:
+            on_ready: Called with the absolute path once its events have gone quiet
+            exclude_dirs: Directories whose whole subtree is ignored
+            match: match(filename) -> bool, files to report (default: all)
+            window: Seconds without a new event before a path is reported
+            clock: Injectable for tests
+        """
+        self.on_ready = on_ready
+        self.exclude_dirs = [os.path.normcase(os.path.abspath(d)) for d in exclude_dirs]
+        self.match = match or (lambda name: True)
+        self.window = window
+        self.clock = clock
+        self.pending = {}  # {abs_path: due}
+        self.heap = []  # [(due, abs_path)], may hold outdated entries
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.stats = {"received": 0, "dispatched": 0, "excluded": 0, "ignored": 0, "merged": 0, "cancelled": 0}
+
+    def start(self):
+        """Starts the dispatch thread."""
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._run, name="event-coalescer", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the dispatch thread. Paths still pending are left for the next reconciliation."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def _excluded(self, abs_path):
+        path = os.path.normcase(abs_path)
+        return any(path == d or path.startswith(d + os.sep) for d in self.exclude_dirs)
+
+    def dispatch(self, event):
+        """Entry point for the watchdog observer (replaces FileSystemEventHandler's routing)."""
+        with self.cond:
+            self.stats["received"] += 1
+            # Opens are mostly our own reads (hashing, analysis), not a sign of new content
+            if event.is_directory or event.event_type == EVENT_TYPE_OPENED:
+                self.stats["ignored"] += 1
+                return
+            src_path = os.path.abspath(event.src_path) if event.src_path else None
+            if src_path and event.event_type in (EVENT_TYPE_MOVED, EVENT_TYPE_DELETED):
+                # The old name is gone: a report still pending for it would point at nothing
+                if self.pending.pop(src_path, None) is not None:
+                    self.stats["cancelled"] += 1
+            abs_path = src_path
+            if event.event_type == EVENT_TYPE_MOVED:
+                # Empty when the file was moved in from / out to an unwatched folder
+                abs_path = os.path.abspath(event.dest_path) if event.dest_path else None
+            if event.event_type == EVENT_TYPE_DELETED or abs_path is None:
+                self.stats["ignored"] += 1
+                return
+            if self._excluded(abs_path):
+                self.stats["excluded"] += 1
+                return
+            if not self.match(os.path.basename(abs_path)):
+                self.stats["ignored"] += 1
+                return
+            if abs_path in self.pending:
+                self.stats["merged"] += 1
+            due = self.clock() + self.window
+            self.pending[abs_path] = due
+            heapq.heappush(self.heap, (due, abs_path))
+            self.cond.notify()
+
+    def pop_due(self):
+        """Returns the paths whose window has passed (removing them from pending)."""
+        now = self.clock()
+        due_paths = []
+        with self.cond:
+            while self.heap and self.heap[0][0] <= now:
+                due, abs_path = heapq.heappop(self.heap)
+                # Skip entries superseded by a later event or cancelled by a move/delete
+                if self.pending.get(abs_path) == due:
+                    del self.pending[abs_path]
+                    due_paths.append(abs_path)
+            self.stats["dispatched"] += len(due_paths)
+        return due_paths
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.heap or self.heap[0][0] > self.clock()):
+                    timeout = self.heap[0][0] - self.clock() if self.heap else None
+                    self.cond.wait(timeout)
+                if not self.running:
+                    return
+            for abs_path in self.pop_due():
+                try:
+                    self.on_ready(abs_path)
+                except Exception as e:
+                    logging.exception(f"File-ready handler failed for {abs_path}: {e}")
+
+    def pending_count(self):
+        with self.cond:
+            return len(self.pending)
+
+    def get_stats(self):
+        with self.cond:
+            return dict(self.stats)
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logging.info(f"File events: {stats['received']} received, {stats['dispatched']} dispatched "
+                     f"({stats['excluded']} in excluded folders, {stats['ignored']} ignored, "
+                     f"{stats['merged']} merged, {stats['cancelled']} cancelled)")
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from stability import file_signature
+
+# Pipeline stages, in order. A file's row stores the last stage it completed.
+STAGES = ("discovered", "stable", "analyzed", "uploaded", "validated", "archived")
+
+class FileStateStore:
+    """
+    Durable per-file pipeline state, so a restart resumes a receipt at the stage where it
+    stopped instead of paying for the AI analysis (or an upload) again.
+
+    Each row keeps the extracted receipt JSON and the Notion page created for each item
+    index. A row is reset when the file's size/mtime no longer match (a different photo
+    saved under the same name), and dropped once the file is archived or skipped, when the
+    processed history takes over.
+    """
+
+    def __init__(self, db_path=".file_states.db", clock=time.time):
+        self.db_path = db_path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_states (
+                    path TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    signature TEXT,
+                    data TEXT,
+                    page_ids TEXT NOT NULL DEFAULT '{}',
+                    updated_at REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_file_states_stage ON file_states(stage)")
+
+    @staticmethod
+    def _signature(path):
+        signature = file_signature(path)
+        return json.dumps(list(signature)) if signature else None
+
+    def get(self, path):
+        """
+        Returns:
+            {"stage", "data", "page_ids" ({item index: page id})} or None. A row whose
+            file changed since it was recorded is dropped and None is returned.
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            row = self.conn.execute("SELECT stage, signature, data, page_ids FROM file_states WHERE path = ?",
+                                    (path,)).fetchone()
+        if row is None:
+            return None
+        stage, signature, data, page_ids = row
+        if signature is not None and signature != self._signature(path):
+            logging.info(f"[상태 초기화] 파일이 바뀜: {path}")
+            self.forget(path)
+            return None
+        return {"stage": stage, "data": json.loads(data) if data else None,
+                "page_ids": {int(index): page_id for index, page_id in json.loads(page_ids).items()}}
+
+    @staticmethod
+    def reached(state, stage):
+        """True if `state` (from get) has completed `stage`."""
+        return state is not None and STAGES.index(state["stage"]) >= STAGES.index(stage)
+
+    def discover(self, path):
+        """Records a newly seen file (no-op if it is already known)."""
+        path = os.path.abspath(path)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO file_states (path, stage, updated_at) VALUES (?, ?, ?)",
+                              (path, "discovered", self.clock()))
+
+    def advance(self, path, stage, data=None):
+        """Records that `path` completed `stage`, with the receipt data if given."""
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        path = os.path.abspath(path)
+        signature = self._signature(path) if stage != "archived" else None
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO file_states (path, stage, updated_at) VALUES (?, ?, ?)",
+                              (path, stage, self.clock()))
+            self.conn.execute("UPDATE file_states SET stage = ?, updated_at = ?, "
+                              "signature = COALESCE(?, signature), data = COALESCE(?, data) WHERE path = ?",
+                              (stage, self.clock(), signature,
+                               json.dumps(data, ensure_ascii=False) if data is not None else None, path))
+
+    def record_page(self, path, index, page_id):
+        """Records the Notion page created for item `index` (an upload in progress)."""
+        path = os.path.abspath(path)
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT page_ids FROM file_states WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return
+            page_ids = json.loads(row[0])
+            page_ids[str(index)] = page_id
+            self.conn.execute("UPDATE file_states SET page_ids = ?, updated_at = ? WHERE path = ?",
+                              (json.dumps(page_ids), self.clock(), path))
+
+    def forget(self, path):
+        path = os.path.abspath(path)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM file_states WHERE path = ?", (path,))
+
+    def unfinished(self):
+        """Paths that stopped after analysis but before archiving."""
+        with self.lock:
+            rows = self.conn.execute("SELECT path FROM file_states WHERE stage IN ('analyzed', 'uploaded', 'validated') "
+                                     "ORDER BY updated_at").fetchall()
+        return [row[0] for row in rows]
+
+    def count_by_stage(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT stage, COUNT(*) FROM file_states GROUP BY stage").fetchall())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,123 @@
+import array
+import hashlib
+import threading
+
+def path_fingerprint(path):
+    """Non-zero 63-bit fingerprint of a path (fits SQLite's signed INTEGER)."""
+    fingerprint = int.from_bytes(hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest(), "little") >> 1
+    return fingerprint or 1
+
+class FingerprintSet:
+    """
+    Set of 63-bit fingerprints in one flat array (open addressing, linear probing).
+
+    About 16-32 bytes per entry instead of a full path string plus a set slot, and the
+    table can be saved and loaded as raw bytes. Two paths share a fingerprint with
+    probability ~n / 2**63, so membership is exact for any realistic history size.
+
+    Safe to use from several threads: a resize or a deletion moves entries around, so
+    lookups take the same (short, memory-only) lock as writes.
+    """
+
+    MIN_SIZE = 1024
+
+    def __init__(self, capacity=0):
+        size = self.MIN_SIZE
+        while size < capacity * 2:
+            size *= 2
+        self.table = array.array("q", bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_iterable(cls, fingerprints, capacity=0):
+        result = cls(capacity)
+        for fingerprint in fingerprints:
+            result._add(fingerprint)
+        return result
+
+    @classmethod
+    def from_bytes(cls, data, count):
+        """Restores a table saved with to_bytes()."""
+        result = cls()
+        result.table = array.array("q")
+        result.table.frombytes(data)
+        size = len(result.table)
+        if size < cls.MIN_SIZE or size & (size - 1):
+            raise ValueError("Invalid fingerprint table size")
+        result.mask = size - 1
+        result.count = count
+        return result
+
+    def to_bytes(self):
+        with self.lock:
+            return self.table.tobytes()
+
+    def _slot(self, fingerprint):
+        table, mask = self.table, self.mask
+        slot = fingerprint & mask
+        while True:
+            value = table[slot]
+            if value == 0 or value == fingerprint:
+                return slot
+            slot = (slot + 1) & mask
+
+    def __contains__(self, fingerprint):
+        with self.lock:
+            return self.table[self._slot(fingerprint)] == fingerprint
+
+    def __len__(self):
+        return self.count
+
+    def add(self, fingerprint):
+        """Adds a fingerprint. Returns False if it was already present."""
+        with self.lock:
+            return self._add(fingerprint)
+
+    def _add(self, fingerprint):
+        # Caller holds self.lock (or owns the set exclusively)
+        slot = self._slot(fingerprint)
+        if self.table[slot] == fingerprint:
+            return False
+        self.table[slot] = fingerprint
+        self.count += 1
+        if self.count * 2 > len(self.table):
+            self._resize(len(self.table) * 2)
+        return True
+
+    def discard(self, fingerprint):
+        """Removes a fingerprint. Returns False if it was not present."""
+        with self.lock:
+            return self._discard(fingerprint)
+
+    def _discard(self, fingerprint):
+        # Caller holds self.lock
+        table, mask = self.table, self.mask
+        slot = self._slot(fingerprint)
+        if table[slot] != fingerprint:
+            return False
+        table[slot] = 0
+        self.count -= 1
+        # Backward-shift deletion: move later entries of the probe run into the gap
+        j = slot
+        while True:
+            j = (j + 1) & mask
+            value = table[j]
+            if value == 0:
+                return True
+            home = value & mask
+            # Move the entry unless its home slot lies cyclically in (slot, j]
+            if (slot < j and (home <= slot or home > j)) or (slot > j and home <= slot and home > j):
+                table[slot] = value
+                table[j] = 0
+                slot = j
+
+    def _resize(self, size):
+        # Caller holds self.lock
+        old = self.table
+        self.table = array.array("q", bytes(8 * size))
+        self.mask = size - 1
+        for value in old:
+            if value:
+                self.table[self._slot(value)] = value
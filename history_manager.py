@@ -1,42 +1,260 @@
 import os
-import json
+import sys
+import time
+import sqlite3
 import logging
+import threading
+
+from analysis_cache import file_sha256
+from fingerprint_set import FingerprintSet, path_fingerprint
 
 class HistoryManager:
-    """Manages the history of processed files to prevent duplicate processing across restarts."""
-    
-    def __init__(self, history_file=".processed_history"):
+    """
+    Manages the history of processed files to prevent duplicate processing across restarts.
+
+    Records live in SQLite (WAL mode) with the file's size, mtime, content hash, status
+    and timestamps, so a photo can also be recognised under another name. With
+    commit_batch > 1 writes are committed in batches; flush() / close() commit the rest.
+
+    In memory only a FingerprintSet of path fingerprints is kept. close() saves it as a
+    snapshot, so the next start loads it in one read instead of rebuilding it.
+    """
+
+    def __init__(self, history_file=".processed_history", db_path=None, commit_batch=1,
+                 commit_interval=2.0, clock=time.time):
+        """
+        Args:
+            history_file: Legacy flat file (one path per line), imported once
+            db_path: SQLite database (default: history_file + ".db")
+            commit_batch: Commit after this many pending writes (1: every write is durable at once)...
+            commit_interval: ...or when the oldest pending write is this many seconds old
+            clock: Injectable for tests
+        """
         self.history_file = history_file
-        self.processed_files = self._load_history()
-        
+        self.db_path = db_path or history_file + ".db"
+        self.commit_batch = max(1, int(commit_batch))
+        self.commit_interval = commit_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.first_pending = None
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    path TEXT PRIMARY KEY,
+                    fp INTEGER,
+                    size INTEGER,
+                    mtime REAL,
+                    hash TEXT,
+                    status TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    processed_at REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_history_hash ON history(hash)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Saved FingerprintSet; only valid while meta 'snapshot_valid' is 1
+            self.conn.execute("CREATE TABLE IF NOT EXISTS fingerprint_snapshot (id INTEGER PRIMARY KEY, count INTEGER, data BLOB)")
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(history)")]
+            if "fp" not in columns:
+                # Databases created before fingerprints were stored
+                self.conn.execute("ALTER TABLE history ADD COLUMN fp INTEGER")
+                self.conn.executemany("UPDATE history SET fp = ? WHERE path = ?",
+                                      [(path_fingerprint(path), path) for (path,) in self.conn.execute("SELECT path FROM history").fetchall()])
+        self.snapshot_valid = False
+        self._migrate_flat_file()
+        self.fingerprints = self._load_history()
+
+    def _migrate_flat_file(self):
+        """One-time import of the old .processed_history file (paths only)."""
+        with self.lock, self.conn:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_flat_file'").fetchone():
+                return
+            count = 0
+            if os.path.exists(self.history_file):
+                try:
+                    with open(self.history_file, 'r', encoding='utf-8') as f:
+                        paths = [line.strip() for line in f if line.strip()]
+                except Exception as e:
+                    logging.error(f"Error loading history file: {e}")
+                    return
+                now = self.clock()
+                cursor = self.conn.executemany(
+                    "INSERT OR IGNORE INTO history (path, fp, status, first_seen, processed_at) VALUES (?, ?, 'processed', ?, ?)",
+                    [(path, path_fingerprint(path), now, now) for path in paths])
+                count = cursor.rowcount
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_flat_file', ?)", (str(count),))
+        if count:
+            logging.info(f"Imported {count} paths from {self.history_file} into {self.db_path}")
+
     def _load_history(self):
-        """Loads processed file paths from the history file."""
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return set(line.strip() for line in f if line.strip())
-            except Exception as e:
-                logging.error(f"Error loading history file: {e}")
-                return set()
-        return set()
-    
+        """Loads the path fingerprints: the saved snapshot if it is current, else from the rows."""
+        with self.lock:
+            valid = self.conn.execute("SELECT value FROM meta WHERE key = 'snapshot_valid'").fetchone()
+            row = self.conn.execute("SELECT count, data FROM fingerprint_snapshot WHERE id = 1").fetchone()
+            if valid and valid[0] == "1" and row:
+                try:
+                    fingerprints = FingerprintSet.from_bytes(row[1], row[0])
+                    self.snapshot_valid = True
+                    return fingerprints
+                except ValueError as e:
+                    logging.warning(f"Ignoring invalid history snapshot: {e}")
+            count = self.conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+            return FingerprintSet.from_iterable((row[0] for row in self.conn.execute("SELECT fp FROM history")), count)
+
+    def _invalidate_snapshot(self):
+        # Caller holds self.lock; written in the same transaction as the first change
+        if self.snapshot_valid:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_valid', '0')")
+            self.snapshot_valid = False
+
+    def _save_snapshot(self):
+        # Caller holds self.lock
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO fingerprint_snapshot (id, count, data) VALUES (1, ?, ?)",
+                              (len(self.fingerprints), self.fingerprints.to_bytes()))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_valid', '1')")
+        self.snapshot_valid = True
+
     def is_processed(self, filepath):
         """Checks if a file has already been processed."""
         # Convert to absolute path to avoid confusion
         abs_path = os.path.abspath(filepath)
-        return abs_path in self.processed_files
-    
-    def add_to_history(self, filepath):
-        """Adds a file path to the history and saves it to disk."""
+        return path_fingerprint(abs_path) in self.fingerprints
+
+    def add_to_history(self, filepath, status="processed", content_hash=None, hash_file=True):
+        """
+        Adds a file to the history with its size, mtime and content hash.
+
+        Args:
+            status: Why the file is done ("processed", "not_receipt", "duplicate", "too_old", ...)
+            content_hash: SHA-256 of the file if already known (computed otherwise)
+            hash_file: False stores no hash instead of reading the file. Used for files skipped
+                       without being opened: hashing a cloud-only photo would download it.
+        """
         abs_path = os.path.abspath(filepath)
-        if abs_path not in self.processed_files:
-            self.processed_files.add(abs_path)
+        fingerprint = path_fingerprint(abs_path)
+        if fingerprint in self.fingerprints:
+            return
+        size = mtime = None
+        try:
+            st = os.stat(abs_path)
+            size, mtime = st.st_size, st.st_mtime
+            if content_hash is None and hash_file:
+                content_hash = file_sha256(abs_path)
+        except OSError:
+            pass
+        now = self.clock()
+        with self.lock:
+            if not self.fingerprints.add(fingerprint):
+                return
             try:
-                with open(self.history_file, 'a', encoding='utf-8') as f:
-                    f.write(abs_path + '\n')
+                self._invalidate_snapshot()
+                self.conn.execute("INSERT OR REPLACE INTO history (path, fp, size, mtime, hash, status, first_seen, processed_at) "
+                                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  (abs_path, fingerprint, size, mtime, content_hash, status, now, now))
+                self._note_write(now)
             except Exception as e:
-                logging.error(f"Error saving to history file: {e}")
-                
+                logging.error(f"Error saving to history database: {e}")
+
+    def _note_write(self, now):
+        # Caller holds self.lock
+        self.pending += 1
+        if self.first_pending is None:
+            self.first_pending = now
+        if self.pending >= self.commit_batch or now - self.first_pending >= self.commit_interval:
+            self._commit()
+
+    def _commit(self):
+        self.conn.commit()
+        self.pending = 0
+        self.first_pending = None
+
+    def flush(self):
+        """Commits pending writes."""
+        with self.lock:
+            if self.pending:
+                self._commit()
+
+    def find_by_hash(self, content_hash):
+        """Returns the paths recorded with this content hash."""
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT path FROM history WHERE hash = ?", (content_hash,))]
+
+    def find_same_content(self, filepath, content_hash=None):
+        """
+        Returns another recorded path with the same bytes as `filepath` (e.g. a renamed or
+        re-synced copy), or None.
+        """
+        abs_path = os.path.abspath(filepath)
+        try:
+            content_hash = content_hash or file_sha256(abs_path)
+        except OSError:
+            return None
+        return next((path for path in self.find_by_hash(content_hash) if path != abs_path), None)
+
+    def get_record(self, filepath):
+        """Returns the stored row as a dict, or None."""
+        with self.lock:
+            cursor = self.conn.execute("SELECT path, size, mtime, hash, status, first_seen, processed_at FROM history WHERE path = ?",
+                                       (os.path.abspath(filepath),))
+            row = cursor.fetchone()
+            return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def remove_from_history(self, filepath):
+        """Forgets a file so it is processed again."""
+        abs_path = os.path.abspath(filepath)
+        with self.lock, self.conn:
+            self.fingerprints.discard(path_fingerprint(abs_path))
+            self._invalidate_snapshot()
+            self.conn.execute("DELETE FROM history WHERE path = ?", (abs_path,))
+            self.pending = 0
+            self.first_pending = None
+
+    def compact(self, max_age_days):
+        """
+        Drops records older than max_age_days whose file is gone (e.g. archived long ago),
+        then checkpoints the WAL and vacuums the database.
+
+        Returns:
+            Number of records removed
+        """
+        cutoff = self.clock() - max_age_days * 86400
+        with self.lock:
+            self._commit()
+            stale = [row[0] for row in self.conn.execute("SELECT path FROM history WHERE processed_at < ?", (cutoff,))
+                     if not os.path.exists(row[0])]
+            with self.conn:
+                self._invalidate_snapshot()
+                self.conn.executemany("DELETE FROM history WHERE path = ?", [(path,) for path in stale])
+            for path in stale:
+                self.fingerprints.discard(path_fingerprint(path))
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.execute("VACUUM")
+        if stale:
+            logging.info(f"History compaction removed {len(stale)} old records")
+        return len(stale)
+
     def get_count(self):
         """Returns the number of processed files."""
-        return len(self.processed_files)
+        return len(self.fingerprints)
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            if not self.snapshot_valid:
+                self._save_snapshot()
+            self.conn.close()
+
+if __name__ == "__main__":
+    # python history_manager.py forget <file>...  : process these files again
+    if len(sys.argv) < 3 or sys.argv[1] != "forget":
+        print("Usage: python history_manager.py forget <file> [<file> ...]")
+        sys.exit(1)
+    manager = HistoryManager()
+    for path in sys.argv[2:]:
+        manager.remove_from_history(path)
+        print(f"Forgot {os.path.abspath(path)}")
+    manager.close()
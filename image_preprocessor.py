@@ -0,0 +1,193 @@
+import os
+import io
+import math
+import base64
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageChops, ImageOps
+except ImportError:
+    Image = None
+
+if Image is not None:
+    try:
+        # HEIC (아이폰 사진) 지원은 pillow-heif가 설치된 경우에만
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
+OUTPUT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+def trim_borders(img, threshold=30, min_keep_ratio=0.3):
+    """Crops uniform borders (same color as the top-left pixel) around the receipt."""
+    gray = img.convert("L")
+    background = Image.new("L", gray.size, gray.getpixel((0, 0)))
+    diff = ImageChops.difference(gray, background).point(lambda v: 255 if v > threshold else 0)
+    bbox = diff.getbbox()
+    if not bbox:
+        return img
+    width, height = img.size
+    crop_w, crop_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    # 너무 많이 잘리면 (배경 판별 실패) 원본 유지
+    if crop_w * crop_h < width * height * min_keep_ratio:
+        return img
+    return img.crop(bbox)
+
+PHASH_SAMPLE = 32
+# DCT-II basis for the pHash sample size
+_DCT_COS = [[math.cos(math.pi * (2 * x + 1) * u / (2 * PHASH_SAMPLE)) for x in range(PHASH_SAMPLE)]
+            for u in range(PHASH_SAMPLE)]
+
+def phash(img, hash_size=8):
+    """
+    Perceptual hash: the lowest hash_size x hash_size DCT frequencies of a 32x32
+    grayscale thumbnail, one bit per coefficient above the median. Re-encoded, resized
+    or slightly shifted shots of the same picture give hashes with a small Hamming distance.
+
+    Returns:
+        int with hash_size * hash_size bits
+    """
+    n = PHASH_SAMPLE
+    pixels = img.convert("L").resize((n, n), Image.LANCZOS).tobytes()
+    # Separable 2D DCT, keeping only the low frequencies
+    rows = [[sum(pixels[y * n + x] * _DCT_COS[u][x] for x in range(n)) for u in range(hash_size)]
+            for y in range(n)]
+    coeffs = [sum(rows[y][u] * _DCT_COS[v][y] for y in range(n)) for v in range(hash_size) for u in range(hash_size)]
+    # The DC term (overall brightness) is left out of the median
+    median = sorted(coeffs[1:])[(len(coeffs) - 1) // 2]
+    value = 0
+    for coeff in coeffs:
+        value = (value << 1) | (coeff > median)
+    return value
+
+class PreparedImage:
+    """Image bytes ready to be sent to the vision model."""
+
+    def __init__(self, data, mime_type, width=None, height=None, original_size=0):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.original_size = original_size
+
+    def to_data_url(self):
+        """Returns a base64 data URL for the chat completions image_url field."""
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('utf-8')}"
+
+class ImagePreprocessor:
+    """Decodes, rotates, trims, downscales and re-encodes receipt photos before AI analysis."""
+
+    def __init__(self, max_long_edge=1600, output_format="JPEG", quality=85, crop_borders=True, cache_size=16):
+        """
+        Args:
+            max_long_edge: Longest side in pixels after downscaling
+            output_format: "JPEG" or "WEBP"
+            quality: Encoder quality (1-100)
+            crop_borders: Trim uniform background borders around the receipt
+            cache_size: Number of prepared images kept in memory (reused by retries)
+        """
+        self.max_long_edge = max_long_edge
+        self.output_format = output_format.upper()
+        if self.output_format not in OUTPUT_MIME_TYPES:
+            logging.warning(f"Unsupported output format {output_format}, using JPEG")
+            self.output_format = "JPEG"
+        self.quality = quality
+        self.crop_borders = crop_borders
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # {(abs_path, size, mtime_ns): PreparedImage}
+        self.lock = threading.Lock()
+        if Image is None:
+            logging.warning("Pillow not available, images are sent without preprocessing.")
+
+    def settings_tag(self):
+        """Describes the preprocessing settings (part of the analysis cache version tag)."""
+        if Image is None:
+            return "raw"
+        return f"{self.output_format}-{self.max_long_edge}-{self.quality}-{int(self.crop_borders)}"
+
+    def prepare(self, filepath):
+        """
+        Returns a PreparedImage for the file, reusing the cached result if the file is unchanged.
+
+        Raises:
+            OSError if the file cannot be read
+        """
+        abs_path = os.path.abspath(filepath)
+        st = os.stat(abs_path)
+        key = (abs_path, st.st_size, st.st_mtime_ns)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        prepared = self._prepare(abs_path, st.st_size)
+
+        with self.lock:
+            self.cache[key] = prepared
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return prepared
+
+    def perceptual_hash(self, filepath):
+        """
+        Returns the 64-bit phash of the photo after rotation and border trimming, or None
+        if Pillow is missing or the image cannot be decoded. Much cheaper than prepare():
+        JPEGs are decoded at reduced resolution.
+        """
+        if Image is None:
+            return None
+        try:
+            with Image.open(filepath) as img:
+                img.draft("L", (256, 256))
+                img = ImageOps.exif_transpose(img)
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                if self.crop_borders:
+                    img = self._trim_borders(img)
+                return phash(img)
+        except Exception as e:
+            logging.warning(f"Perceptual hash failed for {filepath}: {e}")
+            return None
+
+    def _prepare(self, abs_path, original_size):
+        with open(abs_path, 'rb') as f:
+            raw = f.read()
+        if Image is None:
+            return self._raw(abs_path, raw)
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                img = ImageOps.exif_transpose(img)
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                if self.crop_borders:
+                    img = self._trim_borders(img)
+                if max(img.size) > self.max_long_edge:
+                    img.thumbnail((self.max_long_edge, self.max_long_edge), Image.LANCZOS)
+                out = io.BytesIO()
+                img.save(out, format=self.output_format, quality=self.quality, optimize=True)
+                data = out.getvalue()
+                width, height = img.size
+        except Exception as e:
+            logging.warning(f"Image preprocessing failed, sending original: {e}")
+            return self._raw(abs_path, raw)
+
+        if len(data) >= len(raw) and mimetypes.guess_type(abs_path)[0] == OUTPUT_MIME_TYPES[self.output_format]:
+            # 이미 작은 파일은 원본이 더 작을 수 있음
+            return self._raw(abs_path, raw, width, height)
+        logging.info(f"Preprocessed image: {original_size // 1024} KB -> {len(data) // 1024} KB ({width}x{height})")
+        return PreparedImage(data, OUTPUT_MIME_TYPES[self.output_format], width, height, original_size)
+
+    @staticmethod
+    def _raw(abs_path, raw, width=None, height=None):
+        ext = os.path.splitext(abs_path)[1].lower()
+        mime_type = "image/heic" if ext == ".heic" else (mimetypes.guess_type(abs_path)[0] or "image/jpeg")
+        return PreparedImage(raw, mime_type, width, height, len(raw))
+
+    @staticmethod
+    def _trim_borders(img, threshold=30, min_keep_ratio=0.3):
+        return trim_borders(img, threshold, min_keep_ratio)
@@ -0,0 +1,275 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from notion_api import QueryPaginator
+from notion_validator import extract_property_value
+
+class LedgerMirror:
+    """
+    Local SQLite copy of the Notion ledger database.
+
+    The first sync downloads every page; later syncs only ask Notion for pages whose
+    last_edited_time is on or after the previous watermark. Our own creates and deletes
+    are applied in place, so lookups never need a full download.
+    """
+
+    # Notion rounds last_edited_time to the minute; re-read a little before the watermark
+    WATERMARK_OVERLAP = timedelta(minutes=2)
+
+    # Downloaded pages are applied in transactions of this many pages
+    SYNC_BATCH = 100
+
+    def __init__(self, client, database_id, db_path=".ledger_mirror.db", refresh_interval=60.0,
+                 full_sync_hours=24.0, clock=time.time):
+        """
+        Args:
+            client: NotionClient used for the sync queries
+            database_id: Notion ledger database ID
+            db_path: SQLite file holding the mirror
+            refresh_interval: Seconds during which refresh() reuses the last sync
+            full_sync_hours: Interval of full re-downloads, which also drop pages that
+                             were deleted outside this program
+            clock: Injectable for tests
+        """
+        self.client = client
+        self.database_id = database_id
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self.full_sync_seconds = full_sync_hours * 3600
+        self.clock = clock
+        self.lock = threading.RLock()
+        # Serializes syncs; the download itself runs without self.lock so lookups and our own writes go on
+        self.sync_lock = threading.Lock()
+        # Page IDs written by upsert/remove while a sync downloads (None when no sync runs):
+        # the downloaded copy of such a page may be older than ours
+        self.touched = None
+        self.last_sync = None
+        self.sync_count = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    page_id TEXT PRIMARY KEY,
+                    created_time TEXT,
+                    last_edited_time TEXT,
+                    item_key TEXT,
+                    date TEXT,
+                    merchant_key TEXT,
+                    total REAL,
+                    source_file TEXT,
+                    data TEXT NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_source ON pages(source_file)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_date_merchant ON pages(date, merchant_key)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_dedupe ON pages(item_key, date, merchant_key, total)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Receipt fingerprint -> JSON list of the page IDs created for it
+            self.conn.execute("CREATE TABLE IF NOT EXISTS receipts (fingerprint TEXT PRIMARY KEY, page_ids TEXT NOT NULL)")
+            if self._get_meta("database_id") not in (None, self.database_id):
+                # Mirror of another database: start over
+                self.conn.execute("DELETE FROM pages")
+                self.conn.execute("DELETE FROM meta")
+                self.conn.execute("DELETE FROM receipts")
+            self._set_meta("database_id", self.database_id)
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _row(page):
+        name = extract_property_value(page, "항목")
+        merchant = extract_property_value(page, "사용처")
+        total = extract_property_value(page, "합계")
+        source = extract_property_value(page, "원본파일")
+        return (
+            page["id"],
+            page.get("created_time"),
+            page.get("last_edited_time"),
+            str(name or "").strip().lower(),
+            extract_property_value(page, "날짜"),
+            str(merchant or "").strip().lower(),
+            float(total) if total is not None else None,
+            source.strip() if source else None,
+            json.dumps(page, ensure_ascii=False),
+        )
+
+    def upsert(self, page):
+        """Stores a page returned by Notion (e.g. right after we created it)."""
+        if not page or not page.get("id"):
+            return
+        with self.lock, self.conn:
+            self._store(page)
+            if self.touched is not None:
+                self.touched.add(page["id"])
+
+    def _store(self, page):
+        # Caller holds self.lock and commits
+        if page.get("archived") or page.get("in_trash"):
+            self.conn.execute("DELETE FROM pages WHERE page_id = ?", (page["id"],))
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self._row(page))
+
+    def remove(self, page_id):
+        """Drops a page we archived."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM pages WHERE page_id = ?", (page_id,))
+            if self.touched is not None:
+                self.touched.add(page_id)
+
+    def refresh(self):
+        """Syncs unless the last sync is younger than refresh_interval."""
+        with self.sync_lock:
+            if self.last_sync is not None and self.clock() - self.last_sync < self.refresh_interval:
+                return True
+            return self._sync(False)
+
+    def sync(self, full=False):
+        """
+        Brings the mirror up to date: a full download the first time, every
+        full_sync_hours, or when `full` is set, and an incremental query otherwise.
+
+        Returns:
+            True on success, False if Notion could not be queried (the mirror keeps its old data)
+        """
+        with self.sync_lock:
+            return self._sync(full)
+
+    def _sync(self, full):
+        # Caller holds self.sync_lock
+        with self.lock:
+            watermark = self._get_meta("watermark")
+            last_full = float(self._get_meta("last_full_sync") or 0)
+            self.touched = set()
+        full = full or watermark is None or self.clock() - last_full > self.full_sync_seconds
+        query = {"sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+        if not full:
+            query["filter"] = {"timestamp": "last_edited_time",
+                               "last_edited_time": {"on_or_after": self._overlap(watermark)}}
+        started = self.clock()
+        seen = set()
+        newest = watermark
+        batch = []
+        try:
+            for page in QueryPaginator(self.client, self.database_id, query):
+                batch.append(page)
+                seen.add(page["id"])
+                edited = page.get("last_edited_time")
+                if edited and (newest is None or edited > newest):
+                    newest = edited
+                if len(batch) >= self.SYNC_BATCH:
+                    self._apply(batch)
+                    batch = []
+            self._apply(batch)
+        except Exception as e:
+            # The watermark is only moved once everything is applied, so the next sync re-reads these pages
+            logging.error(f"Ledger mirror sync failed: {e}")
+            with self.lock:
+                self.touched = None
+            return False
+        with self.lock, self.conn:
+            if full:
+                # Pages missing from a full download were deleted in Notion (unless we wrote them meanwhile)
+                stale = [row[0] for row in self.conn.execute("SELECT page_id FROM pages")
+                         if row[0] not in seen and row[0] not in self.touched]
+                self.conn.executemany("DELETE FROM pages WHERE page_id = ?", [(page_id,) for page_id in stale])
+                self._set_meta("last_full_sync", str(started))
+            if newest:
+                self._set_meta("watermark", newest)
+            self.touched = None
+        self.last_sync = started
+        self.sync_count += 1
+        logging.info(f"Ledger mirror {'full' if full else 'incremental'} sync: {len(seen)} pages updated, {self.count()} total")
+        return True
+
+    def _apply(self, pages):
+        """Stores one batch of downloaded pages, skipping those we wrote since the download began."""
+        with self.lock, self.conn:
+            for page in pages:
+                if page["id"] not in self.touched:
+                    self._store(page)
+
+    def _overlap(self, watermark):
+        try:
+            when = datetime.fromisoformat(watermark.replace("Z", "+00:00"))
+        except ValueError:
+            return watermark
+        return (when - self.WATERMARK_OVERLAP).isoformat().replace("+00:00", "Z")
+
+    def iter_entries(self, batch_size=500):
+        """Streams every mirrored page, reading `batch_size` rows at a time."""
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute("SELECT rowid, data FROM pages WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                         (last_rowid, batch_size)).fetchall()
+            for rowid, data in rows:
+                yield json.loads(data)
+            if len(rows) < batch_size:
+                return
+            last_rowid = rows[-1][0]
+
+    def entries(self):
+        """Returns every mirrored page."""
+        return list(self.iter_entries())
+
+    def find_by_source(self, source_file):
+        """Returns the IDs of pages whose 원본파일 equals source_file."""
+        with self.lock:
+            rows = self.conn.execute("SELECT page_id FROM pages WHERE source_file = ?",
+                                     (source_file.strip(),)).fetchall()
+        return [row[0] for row in rows]
+
+    def find_by_date_merchant(self, date, merchant):
+        """Returns the IDs of pages with this date and merchant (case-insensitive)."""
+        with self.lock:
+            rows = self.conn.execute("SELECT page_id FROM pages WHERE date = ? AND merchant_key = ?",
+                                     (date, str(merchant or "").strip().lower())).fetchall()
+        return [row[0] for row in rows]
+
+    def find_by_dedupe_key(self, key):
+        """Returns [(page_id, created_time)] of pages with this notion_validator.dedupe_key."""
+        item_key, date, merchant_key, total = key
+        with self.lock:
+            return self.conn.execute(
+                "SELECT page_id, created_time FROM pages WHERE item_key = ? AND date = ? AND merchant_key = ? AND total = ?",
+                (item_key, date, merchant_key, total)).fetchall()
+
+    def record_receipt(self, fingerprint, page_ids):
+        """Stores the pages created for a receipt fingerprint."""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT page_ids FROM receipts WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            known = json.loads(row[0]) if row else []
+            self.conn.execute("INSERT OR REPLACE INTO receipts (fingerprint, page_ids) VALUES (?, ?)",
+                              (fingerprint, json.dumps(known + [page_id for page_id in page_ids if page_id not in known])))
+
+    def receipt_pages(self, fingerprint):
+        """Returns the still existing pages recorded for a receipt fingerprint."""
+        with self.lock:
+            row = self.conn.execute("SELECT page_ids FROM receipts WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            if not row:
+                return []
+            page_ids = json.loads(row[0])
+            if not page_ids:
+                return []
+            placeholders = ",".join("?" * len(page_ids))
+            rows = self.conn.execute(f"SELECT page_id FROM pages WHERE page_id IN ({placeholders})", page_ids).fetchall()
+        return [r[0] for r in rows]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,18 +1,35 @@
 import os
+import sys
 import time
-import base64
 import json
 import logging
+import asyncio
 import threading
-import requests
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from notion_api import NotionClient
+from rate_limiter import TokenBucket
+from retry_policy import RetryPolicy, parse_retry_after
 from notion_validator import NotionValidator
+from ledger_mirror import LedgerMirror
 from history_manager import HistoryManager
+from file_state import FileStateStore
+from dir_scanner import IncrementalScanner
+from event_coalescer import EventCoalescer
 from archiver import FileArchiver
+from worker_pool import ReceiptWorkerPool
+from stability import FileStabilityMonitor, is_file_ready, wait_until_stable
+from analysis_cache import AnalysisCache, file_sha256
+from image_preprocessor import ImagePreprocessor
+from model_router import ModelLadder
+from batch_import import BatchImporter
+from near_duplicates import NearDuplicateIndex
+from receipt_classifier import ReceiptClassifier
+from async_pipeline import AsyncNotionClient, AsyncReceiptEngine, wait_until_stable_async
 
 # 상태창이 닫히면 메인 루프 종료용 (스레드 간 공유)
 status_window_running = True
@@ -47,32 +64,201 @@ WATCH_DIR = os.getenv("WATCH_DIR")
 ENABLE_VALIDATION = os.getenv("ENABLE_VALIDATION", "true").lower() == "true"
 ENABLE_DUPLICATE_DETECTION = os.getenv("ENABLE_DUPLICATE_DETECTION", "true").lower() == "true"
 ENABLE_AUTO_CORRECTION = os.getenv("ENABLE_AUTO_CORRECTION", "true").lower() == "true"
+# Full-ledger duplicate scan interval in hours (0 = off); each receipt only checks its own items
+DUPLICATE_RECONCILE_HOURS = float(os.getenv("DUPLICATE_RECONCILE_HOURS", "24"))
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPEN_AI_API_KEY)
+# Worker pool settings
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "3"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "100"))
+
+# File stability settings (OneDrive 동기화 완료 판단)
+STABILITY_INITIAL_DELAY = float(os.getenv("STABILITY_INITIAL_DELAY", "0.5"))
+STABILITY_MAX_DELAY = float(os.getenv("STABILITY_MAX_DELAY", "10"))
+STABILITY_MAX_WAIT = float(os.getenv("STABILITY_MAX_WAIT", "300"))
+
+# Watcher events for one file (created/modified/moved bursts from OneDrive) are merged until it has
+# been quiet for EVENT_COALESCE_SECONDS; events inside Archive/ are dropped
+EVENT_COALESCE_SECONDS = float(os.getenv("EVENT_COALESCE_SECONDS", "1"))
+
+# Reconciliation of WATCH_DIR against the snapshot saved in SCAN_CACHE_PATH, at startup (changes made
+# while the program was down) and every RECONCILE_SECONDS (events the watcher missed). Only directories
+# whose mtime changed are listed; every SCAN_FULL_MINUTES all are, and unprocessed files are retried.
+SCAN_CACHE_PATH = os.getenv("SCAN_CACHE_PATH", ".scan_cache.json")
+SCAN_FULL_MINUTES = float(os.getenv("SCAN_FULL_MINUTES", "60"))
+RECONCILE_SECONDS = float(os.getenv("RECONCILE_SECONDS", "60"))
+
+# Processed-file history (SQLite). Writes are committed every HISTORY_COMMIT_BATCH files or
+# HISTORY_COMMIT_SECONDS; records of files gone for HISTORY_RETENTION_DAYS are dropped at startup (0 = keep).
+HISTORY_COMMIT_BATCH = int(os.getenv("HISTORY_COMMIT_BATCH", "50"))
+HISTORY_COMMIT_SECONDS = float(os.getenv("HISTORY_COMMIT_SECONDS", "2"))
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+
+# AI analysis settings. Bump PROMPT_VERSION whenever the prompts change so cached results are not reused.
+# Models are tried cheapest first; the next one is used only if the answer fails validation or
+# reports low confidence. Re-analysis after validation errors always uses the last (strongest) model.
+ANALYSIS_MODELS = [m.strip() for m in os.getenv("ANALYSIS_MODELS", "gpt-4o-mini,gpt-4o").split(",") if m.strip()] or ["gpt-4o"]
+ANALYSIS_MIN_CONFIDENCE = float(os.getenv("ANALYSIS_MIN_CONFIDENCE", "0.8"))
+ANALYSIS_MODEL = ANALYSIS_MODELS[-1]
+PROMPT_VERSION = "5"
+ENABLE_ANALYSIS_CACHE = os.getenv("ENABLE_ANALYSIS_CACHE", "true").lower() == "true"
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+ANALYSIS_CACHE_MAX_MB = int(os.getenv("ANALYSIS_CACHE_MAX_MB", "50"))
+ANALYSIS_CACHE_MAX_AGE_DAYS = int(os.getenv("ANALYSIS_CACHE_MAX_AGE_DAYS", "180"))
+
+# Backlog import through the Batch API (python main.py backlog [DIR])
+BATCH_ANALYSIS_MODEL = os.getenv("BATCH_ANALYSIS_MODEL", ANALYSIS_MODEL)
+BATCH_MANIFEST_PATH = os.getenv("BATCH_MANIFEST_PATH", ".batch_import.json")
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_MB = float(os.getenv("BATCH_MAX_MB", "190"))
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+
+# Image preprocessing before upload to the vision model
+IMAGE_MAX_LONG_EDGE = int(os.getenv("IMAGE_MAX_LONG_EDGE", "1600"))
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG")
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+
+# 영수증이 아닌 사진(셀카, 풍경 등)은 AI 분석 없이 처리 완료로 표시 (점수 0-1, 로그에서 조정)
+ENABLE_RECEIPT_CLASSIFIER = os.getenv("ENABLE_RECEIPT_CLASSIFIER", "true").lower() == "true"
+RECEIPT_SCORE_THRESHOLD = float(os.getenv("RECEIPT_SCORE_THRESHOLD", "0.35"))
+
+# 같은 영수증을 여러 번 찍은 사진 건너뛰기 (perceptual hash 64비트 중 허용 차이 / 촬영 시각 차이).
+# SKIP_DISTANCE 이하는 바로 건너뛰고, MAX_DISTANCE 이하는 분석 결과(가게·날짜·항목 수·합계)가 같을 때만 건너뜀
+ENABLE_NEAR_DUPLICATE_CHECK = os.getenv("ENABLE_NEAR_DUPLICATE_CHECK", "true").lower() == "true"
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "6"))
+NEAR_DUPLICATE_SKIP_DISTANCE = int(os.getenv("NEAR_DUPLICATE_SKIP_DISTANCE", "2"))
+NEAR_DUPLICATE_WINDOW_MINUTES = float(os.getenv("NEAR_DUPLICATE_WINDOW_MINUTES", "10"))
+
+# Notion HTTP connection pool
+NOTION_POOL_SIZE = int(os.getenv("NOTION_POOL_SIZE", "10"))
+NOTION_CONNECT_TIMEOUT = float(os.getenv("NOTION_CONNECT_TIMEOUT", "5"))
+NOTION_READ_TIMEOUT = float(os.getenv("NOTION_READ_TIMEOUT", "30"))
+# Notion 요청 속도 제한 (평균 초당 요청 수, 순간 허용량) 및 항목 동시 업로드 수
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_RATE_BURST = int(os.getenv("NOTION_RATE_BURST", "6"))
+NOTION_UPLOAD_CONCURRENCY = int(os.getenv("NOTION_UPLOAD_CONCURRENCY", "4"))
+
+# Retry settings (시도 횟수, 호출당 최대 대기 초)
+NOTION_RETRY_ATTEMPTS = int(os.getenv("NOTION_RETRY_ATTEMPTS", "5"))
+NOTION_RETRY_MAX_WAIT = float(os.getenv("NOTION_RETRY_MAX_WAIT", "60"))
+OPENAI_RETRY_ATTEMPTS = int(os.getenv("OPENAI_RETRY_ATTEMPTS", "4"))
+OPENAI_RETRY_MAX_WAIT = float(os.getenv("OPENAI_RETRY_MAX_WAIT", "120"))
+
+# Local SQLite mirror of the ledger database (lookups and duplicate checks read it instead of Notion)
+ENABLE_LEDGER_MIRROR = os.getenv("ENABLE_LEDGER_MIRROR", "true").lower() == "true"
+LEDGER_MIRROR_PATH = os.getenv("LEDGER_MIRROR_PATH", ".ledger_mirror.db")
+LEDGER_MIRROR_REFRESH_SECONDS = float(os.getenv("LEDGER_MIRROR_REFRESH_SECONDS", "60"))
+LEDGER_MIRROR_FULL_SYNC_HOURS = float(os.getenv("LEDGER_MIRROR_FULL_SYNC_HOURS", "24"))
+
+# Asyncio engine (opt-in): many receipts in flight on one event loop, bounded per stage
+ASYNC_MODE = os.getenv("ASYNC_MODE", "false").lower() == "true"
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "200"))
+ASYNC_ANALYSIS_CONCURRENCY = int(os.getenv("ASYNC_ANALYSIS_CONCURRENCY", "8"))
+ASYNC_UPLOAD_CONCURRENCY = int(os.getenv("ASYNC_UPLOAD_CONCURRENCY", "8"))
+
+# Initialize OpenAI client (retries are handled by openai_retry_policy, not by the SDK)
+client = OpenAI(api_key=OPEN_AI_API_KEY, max_retries=0)
+openai_retry_policy = RetryPolicy(max_attempts=OPENAI_RETRY_ATTEMPTS, base_delay=2.0, max_delay=60.0,
+                                  max_total_wait=OPENAI_RETRY_MAX_WAIT)
+
+# Model ladder; local validation rules are the same as the pre-upload check
+model_ladder = ModelLadder(ANALYSIS_MODELS, min_confidence=ANALYSIS_MIN_CONFIDENCE,
+                           validate=lambda data: notion_validator.validate_receipt_data(data) if notion_validator else [])
 
 # Initialize managers
-history_manager = HistoryManager()
+history_manager = HistoryManager(commit_batch=HISTORY_COMMIT_BATCH, commit_interval=HISTORY_COMMIT_SECONDS)
+# Per-file pipeline stage, extracted data and created pages, for resuming after a crash
+file_states = FileStateStore()
 file_archiver = FileArchiver(WATCH_DIR) if WATCH_DIR else None
-notion_validator = NotionValidator(NOTION_TOKEN, NOTION_DATABASE_ID) if (NOTION_TOKEN and NOTION_DATABASE_ID) else None
+analysis_cache = AnalysisCache(max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+                               max_bytes=ANALYSIS_CACHE_MAX_MB * 1024 * 1024,
+                               max_age_days=ANALYSIS_CACHE_MAX_AGE_DAYS) if ENABLE_ANALYSIS_CACHE else None
+image_preprocessor = ImagePreprocessor(max_long_edge=IMAGE_MAX_LONG_EDGE,
+                                       output_format=IMAGE_OUTPUT_FORMAT,
+                                       quality=IMAGE_QUALITY)
+receipt_classifier = ReceiptClassifier(threshold=RECEIPT_SCORE_THRESHOLD) if ENABLE_RECEIPT_CLASSIFIER else None
+near_duplicate_index = NearDuplicateIndex(max_distance=NEAR_DUPLICATE_MAX_DISTANCE,
+                                          skip_distance=NEAR_DUPLICATE_SKIP_DISTANCE,
+                                          window_seconds=NEAR_DUPLICATE_WINDOW_MINUTES * 60) if ENABLE_NEAR_DUPLICATE_CHECK else None
+# One limiter and one upload executor for the whole process, shared by all concurrent receipts
+notion_rate_limiter = TokenBucket(rate=NOTION_RATE_LIMIT, capacity=NOTION_RATE_BURST)
+# Per-endpoint retry budgets: reads may wait longer, page creates give up sooner
+notion_retry_policies = {
+    "default": RetryPolicy(max_attempts=NOTION_RETRY_ATTEMPTS, max_total_wait=NOTION_RETRY_MAX_WAIT),
+    "pages.create": RetryPolicy(max_attempts=NOTION_RETRY_ATTEMPTS, max_total_wait=NOTION_RETRY_MAX_WAIT / 2),
+    "databases.query": RetryPolicy(max_attempts=NOTION_RETRY_ATTEMPTS + 2, max_total_wait=NOTION_RETRY_MAX_WAIT * 2),
+}
+notion_client = NotionClient(NOTION_TOKEN, pool_size=NOTION_POOL_SIZE,
+                             connect_timeout=NOTION_CONNECT_TIMEOUT,
+                             read_timeout=NOTION_READ_TIMEOUT,
+                             rate_limiter=notion_rate_limiter,
+                             retry_policies=notion_retry_policies)
+notion_upload_executor = ThreadPoolExecutor(max_workers=NOTION_UPLOAD_CONCURRENCY, thread_name_prefix="notion-upload")
+ledger_mirror = LedgerMirror(notion_client, NOTION_DATABASE_ID, db_path=LEDGER_MIRROR_PATH,
+                             refresh_interval=LEDGER_MIRROR_REFRESH_SECONDS,
+                             full_sync_hours=LEDGER_MIRROR_FULL_SYNC_HOURS) if (ENABLE_LEDGER_MIRROR and NOTION_DATABASE_ID) else None
+notion_validator = NotionValidator(NOTION_TOKEN, NOTION_DATABASE_ID, client=notion_client, mirror=ledger_mirror) if (NOTION_TOKEN and NOTION_DATABASE_ID) else None
 
 # Track image file paths for error correction
 IMAGE_FILE_TRACKER = {}  # {(date, merchant): filepath}
+# Receipts with the same date and merchant are checked and uploaded one at a time, so two photos
+# of one receipt processed concurrently cannot both pass the pre-upload duplicate check
+RECEIPT_LOCK_STRIPES = 32
+receipt_upload_locks = [threading.Lock() for _ in range(RECEIPT_LOCK_STRIPES)]
 
-def is_valid_image(filename, filepath=None):
-    if filepath and "Archive" in filepath:
-        return False
+# Receipt worker pool and stability monitor (started in __main__).
+# Handlers and scans only enqueue into them.
+worker_pool = None
+stability_monitor = None
+directory_scanner = None
+# Async engine and its clients (ASYNC_MODE only, created in __main__)
+async_engine = None
+async_openai_client = None
+async_notion_client = None
+async_stage_limits = {}
+async_receipt_locks = []
+
+def is_valid_image(filename):
     ext = os.path.splitext(filename)[1].lower()
     return ext in ['.jpg', '.jpeg', '.png', '.heic']
 
-def process_file(filepath):
+def enqueue_file(filepath):
+    """Hands a file to the stability monitor / worker pool, or processes it inline if none is running."""
+    if async_engine is not None:
+        if not history_manager.is_processed(filepath):
+            async_engine.submit(filepath)
+    elif stability_monitor is not None:
+        if worker_pool is not None and worker_pool.is_in_flight(filepath):
+            return
+        # History and age come from SQLite and os.stat; the monitor opens the file, which would
+        # download an old OneDrive placeholder only to mark it too_old
+        if should_skip_file(filepath):
+            return
+        stability_monitor.watch(filepath)
+    elif worker_pool is not None:
+        worker_pool.submit(filepath)
+    else:
+        process_file(filepath)
+
+def on_file_stable(filepath):
+    """Stability monitor callback. Returns False if the worker queue is full so the file is retried."""
+    if worker_pool is None:
+        process_file(filepath)
+        return True
+    return worker_pool.submit(filepath, block=False) or worker_pool.is_in_flight(filepath)
+
+def on_file_unstable(filepath):
+    """Stability monitor callback for files that never settled. The next scan picks them up again."""
+    logging.warning(f"[재시도 예정] {int(STABILITY_MAX_WAIT)}초 동안 동기화 미완료, 다음 스캔에서 다시 확인: {filepath}")
+
+def should_skip_file(filepath):
+    """Checks archive/history/age before any work is done. Returns True if the file must be skipped."""
     # Skip if in Archive or already processed
     if file_archiver and file_archiver.is_in_archive(filepath):
         logging.info(f"[건너뜀] 아카이브 폴더 안의 파일: {filepath}")
-        return
+        return True
     if history_manager.is_processed(filepath):
         logging.info(f"[건너뜀] 이미 처리된 파일: {filepath}")
-        return
+        return True
 
     # Skip files older than N days (OneDrive 동기화 시 촬영일 기준일 수 있음)
     max_age_days = int(os.getenv("MAX_FILE_AGE_DAYS", "7"))
@@ -81,299 +267,585 @@ def process_file(filepath):
         file_date = datetime.fromtimestamp(mtime)
         if datetime.now() - file_date > timedelta(days=max_age_days):
             logging.info(f"[건너뜀] {max_age_days}일 초과 파일 (수정일 {file_date.date()}): {filepath}")
-            history_manager.add_to_history(filepath)
-            return
+            history_manager.add_to_history(filepath, status="too_old", hash_file=False)
+            return True
     except FileNotFoundError:
         logging.warning(f"[건너뜀] 파일 없음 (동기화 대기 중?): {filepath}")
+        return True
+    return False
+
+def process_file(filepath):
+    if should_skip_file(filepath):
         return
 
     logging.info(f"Processing new file: {filepath}")
     short_name = os.path.basename(filepath)
-    set_status(file=short_name, status="동기화 대기 중...", error="")
-    
-    # OneDrive 등 동기화 완료 대기 (placeholder 해제 대기)
-    time.sleep(5)
-    if not os.path.exists(filepath):
-        set_status(status="건너뜀", error="대기 후에도 파일 없음 (동기화 미완료?)")
-        logging.warning(f"[건너뜀] 대기 후에도 파일 없음: {filepath}")
-        return
-    try:
-        if os.path.getsize(filepath) == 0:
-            set_status(status="건너뜀", error="파일 크기 0바이트 (동기화 미완료?)")
-            logging.warning(f"[건너뜀] 파일 크기 0바이트 (동기화 미완료?): {filepath}")
+    file_states.discover(filepath)
+
+    # OneDrive 등 동기화 완료 확인 (placeholder 해제 대기). 준비 안 된 파일은 안정화 대기열로 되돌림.
+    if not is_file_ready(filepath):
+        set_status(file=short_name, status="동기화 대기 중...", error="")
+        if stability_monitor is not None:
+            logging.info(f"[재대기] 동기화 미완료, 안정화 대기열로 되돌림: {filepath}")
+            stability_monitor.watch(filepath)
             return
-    except OSError:
-        return
-    
+        if not wait_until_stable(filepath, STABILITY_INITIAL_DELAY, STABILITY_MAX_DELAY, STABILITY_MAX_WAIT):
+            set_status(status="건너뜀", error="동기화 미완료 (대기 시간 초과)")
+            logging.warning(f"[건너뜀] 동기화 미완료 (대기 시간 초과): {filepath}")
+            return
+    set_status(file=short_name, status="처리 시작", error="")
+
     try:
-        set_status(status="AI 분석 중...", error="")
-        receipt_data = analyze_receipt(filepath)
-        if not receipt_data:
-            set_status(status="실패", error="AI 분석 결과 없음 (API/이미지 확인)")
-            logging.warning(f"AI 분석 결과 없음 (이미지/API 오류 가능): {filepath}")
+        state = resume_state(filepath)
+        # Read once for the same-content check, the analysis cache and the history
+        content_hash = read_content_hash(filepath)
+        if state is None and (check_same_content(filepath, content_hash)
+                              or not check_is_receipt(filepath, content_hash)):
             return
-        if not receipt_data.get("items"):
-            set_status(status="완료(항목 없음)", error="")
-            logging.info("No items found in receipt. Marking as processed.")
-            history_manager.add_to_history(filepath)
-            if file_archiver:
-                file_archiver.archive_file(filepath)
+        photo = check_near_duplicate(filepath, state, content_hash)
+        if photo is None:
             return
-        set_status(status="노션 업로드 중...", error="")
-        success_count, notion_error = add_items_to_notion(receipt_data, source_filepath=filepath)
-        total_items = len(receipt_data.get("items", []))
-        if success_count == 0 and notion_error:
-            set_status(status="노션 업로드 실패", error=notion_error)
-            logging.error(f"Notion에 추가된 항목 없음: {notion_error}")
+        if state is not None:
+            finish_receipt(filepath, photo, state["data"], state, content_hash)
             return
-        if success_count < total_items and notion_error:
-            set_status(status=f"일부만 추가됨 ({success_count}/{total_items})", error=notion_error)
-        if success_count == total_items and notion_error is None:
-            set_status(status="노션 업로드 완료", error="")
-        if ENABLE_VALIDATION or ENABLE_DUPLICATE_DETECTION:
+        set_status(status="AI 분석 중...", error="")
+        finish_receipt(filepath, photo, analyze_receipt(filepath, content_hash=content_hash), content_hash=content_hash)
+    except Exception as e:
+        report_processing_error(filepath, e)
+
+def resume_state(filepath):
+    """
+    Marks a ready file as stable. Returns its saved state if it was already analysed
+    before a restart (processing resumes from there), otherwise None.
+    """
+    state = file_states.get(filepath)
+    if FileStateStore.reached(state, "analyzed"):
+        logging.info(f"[이어서 처리] '{state['stage']}' 단계 이후부터 (업로드 {len(state['page_ids'])}개 완료): {filepath}")
+        return state
+    file_states.advance(filepath, "stable")
+    return None
+
+def finish_receipt(filepath, photo, receipt_data, state=None, content_hash=None):
+    """
+    Validation, upload, duplicate check, history and archiving of an analysed receipt.
+    With a saved `state` (see resume_state), stages it already completed are skipped.
+    `content_hash` (see read_content_hash) is stored in the history without reading the file again.
+
+    Returns:
+        True if the file was finished, False if there was no analysis or nothing was uploaded
+    """
+    if not receipt_data:
+        set_status(status="실패", error="AI 분석 결과 없음 (API/이미지 확인)")
+        logging.warning(f"AI 분석 결과 없음 (이미지/API 오류 가능): {filepath}")
+        return False
+    if not receipt_data.get("items"):
+        set_status(status="완료(항목 없음)", error="")
+        logging.info("No items found in receipt. Marking as processed.")
+        remember_photo(photo)
+        history_manager.add_to_history(filepath, content_hash=content_hash)
+        if file_archiver:
+            file_archiver.archive_file(filepath)
+        file_states.forget(filepath)
+        return True
+    if state is None:
+        if confirm_near_duplicate(filepath, photo, receipt_data, content_hash):
+            return True
+        if ENABLE_VALIDATION:
             set_status(status="검증 중...", error="")
+            errors = check_receipt_data(receipt_data)
+            if errors and ENABLE_AUTO_CORRECTION:
+                set_status(status="AI 재분석 중...", error="")
+                receipt_data = pick_corrected_data(receipt_data, errors,
+                                                   analyze_receipt(filepath, is_retry=True, content_hash=content_hash))
+        file_states.advance(filepath, "analyzed", receipt_data)
+        state = {"stage": "analyzed", "page_ids": {}}
+    total_items = len(receipt_data.get("items", []))
+    success_count, notion_error = total_items, None
+    if not FileStateStore.reached(state, "uploaded"):
+        set_status(status="노션 업로드 중...", error="")
+        success_count, notion_error = add_items_to_notion(receipt_data, source_filepath=filepath,
+                                                          uploaded=state["page_ids"])
+        if not report_upload_result(success_count, total_items, notion_error):
+            return False
+        file_states.advance(filepath, "uploaded")
+    if not FileStateStore.reached(state, "validated"):
+        if ENABLE_DUPLICATE_DETECTION:
+            set_status(status="중복 확인 중...", error="")
             validate_and_correct(receipt_data, filepath)
-        history_manager.add_to_history(filepath)
-        if file_archiver:
-            file_archiver.archive_file(filepath, receipt_date=receipt_data.get("date"))
-        if success_count == total_items:
-            set_status(status="완료", error="")
-        else:
-            set_status(status=f"완료 (노션 {success_count}/{total_items}개)", error=notion_error or "")
+        file_states.advance(filepath, "validated")
+    remember_photo(photo, receipt_data)
+    history_manager.add_to_history(filepath, content_hash=content_hash)
+    if file_archiver:
+        file_archiver.archive_file(filepath, receipt_date=receipt_data.get("date"))
+    # Done: the history covers the file from here on, so its state row is dropped
+    file_states.forget(filepath)
+    if success_count == total_items:
+        set_status(status="완료", error="")
+    else:
+        set_status(status=f"완료 (노션 {success_count}/{total_items}개)", error=notion_error or "")
+    return True
+
+async def process_file_async(filepath):
+    """Async counterpart of process_file, run on the async engine loop when ASYNC_MODE is on."""
+    # SQLite and disk bookkeeping runs off the event loop, like the analysis and upload steps
+    if await asyncio.to_thread(should_skip_file, filepath):
+        return
+
+    logging.info(f"Processing new file: {filepath}")
+    short_name = os.path.basename(filepath)
+    await asyncio.to_thread(file_states.discover, filepath)
+    set_status(file=short_name, status="동기화 대기 중...", error="")
+    if not await wait_until_stable_async(filepath, STABILITY_INITIAL_DELAY, STABILITY_MAX_DELAY, STABILITY_MAX_WAIT):
+        on_file_unstable(filepath)
+        return
+
+    try:
+        set_status(file=short_name, status="처리 시작", error="")
+        state = await asyncio.to_thread(resume_state, filepath)
+        content_hash = await asyncio.to_thread(read_content_hash, filepath)
+        if state is None and (await asyncio.to_thread(check_same_content, filepath, content_hash)
+                              or not await asyncio.to_thread(check_is_receipt, filepath, content_hash)):
+            return
+        photo = await asyncio.to_thread(check_near_duplicate, filepath, state, content_hash)
+        if photo is None:
+            return
+        if state is not None:
+            await finish_receipt_async(filepath, photo, state["data"], state, content_hash)
+            return
+        set_status(status="AI 분석 중...", error="")
+        async with async_stage_limits["analysis"]:
+            receipt_data = await analyze_receipt_async(filepath, content_hash=content_hash)
+        await finish_receipt_async(filepath, photo, receipt_data, content_hash=content_hash)
     except Exception as e:
-        import traceback
-        err_msg = str(e)
-        tb = traceback.format_exc()
-        if len(tb) > 400:
-            err_msg = err_msg + "\n" + tb[-400:]
-        else:
-            err_msg = err_msg + "\n" + tb
-        set_status(status="오류", error=err_msg)
-        logging.exception(f"Error processing {filepath}: {e}")
+        report_processing_error(filepath, e)
 
-def validate_and_correct(receipt_data, filepath):
+async def finish_receipt_async(filepath, photo, receipt_data, state=None, content_hash=None):
+    """Async counterpart of finish_receipt."""
+    if not receipt_data:
+        set_status(status="실패", error="AI 분석 결과 없음 (API/이미지 확인)")
+        logging.warning(f"AI 분석 결과 없음 (이미지/API 오류 가능): {filepath}")
+        return False
+    if not receipt_data.get("items"):
+        set_status(status="완료(항목 없음)", error="")
+        logging.info("No items found in receipt. Marking as processed.")
+        await asyncio.to_thread(remember_photo, photo)
+        await asyncio.to_thread(history_manager.add_to_history, filepath, content_hash=content_hash)
+        if file_archiver:
+            await asyncio.to_thread(file_archiver.archive_file, filepath)
+        await asyncio.to_thread(file_states.forget, filepath)
+        return True
+    if state is None:
+        if await asyncio.to_thread(confirm_near_duplicate, filepath, photo, receipt_data, content_hash):
+            return True
+        if ENABLE_VALIDATION:
+            set_status(status="검증 중...", error="")
+            errors = await asyncio.to_thread(check_receipt_data, receipt_data)
+            if errors and ENABLE_AUTO_CORRECTION:
+                set_status(status="AI 재분석 중...", error="")
+                async with async_stage_limits["analysis"]:
+                    retry_data = await analyze_receipt_async(filepath, is_retry=True, content_hash=content_hash)
+                receipt_data = pick_corrected_data(receipt_data, errors, retry_data)
+        await asyncio.to_thread(file_states.advance, filepath, "analyzed", receipt_data)
+        state = {"stage": "analyzed", "page_ids": {}}
+    total_items = len(receipt_data.get("items", []))
+    success_count, notion_error = total_items, None
+    if not FileStateStore.reached(state, "uploaded"):
+        set_status(status="노션 업로드 중...", error="")
+        success_count, notion_error = await add_items_to_notion_async(receipt_data, source_filepath=filepath,
+                                                                      uploaded=state["page_ids"])
+        if not report_upload_result(success_count, total_items, notion_error):
+            return False
+        await asyncio.to_thread(file_states.advance, filepath, "uploaded")
+    if not FileStateStore.reached(state, "validated"):
+        if ENABLE_DUPLICATE_DETECTION:
+            set_status(status="중복 확인 중...", error="")
+            await asyncio.to_thread(validate_and_correct, receipt_data, filepath)
+        await asyncio.to_thread(file_states.advance, filepath, "validated")
+    await asyncio.to_thread(remember_photo, photo, receipt_data)
+    await asyncio.to_thread(history_manager.add_to_history, filepath, content_hash=content_hash)
+    if file_archiver:
+        await asyncio.to_thread(file_archiver.archive_file, filepath, receipt_data.get("date"))
+    await asyncio.to_thread(file_states.forget, filepath)
+    if success_count == total_items:
+        set_status(status="완료", error="")
+    else:
+        set_status(status=f"완료 (노션 {success_count}/{total_items}개)", error=notion_error or "")
+    return True
+
+def read_content_hash(filepath):
+    """SHA-256 of the file, or None if it cannot be read. Computed once per pass and passed on."""
+    try:
+        return file_sha256(filepath)
+    except OSError:
+        return None
+
+def check_same_content(filepath, content_hash=None):
+    """
+    Skips a file whose bytes were already processed under another name (a renamed or
+    re-synced copy). The copy gets the original's status and is archived if it was a receipt.
+
+    Returns:
+        True if the file was skipped
+    """
+    content_hash = content_hash or read_content_hash(filepath)
+    if content_hash is None:
+        return False
+    original = history_manager.find_same_content(filepath, content_hash)
+    if original is None:
+        return False
+    record = history_manager.get_record(original)
+    status = record["status"] if record else "processed"
+    set_status(status="건너뜀 (이미 처리된 파일과 같은 내용)", error="")
+    logging.info(f"[건너뜀] 이미 처리된 파일과 같은 내용 ({os.path.basename(original)}): {filepath}")
+    history_manager.add_to_history(filepath, status=status, content_hash=content_hash)
+    if file_archiver and status in ("processed", "duplicate"):
+        file_archiver.archive_file(filepath)
+    file_states.forget(filepath)
+    return True
+
+def check_is_receipt(filepath, content_hash=None):
     """
-    Validate uploaded data and correct errors if needed
+    Local pre-classification before any network call. Photos that do not look like a
+    receipt are marked processed (not archived: they are ordinary camera-roll photos).
+
+    Returns:
+        False if the file was skipped
+    """
+    if receipt_classifier is None:
+        return True
+    is_receipt, score = receipt_classifier.is_receipt(filepath)
+    if is_receipt:
+        return True
+    set_status(status="건너뜀 (영수증 아님)", error="")
+    logging.info(f"[건너뜀] 영수증이 아닌 사진 (점수 {score:.2f} < {RECEIPT_SCORE_THRESHOLD}): {filepath}")
+    history_manager.add_to_history(filepath, status="not_receipt", content_hash=content_hash)
+    file_states.forget(filepath)
+    return False
+
+def check_near_duplicate(filepath, state=None, content_hash=None):
+    """
+    Skips another shot of a receipt that was just processed, before any AI call.
+    The skipped photo is marked processed and archived like the original.
+    A resumed file (saved `state`) is not checked: its items may already be uploaded,
+    and skipping it would leave them without their file_states row being finished.
+
+    Returns:
+        (filepath, perceptual hash, mtime, near-duplicate candidate) to pass to
+        confirm_near_duplicate and remember_photo, or None if the file was skipped
+    """
+    taken = os.path.getmtime(filepath)
+    if near_duplicate_index is None:
+        return (filepath, None, taken, None)
+    photo_hash = image_preprocessor.perceptual_hash(filepath)
+    if photo_hash is None:
+        return (filepath, None, taken, None)
+    match = near_duplicate_index.find(photo_hash, taken) if state is None else None
+    if match is None or not near_duplicate_index.is_certain(match):
+        return (filepath, photo_hash, taken, match)
+    skip_near_duplicate(filepath, match.path, content_hash)
+    return None
+
+def confirm_near_duplicate(filepath, photo, receipt_data, content_hash=None):
+    """
+    A photo that only looks similar to an earlier one (different receipts on the same table
+    hash alike) is skipped once its analysis shows the same merchant, date, item count and total.
+
+    Returns:
+        True if the file was skipped
+    """
+    match = photo[3]
+    if match is None or match.receipt is None:
+        return False
+    if match.receipt != NotionValidator.receipt_fingerprint(receipt_item_keys(receipt_data)):
+        logging.info(f"비슷한 사진이지만 다른 영수증 ({os.path.basename(match.path)}): {filepath}")
+        return False
+    skip_near_duplicate(filepath, match.path, content_hash)
+    return True
+
+def skip_near_duplicate(filepath, original, content_hash=None):
+    """Records and archives another shot of the receipt in `original`."""
+    set_status(status="건너뜀 (같은 영수증 사진)", error="")
+    logging.info(f"[건너뜀] 이미 처리한 영수증과 같은 사진 ({os.path.basename(original)}): {filepath}")
+    history_manager.add_to_history(filepath, status="duplicate", content_hash=content_hash)
+    if file_archiver:
+        file_archiver.archive_file(filepath)
+    file_states.forget(filepath)
+
+def remember_photo(photo, receipt_data=None):
+    """Adds a successfully processed photo to the near-duplicate index, with its receipt fingerprint."""
+    filepath, photo_hash, taken, _ = photo
+    if near_duplicate_index is not None and photo_hash is not None:
+        receipt = NotionValidator.receipt_fingerprint(receipt_item_keys(receipt_data)) if receipt_data else None
+        near_duplicate_index.add(photo_hash, filepath, taken, receipt)
+
+def report_upload_result(success_count, total_items, notion_error):
+    """Updates the status window after an upload. Returns False if nothing was added."""
+    if success_count == 0 and notion_error:
+        set_status(status="노션 업로드 실패", error=notion_error)
+        logging.error(f"Notion에 추가된 항목 없음: {notion_error}")
+        return False
+    if success_count < total_items and notion_error:
+        set_status(status=f"일부만 추가됨 ({success_count}/{total_items})", error=notion_error)
+    if success_count == total_items and notion_error is None:
+        set_status(status="노션 업로드 완료", error="")
+    return True
+
+def report_processing_error(filepath, e):
+    """Shows an unexpected processing error (with the end of the traceback) in the status window."""
+    import traceback
+    err_msg = str(e)
+    tb = traceback.format_exc()
+    if len(tb) > 400:
+        err_msg = err_msg + "\n" + tb[-400:]
+    else:
+        err_msg = err_msg + "\n" + tb
+    set_status(status="오류", error=err_msg)
+    logging.exception(f"Error processing {filepath}: {e}")
+
+def check_receipt_data(receipt_data):
+    """
+    Validates extracted receipt data locally, before anything is written to Notion.
     
-    Args:
-        receipt_data: The receipt data that was just uploaded
-        filepath: Path to the source image file
+    Returns:
+        List of validation error messages (empty if valid)
     """
     if notion_validator is None:
-        return
-    merchant = receipt_data.get("merchant")
-    date = receipt_data.get("date")
-    
-    # Step 1: Check for duplicates
-    if ENABLE_DUPLICATE_DETECTION:
-        logging.info("Checking for duplicate entries...")
-        try:
-            duplicates_removed = notion_validator.remove_duplicates()
-            if duplicates_removed > 0:
-                logging.info(f"Removed {duplicates_removed} duplicate entries")
-        except Exception as e:
-            logging.error(f"Error during duplicate detection: {e}")
-    
-    # Step 2: Validate data quality
-    if ENABLE_VALIDATION:
-        logging.info("Validating data quality...")
-        try:
-            # Get entries from this receipt
-            if filepath:
-                entry_ids = notion_validator.find_entries_by_source(filepath)
-            else:
-                entry_ids = notion_validator.find_entries_by_date_merchant(date, merchant)
-            
-            if not entry_ids:
-                logging.warning("Could not find uploaded entries for validation")
-                return
-            
-            # Validate each entry
-            entries = notion_validator.get_all_entries()
-            has_errors = False
-            
-            for entry in entries:
-                if entry.get("id") in entry_ids:
-                    errors = notion_validator.validate_entry(entry)
-                    if errors:
-                        has_errors = True
-                        item_name = notion_validator.extract_property_value(entry, "항목")
-                        logging.warning(f"Validation errors for '{item_name}': {', '.join(errors)}")
-            
-            # Step 3: Auto-correct if errors found
-            if has_errors and ENABLE_AUTO_CORRECTION:
-                logging.info("Validation errors detected. Starting auto-correction...")
-                correct_errors(filepath, date, merchant)
-            elif has_errors:
-                logging.warning("Validation errors found but auto-correction is disabled")
-                
-        except Exception as e:
-            logging.error(f"Error during validation: {e}")
+        return []
+    errors = notion_validator.validate_receipt_data(receipt_data)
+    for error in errors:
+        logging.warning(f"Validation error: {error}")
+    if errors and not ENABLE_AUTO_CORRECTION:
+        logging.warning("Validation errors found but auto-correction is disabled")
+    return errors
 
-def correct_errors(filepath, date, merchant):
+def pick_corrected_data(receipt_data, errors, corrected_data):
     """
-    Correct errors by re-analyzing image and replacing data
+    Chooses between the first extraction and the re-analysis done after validation errors.
+    The re-analysis is used only if it has items and fewer validation errors.
+    """
+    if not corrected_data or not corrected_data.get("items"):
+        logging.error("Re-analysis failed to extract data; uploading the first result")
+        return receipt_data
+    corrected_errors = check_receipt_data(corrected_data)
+    if len(corrected_errors) < len(errors):
+        logging.info(f"Using re-analyzed data ({len(errors)} -> {len(corrected_errors)} validation errors)")
+        return corrected_data
+    logging.warning("Re-analysis did not improve the data; uploading the first result")
+    return receipt_data
+
+def validate_and_correct(receipt_data, filepath):
+    """
+    Post-upload housekeeping: removes duplicate entries from the database.
+    Data quality is checked before upload (see check_receipt_data).
     
     Args:
+        receipt_data: The receipt data that was just uploaded
         filepath: Path to the source image file
-        date: Receipt date
-        merchant: Merchant name
     """
-    logging.info("Re-analyzing image for error correction...")
-    
+    if notion_validator is None or not ENABLE_DUPLICATE_DETECTION:
+        return
+    logging.info("Checking for duplicate entries...")
+    # Only this receipt's items are checked; the whole ledger is reconciled periodically
     try:
-        # Step 1: Re-analyze with enhanced prompt
-        corrected_data = analyze_receipt(filepath, is_retry=True)
-        
-        if not corrected_data or not corrected_data.get("items"):
-            logging.error("Re-analysis failed to extract data")
-            return
-        
-        # Step 2: Delete old incorrect entries
-        logging.info("Deleting old incorrect entries...")
-        if filepath:
-            old_entry_ids = notion_validator.find_entries_by_source(filepath)
-        else:
-            old_entry_ids = notion_validator.find_entries_by_date_merchant(date, merchant)
-        
-        deleted_count = 0
-        for entry_id in old_entry_ids:
-            if notion_validator.delete_entry(entry_id):
-                deleted_count += 1
-        
-        logging.info(f"Deleted {deleted_count} old entries")
-        
-        # Step 3: Upload corrected data
-        logging.info("Uploading corrected data...")
-        add_items_to_notion(corrected_data, source_filepath=filepath)
-        logging.info("Error correction completed successfully")
-        
+        duplicates_removed = notion_validator.remove_duplicates_for(receipt_item_keys(receipt_data))
+        if duplicates_removed > 0:
+            logging.info(f"Removed {duplicates_removed} duplicate entries")
     except Exception as e:
-        logging.error(f"Error during auto-correction: {e}")
+        logging.error(f"Error during duplicate detection: {e}")
 
-class ReceiptHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        if not event.is_directory and is_valid_image(os.path.basename(event.src_path), event.src_path):
-            logging.info(f"Detected creation: {event.src_path}")
-            process_file(event.src_path)
+def run_duplicate_reconciliation(stop_event):
+    """Background thread: full-ledger duplicate scan every DUPLICATE_RECONCILE_HOURS."""
+    while not stop_event.wait(DUPLICATE_RECONCILE_HOURS * 3600):
+        if notion_validator is None:
+            continue
+        try:
+            removed = notion_validator.remove_duplicates()
+            logging.info(f"Duplicate reconciliation finished: {removed} removed")
+        except Exception as e:
+            logging.error(f"Error during duplicate reconciliation: {e}")
 
-    def on_moved(self, event):
-        if not event.is_directory and is_valid_image(os.path.basename(event.dest_path), event.dest_path):
-            logging.info(f"Detected move/rename: {event.dest_path}")
-            process_file(event.dest_path)
+class ReceiptHandler:
+    """Receives one "file ready" signal per image from the EventCoalescer in front of it."""
 
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    def on_file_ready(self, filepath):
+        logging.info(f"Detected new/changed image: {filepath}")
+        enqueue_file(filepath)
 
-def analyze_receipt(image_path, is_retry=False):
+def analyze_receipt(image_path, is_retry=False, content_hash=None):
     """
     Analyze receipt image with AI
     
     Args:
         image_path: Path to the receipt image
         is_retry: If True, use enhanced prompt for error correction
+        content_hash: SHA-256 of the image if already known (see read_content_hash)
     """
     logging.info(f"Analyzing image with AI... (retry={is_retry})")
+
     try:
-        base64_image = encode_image(image_path)
+        cache_key, cached = lookup_cached_analysis(image_path, is_retry, content_hash)
+        if cached is not None:
+            return cached
+        # 축소·회전·재압축된 이미지 (재분석 시 캐시된 결과 재사용)
+        image_url = image_preprocessor.prepare(image_path).to_data_url()
     except Exception as e:
         logging.error(f"Failed to read image: {e}")
         return None
 
-    # Enhanced prompt for retry attempts
-    if is_retry:
-        prompt = """
-        IMPORTANT: This is a re-analysis due to data quality issues. Please be extra careful and accurate.
-        
-        Analyze this receipt image and extract the following information.
-        Return a JSON object with this structure:
-        {
-            "merchant": "Merchant Name",
-            "date": "YYYY-MM-DD",
-            "items": [
-                {
-                    "name": "Item Name",
-                    "quantity": 1,
-                    "unit_price": 1000,
-                    "total_price": 1000,
-                    "category": "One of: 식재료, 가공식품, 간식, 채소, 과일, 생활용품, 기타"
-                }
-            ]
-        }
-        
-        CRITICAL REQUIREMENTS:
-        - "merchant": Extract the EXACT store name from the receipt.
-        - "date": Must be in YYYY-MM-DD format. Double-check the date.
-        - "items": Extract ALL items, do not skip any.
-        - "name": Use the exact item name from the receipt.
-        - "quantity": Must be a positive integer.
-        - "unit_price" and "total_price": Must be positive numbers. Remove all currency symbols (₩, 원, etc.).
-        - "category": Choose the MOST APPROPRIATE category from: 식재료, 가공식품, 간식, 채소, 과일, 생활용품, 기타
-        
-        Double-check all numbers and ensure no fields are missing.
-        """
-    else:
-        # Standard prompt for first attempt
-        prompt = """
-        Analyze this receipt image and extract the following information.
-        Return a JSON object with this structure:
-        {
-            "merchant": "Merchant Name",
-            "date": "YYYY-MM-DD",
-            "items": [
-                {
-                    "name": "Item Name",
-                    "quantity": 1,
-                    "unit_price": 1000,
-                    "total_price": 1000,
-                    "category": "One of: 식재료, 가공식품, 간식, 채소, 과일, 생활용품, 기타"
-                }
-            ]
-        }
-        - "merchant": The store name.
-        - "date": The transaction date in YYYY-MM-DD format.
-        - "items": Array of purchased items.
-        - "category": Infer the category based on the item name from the given list.
-        - Remove currency symbols from prices.
-        - Ensure all prices are positive numbers.
-        """
+    def call(model):
+        request = build_analysis_request(image_url, is_retry, model)
+        response = openai_retry_policy.call(lambda: client.chat.completions.create(**request),
+                                            classify=openai_retry_after, description=f"OpenAI request ({model})")
+        return parse_analysis_response(response), response.usage
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a receipt scanner. Output only valid JSON."
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                    ]
-                }
-            ],
-            response_format={"type": "json_object"}
-        )
-        
-        content = response.choices[0].message.content
-        if not content:
-            return None
-            
-        data = json.loads(content)
-        logging.info(f"Extracted {len(data.get('items', []))} items from receipt.")
-        return data
+        data = model_ladder.run(call, [model_ladder.top_model] if is_retry else None)
+        return store_analysis(data, cache_key)
     except Exception as e:
         logging.error(f"OpenAI API Error: {e}")
         if hasattr(e, 'response'):
              logging.error(f"OpenAI Response: {e.response}")
         return None
 
-def add_items_to_notion(data, source_filepath=None):
+async def analyze_receipt_async(image_path, is_retry=False, content_hash=None):
+    """Async variant of analyze_receipt using AsyncOpenAI. File work runs in a thread."""
+    logging.info(f"Analyzing image with AI... (retry={is_retry})")
+
+    try:
+        cache_key, cached = await asyncio.to_thread(lookup_cached_analysis, image_path, is_retry, content_hash)
+        if cached is not None:
+            return cached
+        prepared = await asyncio.to_thread(image_preprocessor.prepare, image_path)
+        image_url = prepared.to_data_url()
+    except Exception as e:
+        logging.error(f"Failed to read image: {e}")
+        return None
+
+    async def call(model):
+        request = build_analysis_request(image_url, is_retry, model)
+        response = await openai_retry_policy.call_async(lambda: async_openai_client.chat.completions.create(**request),
+                                                        classify=openai_retry_after, description=f"OpenAI request ({model})")
+        return parse_analysis_response(response), response.usage
+
+    try:
+        data = await model_ladder.run_async(call, [model_ladder.top_model] if is_retry else None)
+        return await asyncio.to_thread(store_analysis, data, cache_key)
+    except Exception as e:
+        logging.error(f"OpenAI API Error: {e}")
+        return None
+
+def lookup_cached_analysis(image_path, is_retry, content_hash=None):
+    """
+    Same bytes + same prompt/model → reuse the earlier result without calling the API.
+
+    Returns:
+        tuple: (cache_key, cached_data). Both are None when the cache is disabled.
+    """
+    if analysis_cache is None:
+        return (None, None)
+    models = model_ladder.top_model if is_retry else model_ladder.tag()
+    version_tag = f"{models}:{PROMPT_VERSION}:{image_preprocessor.settings_tag()}:{'retry' if is_retry else 'first'}"
+    cache_key = AnalysisCache.make_key(content_hash or file_sha256(image_path), version_tag)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        logging.info(f"[캐시] 이전 분석 결과 재사용 ({len(cached.get('items', []))} items)")
+    return (cache_key, cached)
+
+# Structured output schema of the analysis answer. Strict mode makes the API reject answers
+# with missing fields, non-numeric prices or categories the validator would not accept.
+RECEIPT_SCHEMA = {
+    "name": "receipt",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "merchant": {"type": "string", "description": "Exact store name"},
+            "date": {"type": ["string", "null"], "pattern": "^\\d{4}-\\d{2}-\\d{2}$",
+                     "description": "Transaction date, YYYY-MM-DD, or null if no date is printed"},
+            "items": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string", "description": "Item name as printed"},
+                        "quantity": {"type": "number", "description": "Count, or weight/volume for items sold by kg or L"},
+                        "unit_price": {"type": "number"},
+                        "total_price": {"type": "number"},
+                        "category": {"type": "string", "enum": list(NotionValidator.VALID_CATEGORIES)}
+                    },
+                    "required": ["name", "quantity", "unit_price", "total_price", "category"],
+                    "additionalProperties": False
+                }
+            },
+            "confidence": {"type": "number", "description": "0-1 confidence that every item, price and the date (if printed) were read correctly"}
+        },
+        "required": ["merchant", "date", "items", "confidence"],
+        "additionalProperties": False
+    }
+}
+
+def build_analysis_request(image_url, is_retry=False, model=ANALYSIS_MODEL):
+    """Builds the chat.completions.create arguments for a receipt image."""
+    # Field formats and categories are enforced by RECEIPT_SCHEMA
+    prompt = "Extract the merchant, date and ALL purchased items from this receipt. Prices are positive numbers without currency symbols."
+    if is_retry:
+        # Enhanced prompt for retry attempts
+        prompt = "IMPORTANT: This is a re-analysis due to data quality issues. Double-check the date and every price. " + prompt
+
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are a receipt scanner."
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": image_url}}
+                ]
+            }
+        ],
+        "response_format": {"type": "json_schema", "json_schema": RECEIPT_SCHEMA}
+    }
+
+def parse_analysis_response(response):
+    """Parses the model's JSON answer."""
+    message = response.choices[0].message
+    content = message.content
+    if not content:
+        if getattr(message, "refusal", None):
+            logging.warning(f"Model refused the receipt: {message.refusal}")
+        return None
+        
+    data = json.loads(content)
+    logging.info(f"Extracted {len(data.get('items', []))} items from receipt.")
+    return data
+
+def store_analysis(data, cache_key=None):
+    """Stores the accepted answer in the analysis cache and returns it."""
+    if cache_key is not None and isinstance(data, dict):
+        analysis_cache.put(cache_key, data)
+    return data
+
+def openai_retry_after(error):
+    """Retry classifier for OpenAI errors: Retry-After seconds (0 if unknown) or None if not retryable."""
+    if not isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return None
+    if isinstance(error, openai.RateLimitError) and getattr(error, "code", None) == "insufficient_quota":
+        # 크레딧 부족은 기다려도 해결되지 않음
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    return parse_retry_after(headers.get("retry-after")) or 0.0
+
+def add_items_to_notion(data, source_filepath=None, uploaded=None):
     """
     Upload items to Notion database.
+    Each created page is recorded in file_states, so a restart only uploads the rest.
+
+    Args:
+        uploaded: {item index: page id} of items created before a restart (not posted again)
 
     Returns:
         tuple: (success_count, error_message). error_message is set on first failure.
@@ -382,13 +854,6 @@ def add_items_to_notion(data, source_filepath=None):
         return (0, None)
 
     logging.info("Uploading items to Notion...")
-    url = "https://api.notion.com/v1/pages"
-    
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28"
-    }
 
     merchant_name = data.get("merchant") or "Unknown"
     receipt_date = data.get("date")
@@ -397,84 +862,352 @@ def add_items_to_notion(data, source_filepath=None):
     if receipt_date and merchant_name and source_filepath:
         IMAGE_FILE_TRACKER[(receipt_date, merchant_name)] = source_filepath
 
-    success_count = 0
-    first_error = None
-    
-    for item in data["items"]:
-        item_name = item.get("name") or "Unknown Item"
-        qty = item.get("quantity", 1)
-        unit_price = item.get("unit_price", 0)
-        total_price = item.get("total_price", 0)
-        category = item.get("category", "기타")
-
-        payload = {
-            "parent": {"database_id": NOTION_DATABASE_ID},
-            "properties": {
-                "항목": {
-                    "title": [
-                        {"text": {"content": item_name}}
-                    ]
-                },
-                "날짜": {
-                    "date": {"start": receipt_date} 
-                } if receipt_date else None,
-                "합계": {
-                    "number": total_price
-                },
-                "단가": {
-                    "number": unit_price
-                },
-                "수량": {
-                    "number": qty
-                },
-                "분류": {
-                    "select": {
-                        "name": category
-                    }
-                },
-                "사용처": {
-                     "rich_text": [
-                        {"text": {"content": merchant_name}}
-                    ]
-                }
-            }
-        }
-        
-        # 원본파일은 DB에 해당 속성이 있을 때만 사용 (없으면 400 오류). 현재는 전송하지 않음.
-        # 필요 시 노션 DB에 "원본파일" rich_text 속성을 추가한 뒤 아래 주석 해제.
-        # if source_filepath:
-        #     payload["properties"]["원본파일"] = {"rich_text": [{"text": {"content": source_filepath}}]}
-        
-        # Remove Date if None to avoid error
-        if payload["properties"]["날짜"] is None:
-            del payload["properties"]["날짜"]
-            
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            if response.status_code == 200:
+    with receipt_upload_locks[receipt_lock_index(data)]:
+        # Items already in the ledger (same receipt photographed twice) are skipped without any API call
+        item_keys = receipt_item_keys(data)
+        known = find_known_items(item_keys) | set(uploaded or {})
+
+        # Items are posted concurrently; the shared rate limiter keeps the process under Notion's limit.
+        # Identical lines go in one task, one after another, so their applied-checks can tell them apart.
+        groups, claimed = group_identical_items(item_keys, known, uploaded)
+        futures = [(indexes, notion_upload_executor.submit(post_pages, [build_page_payload(data["items"][index], merchant_name, receipt_date, source_filepath)
+                                                                        for index in indexes], claimed[key]))
+                   for key, indexes in groups.items()]
+        result_of = {index: (future, position) for indexes, future in futures for position, index in enumerate(indexes)}
+
+        success_count = len(known)
+        first_error = None
+        created_ids = []
+        # Results are read in item order so first_error stays the error of the first failing item
+        for index in sorted(result_of):
+            future, position = result_of[index]
+            page_id, error = future.result()[position]
+            if error is None:
                 success_count += 1
-            else:
-                err = f"Notion API {response.status_code}: {response.text[:300]}"
-                if not first_error:
-                    first_error = err
-                logging.error(f"Failed to add item '{item_name}': {response.status_code} - {response.text}")
-        except Exception as e:
-            err = f"Notion 요청 오류: {e}"
-            if not first_error:
-                first_error = err
-            logging.error(f"Notion API Error: {e}")
-            
+                created_ids.append(page_id)
+                if source_filepath:
+                    file_states.record_page(source_filepath, index, page_id)
+            elif not first_error:
+                first_error = error
+
+        if created_ids and notion_validator is not None:
+            notion_validator.record_receipt(item_keys, created_ids)
+    logging.info(f"Successfully added {success_count} / {len(data['items'])} items to Notion.")
+    return (success_count, first_error)
+
+async def add_items_to_notion_async(data, source_filepath=None, uploaded=None):
+    """Async variant of add_items_to_notion over the shared httpx.AsyncClient."""
+    if not data or not data.get("items"):
+        return (0, None)
+
+    logging.info("Uploading items to Notion...")
+    merchant_name = data.get("merchant") or "Unknown"
+    receipt_date = data.get("date")
+    if receipt_date and merchant_name and source_filepath:
+        IMAGE_FILE_TRACKER[(receipt_date, merchant_name)] = source_filepath
+
+    item_keys = receipt_item_keys(data)
+    async with async_receipt_locks[receipt_lock_index(data)]:
+        # The check may sync the ledger mirror, so it runs off the event loop
+        known = await asyncio.to_thread(find_known_items, item_keys) | set(uploaded or {})
+        groups, claimed = group_identical_items(item_keys, known, uploaded)
+        group_results = await asyncio.gather(*(post_pages_async([build_page_payload(data["items"][index], merchant_name, receipt_date, source_filepath)
+                                                                 for index in indexes], claimed[key])
+                                               for key, indexes in groups.items()))
+        merged = {}
+        for indexes, page_results in zip(groups.values(), group_results):
+            merged.update(zip(indexes, page_results))
+        indexes = sorted(merged)
+        results = [merged[index] for index in indexes]
+
+        created_ids = []
+        for index, (page_id, error) in zip(indexes, results):
+            if error is None:
+                created_ids.append(page_id)
+                if source_filepath:
+                    await asyncio.to_thread(file_states.record_page, source_filepath, index, page_id)
+        if created_ids and notion_validator is not None:
+            await asyncio.to_thread(notion_validator.record_receipt, item_keys, created_ids)
+    success_count = len(known) + len(created_ids)
+    first_error = next((error for _, error in results if error is not None), None)
     logging.info(f"Successfully added {success_count} / {len(data['items'])} items to Notion.")
     return (success_count, first_error)
 
-def scan_directory():
-    """Manual scan to catch missed files"""
-    logging.info("Polling directory for new files...")
-    for root, dirs, files in os.walk(WATCH_DIR):
-        for file in files:
+async def post_pages_async(payloads, claimed):
+    """Async variant of post_pages."""
+    return [await post_page_async(payload, claimed) for payload in payloads]
+
+async def post_page_async(payload, claimed=None):
+    """Async variant of post_page. Returns (page_id, None) on success, otherwise (None, error message)."""
+    item_name = payload["properties"]["항목"]["title"][0]["text"]["content"]
+    claimed = claimed if claimed is not None else []
+    applied_check = None
+    if notion_validator is not None:
+        since = (datetime.now(timezone.utc) - timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:00.000Z")
+        applied_check = lambda: asyncio.to_thread(notion_validator.find_created_page, payload["properties"], since, list(claimed))
+    try:
+        async with async_stage_limits["upload"]:
+            response = await async_notion_client.post("/pages", json=payload, applied_check=applied_check)
+        if response.status_code == 200:
+            page = response.json()
+            claimed.append(page.get("id"))
+            if notion_validator is not None:
+                await asyncio.to_thread(notion_validator.record_page, page)
+            return (page.get("id"), None)
+        logging.error(f"Failed to add item '{item_name}': {response.status_code} - {response.text}")
+        return (None, f"Notion API {response.status_code}: {response.text[:300]}")
+    except Exception as e:
+        logging.error(f"Notion API Error: {e}")
+        return (None, f"Notion 요청 오류: {e}")
+
+def receipt_item_keys(data):
+    """(item name, date, merchant, total price) of each item, as they are written to Notion."""
+    merchant_name = data.get("merchant") or "Unknown"
+    return [(item.get("name") or "Unknown Item", data.get("date"), merchant_name, item.get("total_price", 0))
+            for item in data.get("items", [])]
+
+def receipt_lock_index(data):
+    """Stripe of receipt_upload_locks / async_receipt_locks used for a receipt."""
+    merchant = str(data.get("merchant") or "Unknown").strip().lower()
+    return hash((data.get("date"), merchant)) % RECEIPT_LOCK_STRIPES
+
+def group_identical_items(item_keys, known, uploaded=None):
+    """
+    Groups the items still to upload by their receipt_item_keys.
+
+    Returns:
+        tuple: ({key: [item indexes]}, {key: [page ids already created for that key]})
+    """
+    groups, claimed = {}, {}
+    for index, key in enumerate(item_keys):
+        claimed.setdefault(key, [])
+        if index not in known:
+            groups.setdefault(key, []).append(index)
+    for index, page_id in (uploaded or {}).items():
+        if index < len(item_keys) and page_id:
+            claimed[item_keys[index]].append(page_id)
+    return groups, claimed
+
+def find_known_items(item_keys):
+    """Indexes of items already in the ledger, per the local mirror (no API call)."""
+    if notion_validator is None or not ENABLE_DUPLICATE_DETECTION:
+        return set()
+    try:
+        known = notion_validator.find_known_items(item_keys)
+    except Exception as e:
+        logging.error(f"Error during pre-upload duplicate check: {e}")
+        return set()
+    if known:
+        names = ", ".join(item_keys[index][0] for index in sorted(known))
+        logging.info(f"Skipping {len(known)} / {len(item_keys)} items already in Notion: {names}")
+    return known
+
+def build_page_payload(item, merchant_name, receipt_date, source_filepath=None):
+    """Builds the POST /pages payload for one receipt item."""
+    item_name = item.get("name") or "Unknown Item"
+    qty = item.get("quantity", 1)
+    unit_price = item.get("unit_price", 0)
+    total_price = item.get("total_price", 0)
+    category = item.get("category", "기타")
+
+    payload = {
+        "parent": {"database_id": NOTION_DATABASE_ID},
+        "properties": {
+            "항목": {
+                "title": [
+                    {"text": {"content": item_name}}
+                ]
+            },
+            "날짜": {
+                "date": {"start": receipt_date} 
+            } if receipt_date else None,
+            "합계": {
+                "number": total_price
+            },
+            "단가": {
+                "number": unit_price
+            },
+            "수량": {
+                "number": qty
+            },
+            "분류": {
+                "select": {
+                    "name": category
+                }
+            },
+            "사용처": {
+                 "rich_text": [
+                    {"text": {"content": merchant_name}}
+                ]
+            }
+        }
+    }
+    
+    # 원본파일은 DB에 해당 속성이 있을 때만 사용 (없으면 400 오류). 현재는 전송하지 않음.
+    # 필요 시 노션 DB에 "원본파일" rich_text 속성을 추가한 뒤 아래 주석 해제.
+    # if source_filepath:
+    #     payload["properties"]["원본파일"] = {"rich_text": [{"text": {"content": source_filepath}}]}
+    
+    # Remove Date if None to avoid error
+    if payload["properties"]["날짜"] is None:
+        del payload["properties"]["날짜"]
+    return payload
+
+def post_pages(payloads, claimed):
+    """Creates the pages of identical receipt lines one after another. Returns post_page results in order."""
+    return [post_page(payload, claimed) for payload in payloads]
+
+def post_page(payload, claimed=None):
+    """
+    Creates one Notion page.
+
+    Args:
+        claimed: Page ids already created for identical lines of the same receipt; the new
+            page id is appended
+
+    Returns:
+        tuple: (page_id, None) on success, otherwise (None, error message)
+    """
+    item_name = payload["properties"]["항목"]["title"][0]["text"]["content"]
+    claimed = claimed if claimed is not None else []
+    # Notion has no idempotency keys: after an ambiguous failure, look for the page before re-posting.
+    # A page already claimed by an identical line is not ours, or that line's item would be lost.
+    applied_check = None
+    if notion_validator is not None:
+        since = (datetime.now(timezone.utc) - timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:00.000Z")
+        applied_check = lambda: notion_validator.find_created_page(payload["properties"], since, list(claimed))
+    try:
+        response = notion_client.post("/pages", json=payload, applied_check=applied_check)
+        if response.status_code == 200:
+            page = response.json()
+            claimed.append(page.get("id"))
+            if notion_validator is not None:
+                notion_validator.record_page(page)
+            return (page.get("id"), None)
+        logging.error(f"Failed to add item '{item_name}': {response.status_code} - {response.text}")
+        return (None, f"Notion API {response.status_code}: {response.text[:300]}")
+    except Exception as e:
+        logging.error(f"Notion API Error: {e}")
+        return (None, f"Notion 요청 오류: {e}")
+
+def start_async_engine():
+    """Starts the asyncio engine and creates its clients on the engine loop (ASYNC_MODE)."""
+    global async_engine, async_openai_client, async_notion_client, async_stage_limits, async_receipt_locks
+    async_engine = AsyncReceiptEngine(process_file_async, max_in_flight=ASYNC_MAX_IN_FLIGHT)
+    async_engine.start()
+
+    async def create_clients():
+        return (
+            AsyncOpenAI(api_key=OPEN_AI_API_KEY, max_retries=0),
+            AsyncNotionClient(NOTION_TOKEN, max_connections=NOTION_POOL_SIZE,
+                              connect_timeout=NOTION_CONNECT_TIMEOUT,
+                              read_timeout=NOTION_READ_TIMEOUT,
+                              rate_limiter=notion_rate_limiter,
+                              retry_policies=notion_retry_policies),
+            {
+                "analysis": asyncio.Semaphore(ASYNC_ANALYSIS_CONCURRENCY),
+                "upload": asyncio.Semaphore(ASYNC_UPLOAD_CONCURRENCY),
+            },
+            [asyncio.Lock() for _ in range(RECEIPT_LOCK_STRIPES)],
+        )
+
+    async_openai_client, async_notion_client, async_stage_limits, async_receipt_locks = async_engine.run(create_clients())
+
+def stop_async_engine(wait=True):
+    """Waits for in-flight receipts, closes the async clients and stops the engine loop."""
+    global async_engine
+
+    async def close_clients():
+        await async_notion_client.aclose()
+        await async_openai_client.close()
+
+    logging.info(f"Draining {async_engine.pending_count()} in-flight files...")
+    async_engine.shutdown(wait=wait, cleanup=close_clients)
+    async_engine = None
+
+def reconcile_watch_dir(catch_up=False):
+    """
+    Diffs WATCH_DIR against the saved snapshot and enqueues created, modified and moved images.
+    On full passes and the startup catch-up, snapshot files missing from the history (processing
+    failed or was cut off) are enqueued again too.
+    """
+    started = time.perf_counter()
+    diff = directory_scanner.scan()
+    for src, dest in diff.files_moved:
+        logging.info(f"Detected move/rename: {src} -> {dest}")
+    paths = diff.paths_to_check()
+    if diff.full or catch_up:
+        changed = set(paths)
+        paths += [path for path in directory_scanner.known_files()
+                  if path not in changed and not history_manager.is_processed(path)]
+    for filepath in paths:
+        enqueue_file(filepath)
+    directory_scanner.save()
+    if diff or diff.full or catch_up:
+        label = "Catch-up since last run" if catch_up else "Reconciled watch directory"
+        logging.info(f"{label}: {diff}, {len(paths)} files enqueued ({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+def collect_backlog_files(directory):
+    """Images under `directory` that are neither archived nor processed (no age limit)."""
+    for root, dirs, files in os.walk(directory):
+        # Only the archive itself is left out, not every folder with "Archive" in its name
+        if file_archiver:
+            dirs[:] = [d for d in dirs if not file_archiver.is_in_archive(os.path.join(root, d))]
+        for file in sorted(files):
             filepath = os.path.join(root, file)
-            if is_valid_image(file, filepath):
-                process_file(filepath)
+            if is_valid_image(file) and not history_manager.is_processed(filepath):
+                yield filepath
+
+def build_batch_request(filepath):
+    """Batch request body for a backlog image, or None if it is not a new receipt."""
+    content_hash = read_content_hash(filepath)
+    if check_same_content(filepath, content_hash) or not check_is_receipt(filepath, content_hash):
+        return None
+    image_url = image_preprocessor.prepare(filepath).to_data_url()
+    return build_analysis_request(image_url, model=BATCH_ANALYSIS_MODEL)
+
+def handle_batch_result(filepath, completion):
+    """
+    Feeds a batch answer through the normal upload/archive path (live analysis if the batch had none).
+
+    Returns:
+        True if the file is done with, False if it failed and must be submitted again by the next run
+    """
+    if not os.path.exists(filepath) or history_manager.is_processed(filepath):
+        logging.info(f"[건너뜀] 이미 처리되었거나 없는 파일: {filepath}")
+        return True
+    set_status(file=os.path.basename(filepath), status="배치 결과 처리 중...", error="")
+    try:
+        state = file_states.get(filepath)
+        if not FileStateStore.reached(state, "analyzed"):
+            state = None
+        content_hash = read_content_hash(filepath)
+        photo = check_near_duplicate(filepath, state, content_hash)
+        if photo is None:
+            return True
+        if state is not None:
+            return finish_receipt(filepath, photo, state["data"], state, content_hash)
+        receipt_data = parse_analysis_response(completion) if completion is not None else None
+        if receipt_data is None:
+            set_status(status="AI 분석 중...", error="")
+            receipt_data = analyze_receipt(filepath, content_hash=content_hash)
+        return finish_receipt(filepath, photo, receipt_data, content_hash=content_hash)
+    except Exception as e:
+        report_processing_error(filepath, e)
+        return False
+
+def run_backlog_import(directory):
+    """
+    Bulk import of old receipts: submits every unprocessed image under `directory` as
+    OpenAI Batch jobs, waits for them and uploads the results. Safe to interrupt and rerun.
+    """
+    importer = BatchImporter(client, BATCH_MANIFEST_PATH, max_files_per_batch=BATCH_MAX_FILES,
+                             max_bytes_per_batch=BATCH_MAX_MB * 1024 * 1024, poll_interval=BATCH_POLL_SECONDS)
+    submitted = importer.submit(collect_backlog_files(directory), build_batch_request)
+    logging.info(f"[배치] 새로 제출 {submitted}개, 결과 대기 {importer.pending_count()}개")
+    importer.wait()
+    handled = importer.handle_results(handle_batch_result)
+    logging.info(f"[배치] 완료: {handled}개 파일 처리")
 
 
 def run_status_window(watch_dir):
@@ -570,8 +1303,17 @@ if __name__ == "__main__":
                     exit(1)
                 else:
                     # Re-initialize clients (module-level names)
-                    client = OpenAI(api_key=OPEN_AI_API_KEY)
-                    notion_validator = NotionValidator(NOTION_TOKEN, NOTION_DATABASE_ID)
+                    client = OpenAI(api_key=OPEN_AI_API_KEY, max_retries=0)
+                    notion_client = NotionClient(NOTION_TOKEN, pool_size=NOTION_POOL_SIZE,
+                                                 connect_timeout=NOTION_CONNECT_TIMEOUT,
+                                                 read_timeout=NOTION_READ_TIMEOUT,
+                                                 rate_limiter=notion_rate_limiter,
+                                                 retry_policies=notion_retry_policies)
+                    if ENABLE_LEDGER_MIRROR:
+                        ledger_mirror = LedgerMirror(notion_client, NOTION_DATABASE_ID, db_path=LEDGER_MIRROR_PATH,
+                                                     refresh_interval=LEDGER_MIRROR_REFRESH_SECONDS,
+                                                     full_sync_hours=LEDGER_MIRROR_FULL_SYNC_HOURS)
+                    notion_validator = NotionValidator(NOTION_TOKEN, NOTION_DATABASE_ID, client=notion_client, mirror=ledger_mirror)
             except Exception as e:
                 logging.error(f"Failed to run setup wizard: {e}")
                 exit(1)
@@ -579,33 +1321,113 @@ if __name__ == "__main__":
             logging.error("Setup wizard not found. Please create .env file manually.")
             exit(1)
     
+    if len(sys.argv) > 1 and sys.argv[1] == "backlog":
+        backlog_dir = sys.argv[2] if len(sys.argv) > 2 else WATCH_DIR
+        if not backlog_dir:
+            logging.error("Usage: python main.py backlog [DIR] (or set WATCH_DIR)")
+            exit(1)
+        try:
+            run_backlog_import(backlog_dir)
+        except KeyboardInterrupt:
+            logging.info("[배치] 중단됨. 다시 실행하면 이어서 진행합니다.")
+        notion_upload_executor.shutdown(wait=True)
+        model_ladder.log_stats()
+        notion_client.log_stats()
+        notion_client.close()
+        if ledger_mirror is not None:
+            ledger_mirror.close()
+        file_states.close()
+        history_manager.close()
+        exit(0)
+
     if not WATCH_DIR:
         logging.error("WATCH_DIR is not set in .env. Exiting.")
         exit(1)
     logging.info(f"Monitoring Directory (Recursive): {WATCH_DIR}")
+    if HISTORY_RETENTION_DAYS > 0:
+        history_manager.compact(HISTORY_RETENTION_DAYS)
+    directory_scanner = IncrementalScanner(WATCH_DIR, SCAN_CACHE_PATH, exclude_dirs=[file_archiver.archive_root],
+                                           match=is_valid_image, full_scan_interval=SCAN_FULL_MINUTES * 60)
     
     # 0. 실행 상태 확인창 (별도 스레드)
     status_window_running = True
     status_thread = threading.Thread(target=run_status_window, args=(WATCH_DIR,), daemon=True)
     status_thread.start()
     
-    # 1. Start Watchdog
+    # 1. Start receipt workers and the file stability monitor (or the asyncio engine)
+    if ASYNC_MODE:
+        start_async_engine()
+    else:
+        worker_pool = ReceiptWorkerPool(process_file, num_workers=WORKER_COUNT, max_queue_size=WORKER_QUEUE_SIZE)
+        worker_pool.start()
+        stability_monitor = FileStabilityMonitor(on_file_stable, on_timeout=on_file_unstable,
+                                                 initial_delay=STABILITY_INITIAL_DELAY,
+                                                 max_delay=STABILITY_MAX_DELAY,
+                                                 max_wait=STABILITY_MAX_WAIT)
+        stability_monitor.start()
+
+    # Files interrupted by the last shutdown resume at the stage where they stopped
+    unfinished = file_states.unfinished()
+    if unfinished:
+        logging.info(f"[이어서 처리] 중단된 파일 {len(unfinished)}개를 멈춘 단계부터 다시 처리합니다.")
+        for filepath in unfinished:
+            if os.path.exists(filepath):
+                enqueue_file(filepath)
+            else:
+                file_states.forget(filepath)
+
+    # Fill / catch up the ledger mirror in the background. Uploads and lookups go on during the
+    # download; only a pre-upload duplicate check waits for it to finish.
+    if ledger_mirror is not None:
+        threading.Thread(target=ledger_mirror.refresh, name="ledger-mirror-sync", daemon=True).start()
+
+    reconcile_stop = threading.Event()
+    if ENABLE_DUPLICATE_DETECTION and DUPLICATE_RECONCILE_HOURS > 0:
+        threading.Thread(target=run_duplicate_reconciliation, args=(reconcile_stop,),
+                         name="duplicate-reconciliation", daemon=True).start()
+
+    # 2. Start Watchdog
     event_handler = ReceiptHandler()
+    event_filter = EventCoalescer(event_handler.on_file_ready, exclude_dirs=[file_archiver.archive_root],
+                                  match=is_valid_image, window=EVENT_COALESCE_SECONDS)
+    event_filter.start()
     observer = Observer()
-    observer.schedule(event_handler, WATCH_DIR, recursive=True)
+    observer.schedule(event_filter, WATCH_DIR, recursive=True)
     observer.start()
     
     try:
+        # 3. Catch up on what changed while the program was not running, then reconcile periodically
+        reconcile_watch_dir(catch_up=True)
         while status_window_running:
-            # 2. Periodic Poll
-            scan_directory()
-            for _ in range(60):
+            history_manager.flush()
+            for _ in range(max(1, int(RECONCILE_SECONDS))):
                 if not status_window_running:
                     break
                 time.sleep(1)
+            if status_window_running:
+                reconcile_watch_dir()
     except KeyboardInterrupt:
         status_window_running = False
     finally:
         observer.stop()
+        reconcile_stop.set()
     observer.join()
+    event_filter.stop()
+    event_filter.log_stats()
+    if ASYNC_MODE:
+        stop_async_engine(wait=True)
+    else:
+        # 안정화 대기 중인 파일은 다음 실행 때 스캔으로 다시 잡힘
+        stability_monitor.stop()
+        # 대기열에 남은 파일은 처리 후 종료
+        logging.info(f"Draining {worker_pool.pending_count()} queued files...")
+        worker_pool.shutdown(wait=True)
+    notion_upload_executor.shutdown(wait=True)
+    model_ladder.log_stats()
+    notion_client.log_stats()
+    notion_client.close()
+    if ledger_mirror is not None:
+        ledger_mirror.close()
+    file_states.close()
+    history_manager.close()
     logging.info("Receipt Automation 종료됨.")
@@ -0,0 +1,134 @@
+import time
+import logging
+import threading
+
+class ModelLadder:
+    """
+    Tries vision models from cheapest to strongest. The next model is only called when
+    the answer of the current one fails local validation, has no items, or reports a
+    confidence below min_confidence. Keeps per-model latency, token and escalation counters.
+    """
+
+    def __init__(self, models, min_confidence=0.0, validate=None, clock=time.monotonic):
+        """
+        Args:
+            models: Model names, cheapest first; the last one's answer is always accepted
+            min_confidence: Escalate when the answer's "confidence" field is below this
+            validate: Callable returning a list of validation errors for an answer
+            clock: Injectable for tests
+        """
+        if not models:
+            raise ValueError("At least one model is required")
+        self.models = list(models)
+        self.min_confidence = min_confidence
+        self.validate = validate
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stats = {model: {"calls": 0, "errors": 0, "escalations": 0, "seconds": 0.0,
+                              "prompt_tokens": 0, "completion_tokens": 0} for model in self.models}
+
+    @property
+    def top_model(self):
+        return self.models[-1]
+
+    def tag(self):
+        """Describes the ladder (part of the analysis cache version tag)."""
+        return ">".join(self.models) + f"@{self.min_confidence}"
+
+    def escalation_reason(self, data):
+        """Returns why an answer is not good enough, or None to accept it."""
+        if not isinstance(data, dict):
+            return "no result"
+        if not data.get("items"):
+            return "no items"
+        confidence = data.get("confidence")
+        if isinstance(confidence, (int, float)) and confidence < self.min_confidence:
+            return f"low confidence ({confidence})"
+        if self.validate is not None:
+            errors = self.validate(data)
+            if errors:
+                return f"{len(errors)} validation errors"
+        return None
+
+    def _record(self, model, seconds, usage=None, error=False):
+        with self.lock:
+            stats = self.stats[model]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            if error:
+                stats["errors"] += 1
+            if usage is not None:
+                stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def _next_step(self, models, index, data, error=None):
+        """Returns True if `data` is the final answer, False to try the next model."""
+        model = models[index]
+        if index == len(models) - 1:
+            if error is not None:
+                raise error
+            return True
+        reason = f"error: {error}" if error is not None else self.escalation_reason(data)
+        if reason is None:
+            return True
+        logging.info(f"Escalating from {model} to {models[index + 1]}: {reason}")
+        with self.lock:
+            self.stats[model]["escalations"] += 1
+        return False
+
+    def run(self, call, models=None):
+        """
+        Args:
+            call: call(model) -> (data, usage); may raise on API errors
+            models: Subset of the ladder to use (e.g. [top_model] for re-analysis)
+
+        Returns:
+            The accepted answer
+        """
+        models = models or self.models
+        for index, model in enumerate(models):
+            started = self.clock()
+            try:
+                data, usage = call(model)
+            except Exception as e:
+                self._record(model, self.clock() - started, error=True)
+                self._next_step(models, index, None, e)
+                continue
+            self._record(model, self.clock() - started, usage)
+            if self._next_step(models, index, data):
+                return data
+
+    async def run_async(self, call, models=None):
+        """Async variant of run(): call(model) returns an awaitable."""
+        models = models or self.models
+        for index, model in enumerate(models):
+            started = self.clock()
+            try:
+                data, usage = await call(model)
+            except Exception as e:
+                self._record(model, self.clock() - started, error=True)
+                self._next_step(models, index, None, e)
+                continue
+            self._record(model, self.clock() - started, usage)
+            if self._next_step(models, index, data):
+                return data
+
+    def get_stats(self):
+        """Returns a copy of the counters with average latency and escalation rate per model."""
+        with self.lock:
+            result = {}
+            for model, stats in self.stats.items():
+                calls = stats["calls"]
+                result[model] = dict(stats,
+                                     avg_seconds=stats["seconds"] / calls if calls else 0.0,
+                                     escalation_rate=stats["escalations"] / calls if calls else 0.0)
+            return result
+
+    def log_stats(self):
+        for model, stats in self.get_stats().items():
+            if not stats["calls"]:
+                continue
+            logging.info(f"Model {model}: {stats['calls']} calls ({stats['errors']} errors), "
+                         f"avg {stats['avg_seconds']:.1f}s, "
+                         f"{stats['prompt_tokens']} prompt / {stats['completion_tokens']} completion tokens, "
+                         f"escalated {stats['escalation_rate']:.0%}")
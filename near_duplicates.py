@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import namedtuple
+
+# A processed photo close to a new one. `receipt` is the receipt fingerprint of its analysis (or None).
+NearDuplicate = namedtuple("NearDuplicate", "path distance receipt")
+
+def hamming_distance(a, b):
+    """Number of differing bits between two integer hashes."""
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes for Hamming-distance range queries."""
+
+    def __init__(self):
+        self.root = None  # [hash, values, {distance: child}]
+        self.size = 0
+
+    def add(self, key, value):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [value], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(key, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, [value], {}]
+                return
+            node = child
+
+    def search(self, key, max_distance):
+        """
+        Returns:
+            [(distance, value)] for every stored hash within max_distance of key, closest first
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(key, node[0])
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node[1])
+            # Triangle inequality: only children within [d - max, d + max] can match
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+class NearDuplicateIndex:
+    """
+    Perceptual hashes of recently processed photos, persisted across restarts.
+    A new photo whose hash is very close to one taken shortly before or after it is
+    treated as another shot of the same receipt. A little further away, different
+    receipts photographed on the same table hash alike too, so such a match is only
+    a candidate until the receipt fingerprints of the two analyses agree.
+    """
+
+    def __init__(self, index_file=".near_duplicates", max_distance=6, skip_distance=2, window_seconds=600,
+                 max_age_days=30):
+        """
+        Args:
+            index_file: JSON-lines file with one processed photo per line
+            max_distance: Maximum Hamming distance of a candidate match
+            skip_distance: Matches up to this distance are the same receipt without further checks
+            window_seconds: Maximum difference between the photos' modification times
+            max_age_days: Entries older than this are dropped when the index is loaded
+        """
+        self.index_file = index_file
+        self.max_distance = max_distance
+        self.skip_distance = min(skip_distance, max_distance)
+        self.window_seconds = window_seconds
+        self.max_age_seconds = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.tree = BKTree()
+        self.skipped = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return
+        cutoff = time.time() - self.max_age_seconds
+        kept = []
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                lines = [line for line in f if line.strip()]
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("added", 0) >= cutoff:
+                    kept.append(entry)
+                    self.tree.add(int(entry["hash"], 16), (entry["path"], entry["taken"], entry.get("receipt")))
+        except Exception as e:
+            logging.error(f"Error loading near-duplicate index: {e}")
+            return
+        if len(kept) < len(lines):
+            # 오래된 항목 정리
+            try:
+                with open(self.index_file, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry) + '\n' for entry in kept)
+            except Exception as e:
+                logging.error(f"Error compacting near-duplicate index: {e}")
+
+    def find(self, photo_hash, taken):
+        """
+        Returns:
+            NearDuplicate of the closest processed photo taken within the window, or None.
+            It is the same receipt if is_certain(); otherwise compare receipt fingerprints.
+        """
+        with self.lock:
+            matches = self.tree.search(photo_hash, self.max_distance)
+        for distance, (path, other_taken, receipt) in matches:
+            if abs(taken - other_taken) <= self.window_seconds:
+                logging.info(f"Near-duplicate photo: distance {distance} to {path}")
+                match = NearDuplicate(path, distance, receipt)
+                if self.is_certain(match):
+                    with self.lock:
+                        self.skipped += 1
+                return match
+        return None
+
+    def is_certain(self, match):
+        """True if a match from find() is close enough to be the same receipt without checking the analysis."""
+        return match.distance <= self.skip_distance
+
+    def add(self, photo_hash, filepath, taken, receipt=None):
+        """Records a processed photo with the receipt fingerprint of its analysis."""
+        entry = {"hash": format(photo_hash, "x"), "path": os.path.abspath(filepath), "taken": taken, "added": time.time(),
+                 "receipt": receipt}
+        with self.lock:
+            self.tree.add(photo_hash, (entry["path"], taken, receipt))
+            try:
+                with open(self.index_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except Exception as e:
+                logging.error(f"Error saving near-duplicate index: {e}")
+
+    def get_count(self):
+        with self.lock:
+            return self.tree.size
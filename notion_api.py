@@ -0,0 +1,301 @@
+import re
+import json
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional
+from requests.adapters import HTTPAdapter
+from retry_policy import RetryPolicy, parse_retry_after
+
+# 429/503: the request was rejected before doing anything → always safe to retry
+SAFE_RETRY_STATUSES = {429, 503}
+# 500/502/504: the write may or may not have been applied
+AMBIGUOUS_RETRY_STATUSES = {500, 502, 504}
+
+def endpoint_name(method: str, path: str) -> str:
+    """Maps a request to a retry-budget key, e.g. 'pages.create' or 'databases.query'."""
+    path = re.sub(r"^https?://[^/]+(/v1)?", "", path).split("?")[0].strip("/")
+    parts = path.split("/")
+    if parts[0] == "pages":
+        return "pages.create" if len(parts) == 1 and method == "POST" else f"pages.{method.lower()}"
+    if parts[0] == "databases" and parts[-1] == "query":
+        return "databases.query"
+    return f"{parts[0]}.{method.lower()}"
+
+class RequestRetry:
+    """
+    Retry decisions for one Notion request, shared by NotionClient and AsyncNotionClient.
+
+    GET/PATCH and database queries are retried on any transient failure. Page creates
+    are only retried blindly when the server certainly did nothing (429/503, connect
+    errors); after an ambiguous failure (5xx, read timeout) the caller's applied_check
+    is consulted first. Without applied_check ambiguous page creates are not retried.
+    """
+
+    RETRY = "retry"
+    CHECK = "check"  # call applied_check, then retry unless it found the page
+    STOP = "stop"
+
+    def __init__(self, policy: RetryPolicy, method: str, path: str, rate_limiter=None, can_check: bool = False):
+        self.policy = policy
+        self.description = f"{method} {path}"
+        self.idempotent = endpoint_name(method, path) != "pages.create"
+        self.rate_limiter = rate_limiter
+        self.can_check = can_check
+        self.waited = 0.0
+        self.attempt = 1
+        self.delay = 0.0
+        self.held = 0.0
+
+    def next_step(self, response, error, connect_failed: bool = False) -> Optional[str]:
+        """
+        Args:
+            response: The response (requests or httpx), None if the request raised
+            error: The transport error, or None
+            connect_failed: The error happened before the request was sent
+
+        Returns:
+            None if the response is final, otherwise RETRY, CHECK or STOP
+        """
+        self.held = 0.0
+        if error is not None:
+            safe = connect_failed
+            retry_after = None
+        elif response.status_code in SAFE_RETRY_STATUSES or response.status_code in AMBIGUOUS_RETRY_STATUSES:
+            safe = response.status_code in SAFE_RETRY_STATUSES
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after and self.rate_limiter is not None:
+                # Slow every request in the process down, not just this one.
+                # The limiter then holds this retry back, so only the extra jitter is slept here.
+                self.rate_limiter.penalize(retry_after)
+                self.held = retry_after
+        else:
+            return None
+
+        self.delay = self.policy.delay_for(self.attempt, retry_after)
+        if self.attempt >= self.policy.max_attempts or self.waited + self.delay > self.policy.max_total_wait:
+            return self.STOP
+        if not self.idempotent and not safe:
+            return self.CHECK if self.can_check else self.STOP
+        return self.RETRY
+
+    def advance(self, reason) -> float:
+        """Logs the retry and moves to the next attempt. Returns the seconds to sleep first."""
+        logging.warning(f"Notion {self.description} failed ({reason}); "
+                        f"retry {self.attempt}/{self.policy.max_attempts - 1} in {self.delay:.1f}s")
+        self.waited += self.delay
+        self.attempt += 1
+        return max(0.0, self.delay - self.held)
+
+class NotionClient:
+    """Shared Notion API client with a pooled keep-alive HTTP session."""
+
+    BASE_URL = "https://api.notion.com/v1"
+    NOTION_VERSION = "2022-06-28"
+
+    def __init__(self, token: str, pool_size: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 30.0, base_url: str = None, rate_limiter=None,
+                 retry_policies: Optional[Dict[str, RetryPolicy]] = None):
+        """
+        Args:
+            token: Notion integration token
+            pool_size: Maximum number of kept-alive connections to api.notion.com
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            read_timeout: Seconds to wait for a response
+            base_url: Override of the API base URL (used by tests)
+            rate_limiter: Optional TokenBucket shared by every request made through this client
+            retry_policies: Retry budgets by endpoint name (see endpoint_name), with a "default" entry
+        """
+        self.token = token
+        self.base_url = (base_url or self.BASE_URL).rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Notion-Version": self.NOTION_VERSION
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.rate_limiter = rate_limiter
+        self.retry_policies = retry_policies or {"default": RetryPolicy()}
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.retry_count = 0
+
+    def url(self, path: str) -> str:
+        """Builds a full API URL from a path like '/pages' (full URLs are returned unchanged)."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def retry_policy_for(self, method: str, path: str) -> RetryPolicy:
+        return self.retry_policies.get(endpoint_name(method, path)) or self.retry_policies["default"]
+
+    def request(self, method: str, path: str, applied_check: Optional[Callable[[], Optional[dict]]] = None,
+                **kwargs) -> requests.Response:
+        """
+        Sends a request over the shared session, retrying throttling and transient errors
+        (see RequestRetry). applied_check is called after an ambiguous page-create failure
+        and must return the created page if the write actually went through.
+
+        Raises requests exceptions on network errors once retries are exhausted.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        url = self.url(path)
+        retry = RequestRetry(self.retry_policy_for(method, path), method, path, self.rate_limiter, applied_check is not None)
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            with self.lock:
+                self.request_count += 1
+            response, error = None, None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                error = e
+            except requests.Timeout as e:
+                error = e
+
+            step = retry.next_step(response, error, isinstance(error, requests.ConnectTimeout))
+            if step is None:
+                return response
+            if step == RequestRetry.STOP:
+                break
+            if step == RequestRetry.CHECK:
+                page = applied_check()
+                if page:
+                    logging.info(f"{method} {path}: write was applied despite the error, not retrying")
+                    return self._applied_response(url, page)
+
+            with self.lock:
+                self.retry_count += 1
+            retry.policy.sleep(retry.advance(error or f"HTTP {response.status_code}"))
+
+        if error is not None:
+            raise error
+        return response
+
+    @staticmethod
+    def _applied_response(url: str, page: dict) -> requests.Response:
+        """Builds a 200 response for a page that was found to exist after an ambiguous failure."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps(page).encode("utf-8")
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, json=None, **kwargs) -> requests.Response:
+        return self.request("POST", path, json=json, **kwargs)
+
+    def patch(self, path: str, json=None, **kwargs) -> requests.Response:
+        return self.request("PATCH", path, json=json, **kwargs)
+
+    def get_stats(self) -> dict:
+        """
+        Returns connection reuse counters.
+
+        connections_opened is the number of new TCP(+TLS) connections, so
+        connections_reused = requests - connections_opened handshakes were saved.
+        """
+        opened = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                opened += getattr(pool, "num_connections", 0)
+        with self.lock:
+            requests_sent = self.request_count
+            retries = self.retry_count
+        return {
+            "requests": requests_sent,
+            "retries": retries,
+            "connections_opened": opened,
+            "connections_reused": max(0, requests_sent - opened)
+        }
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logging.info(f"Notion HTTP: {stats['requests']} requests ({stats['retries']} retries), "
+                     f"{stats['connections_opened']} connections opened, "
+                     f"{stats['connections_reused']} reused")
+
+    def close(self):
+        self.session.close()
+
+class NotionQueryError(Exception):
+    """A database query page could not be fetched."""
+
+class QueryPaginator:
+    """
+    Streams the results of a database query page by page.
+
+    Only one page of results is held at a time. While the caller works through a page,
+    the next one is already being fetched in the background. `cursor` is the start
+    cursor of the page currently being yielded: saving it and passing it back as
+    start_cursor resumes the scan, repeating at most that one page.
+    """
+
+    def __init__(self, client: NotionClient, database_id: str, query: Optional[dict] = None,
+                 start_cursor: Optional[str] = None, page_size: int = 100, prefetch: bool = True,
+                 max_pages: Optional[int] = None, url_suffix: str = ""):
+        """
+        Args:
+            client: NotionClient used for the requests
+            database_id: Database to query
+            query: Query body (filter, sorts); start_cursor/page_size are managed here
+            start_cursor: Resume from this cursor instead of the first page
+            page_size: Results per request (Notion allows up to 100)
+            prefetch: Fetch the next page while the current one is being consumed
+            max_pages: Stop after this many pages (None = no limit)
+            url_suffix: Query string appended to the query URL (e.g. filter_properties)
+        """
+        self.client = client
+        self.url = f"{client.base_url}/databases/{database_id}/query{url_suffix}"
+        self.query = dict(query or {})
+        self.start_cursor = start_cursor
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.max_pages = max_pages
+        self.cursor = start_cursor
+        self.next_cursor = None
+        self.pages_fetched = 0
+
+    def _fetch(self, cursor: Optional[str]) -> dict:
+        payload = dict(self.query, page_size=self.page_size)
+        if cursor:
+            payload["start_cursor"] = cursor
+        response = self.client.post(self.url, json=payload)
+        if response.status_code != 200:
+            raise NotionQueryError(f"{response.status_code} - {response.text[:300]}")
+        return response.json()
+
+    def __iter__(self) -> Iterator[dict]:
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notion-prefetch") if self.prefetch else None
+        cursor = self.start_cursor
+        pending = None
+        try:
+            while True:
+                data = pending.result() if pending is not None else self._fetch(cursor)
+                pending = None
+                self.pages_fetched += 1
+                self.cursor = cursor
+                self.next_cursor = data.get("next_cursor") if data.get("has_more") else None
+                more = self.next_cursor is not None and (self.max_pages is None or self.pages_fetched < self.max_pages)
+                if more and executor is not None:
+                    pending = executor.submit(self._fetch, self.next_cursor)
+                yield from data.get("results", [])
+                if not more:
+                    return
+                cursor = self.next_cursor
+        finally:
+            if executor is not None:
+                # Stopped early: an outstanding prefetch is simply dropped
+                executor.shutdown(wait=False, cancel_futures=True)
@@ -1,92 +1,121 @@
 import os
+import hashlib
 import logging
-import requests
+import threading
+from collections import Counter
 from datetime import datetime
-from typing import List, Dict, Optional, Set
+from typing import Iterable, Iterator, List, Dict, Optional, Set
+from notion_api import NotionClient, QueryPaginator
+
+def extract_property_value(entry: Dict, property_name: str) -> Optional[any]:
+    """Extract value from Notion property"""
+    try:
+        props = entry.get("properties", {})
+        prop = props.get(property_name, {})
+        prop_type = prop.get("type")
+        
+        if prop_type == "title":
+            title_list = prop.get("title", [])
+            return title_list[0].get("text", {}).get("content", "") if title_list else ""
+        elif prop_type == "rich_text":
+            text_list = prop.get("rich_text", [])
+            return text_list[0].get("text", {}).get("content", "") if text_list else ""
+        elif prop_type == "number":
+            return prop.get("number")
+        elif prop_type == "date":
+            date_obj = prop.get("date")
+            return date_obj.get("start") if date_obj else None
+        elif prop_type == "select":
+            select_obj = prop.get("select")
+            return select_obj.get("name") if select_obj else None
+        else:
+            return None
+    except Exception as e:
+        logging.warning(f"Error extracting property '{property_name}': {e}")
+        return None
+
+def dedupe_key(item_name, date, merchant, total_price) -> Optional[tuple]:
+    """Normalized duplicate-detection key, or None if a critical field is missing"""
+    if not item_name or not date or total_price is None:
+        return None
+    return (
+        str(item_name).strip().lower(),
+        str(date).strip(),
+        str(merchant or "").strip().lower(),
+        float(total_price)
+    )
 
 class NotionValidator:
     """Handles Notion database validation, duplicate detection, and data management"""
     
-    def __init__(self, token: str, database_id: str):
+    VALID_CATEGORIES = ["식재료", "가공식품", "간식", "채소", "과일", "생활용품", "기타"]
+    
+    # Pages of one receipt upload are created within this many seconds of each other
+    UPLOAD_BURST_SECONDS = 120
+    
+    def __init__(self, token: str, database_id: str, client: Optional[NotionClient] = None, mirror=None):
         self.token = token
         self.database_id = database_id
-        self.headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
-        self.base_url = "https://api.notion.com/v1"
+        # Share the caller's pooled session when given, so all Notion traffic reuses connections
+        self.client = client or NotionClient(token)
+        self.headers = self.client.headers
+        self.base_url = self.client.base_url
+        # Optional LedgerMirror: lookups read the local copy instead of paging through Notion
+        self.mirror = mirror
+        # Concurrent receipts must not archive the same duplicate twice
+        self.dedupe_lock = threading.Lock()
+        self._property_ids = None
+    
+    def iter_entries(self, start_cursor: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Stream all entries of the database with bounded memory
+        
+        Args:
+            start_cursor: Resume a previous scan from this cursor (ignored with the mirror)
+        
+        Raises:
+            NotionQueryError if a page of results cannot be fetched
+        """
+        if self.mirror is not None:
+            self.mirror.refresh()
+            yield from self.mirror.iter_entries()
+            return
+        yield from QueryPaginator(self.client, self.database_id, start_cursor=start_cursor)
     
-    def get_all_entries(self, max_pages: int = 10) -> List[Dict]:
+    def get_all_entries(self, max_pages: Optional[int] = None) -> List[Dict]:
         """
         Fetch all entries from Notion database
         
         Args:
-            max_pages: Maximum number of pages to fetch (100 entries per page)
+            max_pages: Maximum number of pages to fetch (100 entries per page), None for all
         
         Returns:
             List of all database entries
         """
-        url = f"{self.base_url}/databases/{self.database_id}/query"
+        if self.mirror is not None:
+            self.mirror.refresh()
+            return self.mirror.entries()
+        
+        paginator = QueryPaginator(self.client, self.database_id, max_pages=max_pages)
         all_results = []
-        has_more = True
-        start_cursor = None
-        page_count = 0
-        
-        while has_more and page_count < max_pages:
-            payload = {}
-            if start_cursor:
-                payload["start_cursor"] = start_cursor
-            
-            try:
-                response = requests.post(url, headers=self.headers, json=payload)
-                if response.status_code != 200:
-                    logging.error(f"Failed to fetch entries: {response.status_code} - {response.text}")
-                    break
-                
-                data = response.json()
-                all_results.extend(data.get("results", []))
-                has_more = data.get("has_more", False)
-                start_cursor = data.get("next_cursor")
-                page_count += 1
-                
-            except Exception as e:
-                logging.error(f"Error fetching Notion entries: {e}")
-                break
+        try:
+            all_results.extend(paginator)
+        except Exception as e:
+            logging.error(f"Error fetching Notion entries: {e}")
+        if paginator.next_cursor and max_pages is not None and paginator.pages_fetched >= max_pages:
+            logging.warning(f"Stopped after {max_pages} pages; more entries exist in the database")
         
         logging.info(f"Fetched {len(all_results)} entries from Notion")
         return all_results
     
     def extract_property_value(self, entry: Dict, property_name: str) -> Optional[any]:
         """Extract value from Notion property"""
-        try:
-            props = entry.get("properties", {})
-            prop = props.get(property_name, {})
-            prop_type = prop.get("type")
-            
-            if prop_type == "title":
-                title_list = prop.get("title", [])
-                return title_list[0].get("text", {}).get("content", "") if title_list else ""
-            elif prop_type == "rich_text":
-                text_list = prop.get("rich_text", [])
-                return text_list[0].get("text", {}).get("content", "") if text_list else ""
-            elif prop_type == "number":
-                return prop.get("number")
-            elif prop_type == "date":
-                date_obj = prop.get("date")
-                return date_obj.get("start") if date_obj else None
-            elif prop_type == "select":
-                select_obj = prop.get("select")
-                return select_obj.get("name") if select_obj else None
-            else:
-                return None
-        except Exception as e:
-            logging.warning(f"Error extracting property '{property_name}': {e}")
-            return None
+        return extract_property_value(entry, property_name)
     
-    def find_duplicates(self, entries: List[Dict]) -> List[Set[str]]:
+    def find_duplicates(self, entries: Iterable[Dict]) -> List[Set[str]]:
         """
         Find duplicate entries based on: item name + date + merchant + total price
+        Entries may be a stream (see iter_entries); only the grouping keys are kept in memory
         
         Returns:
             List of sets, where each set contains page IDs of duplicate entries
@@ -103,16 +132,10 @@ class NotionValidator:
             
             # Create unique key for duplicate detection
             # Skip if any critical field is missing
-            if not item_name or not date or total_price is None:
+            key = dedupe_key(item_name, date, merchant, total_price)
+            if key is None:
                 continue
             
-            key = (
-                str(item_name).strip().lower(),
-                str(date).strip(),
-                str(merchant or "").strip().lower(),
-                float(total_price)
-            )
-            
             if key not in groups:
                 groups[key] = []
             groups[key].append({
@@ -121,19 +144,42 @@ class NotionValidator:
                 "item_name": item_name
             })
         
-        # Find groups with duplicates (more than 1 entry)
+        # Find groups with duplicates (more than one upload of the same item)
         duplicate_sets = []
         for key, group in groups.items():
             if len(group) > 1:
+                # A receipt may list the same item several times: keep as many entries as
+                # the largest single upload created
+                keep = self.copies_per_upload([item["created_time"] for item in group])
+                if len(group) <= keep:
+                    continue
                 # Sort by created_time (keep newest, delete oldest)
-                sorted_group = sorted(group, key=lambda x: x["created_time"], reverse=True)
-                # Keep first (newest), mark rest as duplicates
-                duplicate_ids = {item["page_id"] for item in sorted_group[1:]}
+                sorted_group = sorted(group, key=lambda x: x["created_time"] or "", reverse=True)
+                duplicate_ids = {item["page_id"] for item in sorted_group[keep:]}
                 duplicate_sets.append(duplicate_ids)
                 logging.info(f"Found {len(duplicate_ids)} duplicates for: {sorted_group[0]['item_name']}")
         
         return duplicate_sets
     
+    @classmethod
+    def copies_per_upload(cls, created_times: List[Optional[str]]) -> int:
+        """
+        Largest number of entries created in one upload burst (pages created within
+        UPLOAD_BURST_SECONDS of the previous one), i.e. how often the item was on one receipt
+        """
+        times = []
+        for created in created_times:
+            try:
+                times.append(datetime.fromisoformat(created.replace("Z", "+00:00")))
+            except (AttributeError, ValueError):
+                continue
+        times.sort()
+        largest, run = 1, 1
+        for previous, current in zip(times, times[1:]):
+            run = run + 1 if (current - previous).total_seconds() <= cls.UPLOAD_BURST_SECONDS else 1
+            largest = max(largest, run)
+        return largest
+    
     def validate_entry(self, entry: Dict) -> List[str]:
         """
         Validate a single entry for data quality issues
@@ -141,33 +187,72 @@ class NotionValidator:
         Returns:
             List of validation error messages (empty if valid)
         """
+        return self._validate_values(
+            self.extract_property_value(entry, "항목"),
+            self.extract_property_value(entry, "날짜"),
+            self.extract_property_value(entry, "합계"),
+            self.extract_property_value(entry, "분류")
+        )
+    
+    def validate_receipt_data(self, receipt_data: Dict) -> List[str]:
+        """
+        Validate the receipt dict returned by analyze_receipt before anything is uploaded.
+        Applies the same rules as validate_entry to every item, except that a null date is
+        accepted: the model reports it for receipts without a printed date, and asking
+        again cannot produce one.
+        
+        Returns:
+            List of validation error messages (empty if valid)
+        """
+        if not isinstance(receipt_data, dict):
+            return ["Receipt data is not an object"]
+        items = receipt_data.get("items")
+        if not isinstance(items, list):
+            return ["Missing items list"]
+        
+        errors = []
+        date = receipt_data.get("date")
+        for index, item in enumerate(items, start=1):
+            if not isinstance(item, dict):
+                errors.append(f"Item {index}: not an object")
+                continue
+            total_price = item.get("total_price")
+            if total_price is not None and not isinstance(total_price, (int, float)):
+                errors.append(f"Item {index}: total price is not a number: {total_price!r}")
+                continue
+            item_errors = self._validate_values(item.get("name"), date, total_price, item.get("category"),
+                                                date_required=False)
+            quantity = item.get("quantity", 1)
+            if not isinstance(quantity, (int, float)) or quantity <= 0:
+                item_errors.append(f"Invalid quantity: {quantity!r} (must be positive)")
+            errors.extend(f"Item {index} ({item.get('name') or '?'}): {error}" for error in item_errors)
+        return errors
+    
+    def _validate_values(self, item_name, date, total_price, category, date_required=True) -> List[str]:
+        """Validation rules shared by Notion entries and extracted receipt items"""
         errors = []
         
         # Check required fields
-        item_name = self.extract_property_value(entry, "항목")
-        if not item_name or item_name.strip() == "":
+        if not item_name or str(item_name).strip() == "":
             errors.append("Missing item name (항목)")
         
-        date = self.extract_property_value(entry, "날짜")
         if not date:
-            errors.append("Missing date (날짜)")
+            if date_required or date is not None:
+                errors.append("Missing date (날짜)")
         else:
             # Validate date format
             try:
                 datetime.strptime(date, "%Y-%m-%d")
-            except ValueError:
+            except (TypeError, ValueError):
                 errors.append(f"Invalid date format: {date} (expected YYYY-MM-DD)")
         
-        total_price = self.extract_property_value(entry, "합계")
         if total_price is None:
             errors.append("Missing total price (합계)")
         elif total_price <= 0:
             errors.append(f"Invalid price: {total_price} (must be positive)")
         
         # Check category
-        category = self.extract_property_value(entry, "분류")
-        valid_categories = ["식재료", "가공식품", "간식", "채소", "과일", "생활용품", "기타"]
-        if category and category not in valid_categories:
+        if category and category not in self.VALID_CATEGORIES:
             errors.append(f"Invalid category: {category}")
         
         return errors
@@ -183,9 +268,11 @@ class NotionValidator:
         payload = {"archived": True}
         
         try:
-            response = requests.patch(url, headers=self.headers, json=payload)
+            response = self.client.patch(url, json=payload)
             if response.status_code == 200:
                 logging.info(f"Deleted entry: {page_id}")
+                if self.mirror is not None:
+                    self.mirror.remove(page_id)
                 return True
             else:
                 logging.error(f"Failed to delete entry {page_id}: {response.status_code} - {response.text}")
@@ -194,6 +281,49 @@ class NotionValidator:
             logging.error(f"Error deleting entry {page_id}: {e}")
             return False
     
+    def find_created_page(self, properties: Dict, since: str, exclude_ids=()) -> Optional[Dict]:
+        """
+        Find a page created on or after `since` with the same item, date, merchant and total
+        as a POST /pages payload. Used to tell whether a failed create actually went through.
+
+        Args:
+            properties: The "properties" of the create payload
+            since: ISO timestamp taken before the create was sent
+            exclude_ids: Page ids already created for identical lines of the same receipt,
+                which must not be taken for this one
+
+        Returns:
+            The matching page, or None
+        """
+        conditions = [{"timestamp": "created_time", "created_time": {"on_or_after": since}}]
+        title = properties.get("항목", {}).get("title") or []
+        if title:
+            conditions.append({"property": "항목", "title": {"equals": title[0]["text"]["content"]}})
+        merchant = properties.get("사용처", {}).get("rich_text") or []
+        if merchant:
+            conditions.append({"property": "사용처", "rich_text": {"equals": merchant[0]["text"]["content"]}})
+        date = (properties.get("날짜") or {}).get("date")
+        if date:
+            conditions.append({"property": "날짜", "date": {"equals": date["start"]}})
+        total = (properties.get("합계") or {}).get("number")
+        if total is not None:
+            conditions.append({"property": "합계", "number": {"equals": total}})
+
+        url = f"{self.base_url}/databases/{self.database_id}/query"
+        exclude_ids = set(exclude_ids)
+        page_size = min(100, len(exclude_ids) + 1)
+        response = self.client.post(url, json={"filter": {"and": conditions}, "page_size": page_size})
+        if response.status_code != 200:
+            logging.error(f"Failed to look up created page: {response.status_code} - {response.text}")
+            return None
+        results = response.json().get("results", [])
+        return next((page for page in results if page.get("id") not in exclude_ids), None)
+    
+    def record_page(self, page: Dict):
+        """Applies a page we just created to the local mirror, if any"""
+        if self.mirror is not None:
+            self.mirror.upsert(page)
+    
     def find_entries_by_source(self, source_file: str) -> List[str]:
         """
         Find all entries that came from a specific source image file
@@ -201,13 +331,14 @@ class NotionValidator:
         Returns:
             List of page IDs
         """
-        entries = self.get_all_entries()
-        matching_ids = []
+        if self.mirror is not None:
+            self.mirror.refresh()
+            matching_ids = self.mirror.find_by_source(source_file)
+            logging.info(f"Found {len(matching_ids)} entries from source: {source_file}")
+            return matching_ids
         
-        for entry in entries:
-            entry_source = self.extract_property_value(entry, "원본파일")
-            if entry_source and entry_source.strip() == source_file.strip():
-                matching_ids.append(entry.get("id"))
+        query_filter = {"property": "원본파일", "rich_text": {"equals": source_file.strip()}}
+        matching_ids = self._query_page_ids(query_filter, ["원본파일"])
         
         logging.info(f"Found {len(matching_ids)} entries from source: {source_file}")
         return matching_ids
@@ -220,20 +351,66 @@ class NotionValidator:
         Returns:
             List of page IDs
         """
-        entries = self.get_all_entries()
-        matching_ids = []
+        if self.mirror is not None:
+            self.mirror.refresh()
+            matching_ids = self.mirror.find_by_date_merchant(date, merchant)
+            logging.info(f"Found {len(matching_ids)} entries for {date} at {merchant}")
+            return matching_ids
         
-        for entry in entries:
-            entry_date = self.extract_property_value(entry, "날짜")
-            entry_merchant = self.extract_property_value(entry, "사용처")
-            
-            if (entry_date == date and 
-                str(entry_merchant or "").strip().lower() == str(merchant or "").strip().lower()):
-                matching_ids.append(entry.get("id"))
+        merchant = str(merchant or "").strip()
+        if merchant:
+            merchant_filter = {"property": "사용처", "rich_text": {"equals": merchant}}
+        else:
+            merchant_filter = {"property": "사용처", "rich_text": {"is_empty": True}}
+        query_filter = {"and": [{"property": "날짜", "date": {"equals": date}}, merchant_filter]}
+        matching_ids = self._query_page_ids(query_filter, ["사용처"])
         
         logging.info(f"Found {len(matching_ids)} entries for {date} at {merchant}")
         return matching_ids
     
+    def get_property_ids(self) -> Dict[str, str]:
+        """
+        Map database property names to property IDs (fetched once)
+        
+        Returns:
+            {property name: property ID}, empty if the database could not be read
+        """
+        if self._property_ids is None:
+            try:
+                response = self.client.get(f"{self.base_url}/databases/{self.database_id}")
+                if response.status_code != 200:
+                    logging.warning(f"Failed to read database schema: {response.status_code} - {response.text}")
+                    return {}
+                properties = response.json().get("properties", {})
+                self._property_ids = {name: prop["id"] for name, prop in properties.items() if prop.get("id")}
+            except Exception as e:
+                logging.warning(f"Error reading database schema: {e}")
+                return {}
+        return self._property_ids
+    
+    def _query_page_ids(self, query_filter: Dict, properties: List[str]) -> List[str]:
+        """
+        Run a filtered database query and return the matching page IDs.
+        Only `properties` are requested (filter_properties) to keep responses small.
+        """
+        return [page.get("id") for page in self._query_pages(query_filter, properties)]
+    
+    def _query_pages(self, query_filter: Dict, properties: List[str]) -> List[Dict]:
+        """Run a filtered database query returning only `properties` of the matching pages"""
+        property_ids = self.get_property_ids()
+        wanted = [property_ids[name] for name in properties if name in property_ids]
+        # Property IDs are already URL-encoded by Notion
+        suffix = "?" + "&".join(f"filter_properties={property_id}" for property_id in wanted) if wanted else ""
+        
+        paginator = QueryPaginator(self.client, self.database_id, query={"filter": query_filter},
+                                   prefetch=False, url_suffix=suffix)
+        pages = []
+        try:
+            pages.extend(paginator)
+        except Exception as e:
+            logging.error(f"Error querying Notion entries: {e}")
+        return pages
+    
     def remove_duplicates(self) -> int:
         """
         Find and remove all duplicate entries
@@ -242,18 +419,124 @@ class NotionValidator:
             Number of duplicates removed
         """
         logging.info("Checking for duplicates...")
-        entries = self.get_all_entries()
-        duplicate_sets = self.find_duplicates(entries)
-        
-        total_removed = 0
-        for duplicate_ids in duplicate_sets:
-            for page_id in duplicate_ids:
-                if self.delete_entry(page_id):
-                    total_removed += 1
+        with self.dedupe_lock:
+            duplicate_sets = self.find_duplicates(self.iter_entries())
+            
+            total_removed = 0
+            for duplicate_ids in duplicate_sets:
+                for page_id in duplicate_ids:
+                    if self.delete_entry(page_id):
+                        total_removed += 1
         
         logging.info(f"Removed {total_removed} duplicate entries")
         return total_removed
     
+    @staticmethod
+    def receipt_fingerprint(item_keys: List[tuple]) -> Optional[str]:
+        """
+        Fingerprint of a whole receipt: merchant, date, item count and grand total.
+        Item names are left out, so a second photo of the same receipt matches even if
+        the names were read slightly differently.
+        """
+        if not item_keys or not item_keys[0][1]:
+            return None
+        _, date, merchant, _ = item_keys[0]
+        grand_total = sum(float(total or 0) for _, _, _, total in item_keys)
+        raw = f"{str(merchant or '').strip().lower()}|{str(date).strip()}|{len(item_keys)}|{grand_total:.2f}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def find_known_items(self, item_keys: List[tuple]) -> Set[int]:
+        """
+        Check a receipt against the local mirror before uploading it
+        
+        Args:
+            item_keys: (item name, date, merchant, total price) of each item
+        
+        Returns:
+            Indexes of the items that are already in the ledger (empty without a mirror)
+        """
+        if self.mirror is None:
+            return set()
+        self.mirror.refresh()
+        fingerprint = self.receipt_fingerprint(item_keys)
+        # The whole receipt is known only while a page exists for every item. After a partial
+        # upload, or once pages were deleted in Notion, the items are checked one by one.
+        if fingerprint and len(self.mirror.receipt_pages(fingerprint)) >= len(item_keys):
+            logging.info("Receipt fingerprint matches a receipt that is already uploaded")
+            return set(range(len(item_keys)))
+        
+        known = set()
+        occurrences = Counter()
+        for index, (item_name, date, merchant, total_price) in enumerate(item_keys):
+            key = dedupe_key(item_name, date, merchant, total_price)
+            if key is None:
+                continue
+            # The same item may legitimately appear twice on one receipt
+            occurrences[key] += 1
+            if len(self.mirror.find_by_dedupe_key(key)) >= occurrences[key]:
+                known.add(index)
+        return known
+    
+    def record_receipt(self, item_keys: List[tuple], page_ids: List[str]):
+        """Remember the pages created for a receipt under its fingerprint"""
+        fingerprint = self.receipt_fingerprint(item_keys)
+        if self.mirror is not None and fingerprint:
+            self.mirror.record_receipt(fingerprint, page_ids)
+    
+    def remove_duplicates_for(self, items: Iterable[tuple]) -> int:
+        """
+        Remove duplicates of just-written entries only, instead of scanning the whole ledger.
+        Each key is looked up in the mirror's index, or with one filtered query without a mirror.
+        
+        Args:
+            items: (item name, date, merchant, total price) of the new entries. An item
+                listed N times on the receipt keeps its N newest entries.
+        
+        Returns:
+            Number of duplicates removed
+        """
+        total_removed = 0
+        occurrences = Counter()
+        first_item = {}
+        for item in items:
+            key = dedupe_key(*item)
+            if key is not None:
+                occurrences[key] += 1
+                first_item.setdefault(key, item)
+        with self.dedupe_lock:
+            if self.mirror is not None:
+                self.mirror.refresh()
+            for key, keep in occurrences.items():
+                item_name, date, merchant, total_price = first_item[key]
+                if self.mirror is not None:
+                    group = self.mirror.find_by_dedupe_key(key)
+                else:
+                    group = [(page.get("id"), page.get("created_time"))
+                             for page in self._query_pages(self._dedupe_filter(item_name, date, merchant, total_price), ["항목"])]
+                if len(group) <= keep:
+                    continue
+                # Keep the newest entries, one per occurrence on the receipt
+                group.sort(key=lambda page: page[1] or "", reverse=True)
+                logging.info(f"Found {len(group) - keep} duplicates for: {item_name}")
+                for page_id, _ in group[keep:]:
+                    if self.delete_entry(page_id):
+                        total_removed += 1
+        return total_removed
+    
+    @staticmethod
+    def _dedupe_filter(item_name, date, merchant, total_price) -> Dict:
+        merchant = str(merchant or "").strip()
+        if merchant:
+            merchant_filter = {"property": "사용처", "rich_text": {"equals": merchant}}
+        else:
+            merchant_filter = {"property": "사용처", "rich_text": {"is_empty": True}}
+        return {"and": [
+            {"property": "항목", "title": {"equals": str(item_name).strip()}},
+            {"property": "날짜", "date": {"equals": str(date).strip()}},
+            merchant_filter,
+            {"property": "합계", "number": {"equals": total_price}},
+        ]}
+    
     def validate_all_entries(self) -> Dict[str, List[str]]:
         """
         Validate all entries in the database
@@ -262,10 +545,9 @@ class NotionValidator:
             Dictionary mapping page_id to list of validation errors
         """
         logging.info("Validating all entries...")
-        entries = self.get_all_entries()
         validation_results = {}
         
-        for entry in entries:
+        for entry in self.iter_entries():
             page_id = entry.get("id")
             errors = self.validate_entry(entry)
             if errors:
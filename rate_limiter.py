@@ -0,0 +1,60 @@
+import time
+import threading
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second on average, up to `capacity` in a burst."""
+
+    def __init__(self, rate=3.0, capacity=6, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            rate: Average number of requests per second
+            capacity: Maximum burst size
+            clock/sleep: Injectable for tests
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        # Caller holds self.lock
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Takes tokens without waiting. Returns True if they were available."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def reserve(self, tokens=1):
+        """
+        Takes tokens now (the balance may go negative) and returns how long the caller
+        must wait before using them. Waiters are served in order.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited_seconds += wait
+        return wait
+
+    def acquire(self, tokens=1):
+        """Blocks until tokens are available, then takes them."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.sleep(wait)
+
+    def penalize(self, seconds):
+        """Drains the bucket so no request is released for `seconds` (e.g. after a Retry-After)."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
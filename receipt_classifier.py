@@ -0,0 +1,94 @@
+import logging
+
+from image_preprocessor import Image, trim_borders
+
+if Image is not None:
+    from PIL import ImageOps, ImageStat
+
+def _clamp(value, low=0.0, high=1.0):
+    return max(low, min(high, value))
+
+class ReceiptClassifier:
+    """
+    Cheap CPU-only estimate of whether a photo shows a receipt, used to keep ordinary
+    camera-roll photos away from the vision model.
+
+    The score (0-1) combines:
+      - paper: share of bright pixels (white/grey receipt paper)
+      - colour: low saturation
+      - lines: number of separated dark text rows in the horizontal projection
+      - aspect: tall shape after EXIF rotation and background trimming
+    """
+
+    WEIGHTS = {"paper": 0.3, "colour": 0.2, "lines": 0.35, "aspect": 0.15}
+
+    def __init__(self, threshold=0.35, sample_size=400):
+        """
+        Args:
+            threshold: Photos scoring below this are not treated as receipts
+            sample_size: Long edge of the thumbnail the features are computed on
+        """
+        self.threshold = threshold
+        self.sample_size = sample_size
+        if Image is None:
+            logging.warning("Pillow not available, receipt pre-classification is disabled.")
+
+    def score(self, filepath):
+        """
+        Returns:
+            (score, features) or (None, {}) if the image cannot be analysed
+        """
+        if Image is None:
+            return None, {}
+        try:
+            with Image.open(filepath) as img:
+                img.draft("RGB", (self.sample_size * 2, self.sample_size * 2))
+                img = ImageOps.exif_transpose(img).convert("RGB")
+                img = trim_borders(img)
+                img.thumbnail((self.sample_size, self.sample_size))
+                features = self._features(img)
+        except Exception as e:
+            logging.warning(f"Receipt pre-classification failed for {filepath}: {e}")
+            return None, {}
+        score = sum(self.WEIGHTS[name] * features[name] for name in self.WEIGHTS)
+        return score, features
+
+    def is_receipt(self, filepath):
+        """
+        Returns:
+            (is_receipt, score). Images that cannot be scored count as receipts.
+        """
+        score, features = self.score(filepath)
+        if score is None:
+            return True, None
+        detail = ", ".join(f"{name}={value:.2f}" for name, value in features.items())
+        logging.info(f"Receipt score {score:.2f} (threshold {self.threshold}): {detail}")
+        return score >= self.threshold, score
+
+    @staticmethod
+    def _features(img):
+        width, height = img.size
+        gray = img.convert("L")
+        histogram = gray.histogram()
+        total = float(width * height)
+        bright = sum(histogram[160:]) / total
+        saturation = ImageStat.Stat(img.convert("HSV").getchannel("S")).mean[0] / 255.0
+
+        # Text rows: rows with some (but not mostly) dark pixels, separated by blank rows
+        mean = ImageStat.Stat(gray).mean[0]
+        dark = gray.point(lambda v: 255 if v < mean - 40 else 0).tobytes()
+        lines = 0
+        in_line = False
+        for y in range(height):
+            ratio = dark[y * width:(y + 1) * width].count(255) / float(width)
+            text_row = 0.02 < ratio < 0.85
+            if text_row and not in_line:
+                lines += 1
+            in_line = text_row
+
+        return {
+            "paper": _clamp((bright - 0.2) / 0.4),
+            "colour": 1.0 - _clamp(saturation / 0.35),
+            "lines": _clamp(lines / 15.0),
+            "aspect": _clamp((height / float(width) - 0.8) / 0.7),
+        }
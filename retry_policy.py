@@ -0,0 +1,109 @@
+import time
+import asyncio
+import random
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (seconds or HTTP date).
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(str(value))
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+class RetryPolicy:
+    """Jittered exponential backoff with an attempt limit and a total wait budget."""
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0, max_total_wait=60.0,
+                 sleep=time.sleep, rng=random.random):
+        """
+        Args:
+            max_attempts: Total attempts including the first one
+            base_delay: Backoff before the first retry (doubles each attempt)
+            max_delay: Upper bound for a single backoff
+            max_total_wait: Total seconds a single call may spend waiting between attempts
+            sleep/rng: Injectable for tests
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_wait = max_total_wait
+        self.sleep = sleep
+        self.rng = rng
+
+    def delay_for(self, attempt, retry_after=None):
+        """
+        Returns the wait before retry number `attempt` (1-based).
+
+        A server-provided Retry-After is honoured as a minimum; otherwise full jitter
+        over the exponential backoff window is used.
+        """
+        window = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = self.rng() * window
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, fn, classify, description="request"):
+        """
+        Calls fn() and retries on errors that classify() accepts.
+
+        Args:
+            fn: Callable performing the request; raises on failure
+            classify: Called with the exception; returns None if it must not be retried,
+                      otherwise the Retry-After in seconds (or 0 if unknown)
+            description: Used in log messages
+
+        Returns:
+            The result of fn(). The last exception is re-raised when retries are exhausted.
+        """
+        waited = 0.0
+        attempt = 1
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                retry_after = classify(e)
+                if retry_after is None or attempt >= self.max_attempts:
+                    raise
+                delay = self.delay_for(attempt, retry_after or None)
+                if waited + delay > self.max_total_wait:
+                    raise
+                logging.warning(f"{description} failed ({e}); retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                self.sleep(delay)
+                waited += delay
+                attempt += 1
+
+    async def call_async(self, fn, classify, description="request"):
+        """Async variant of call(): fn() returns an awaitable and backoff uses asyncio.sleep."""
+        waited = 0.0
+        attempt = 1
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                retry_after = classify(e)
+                if retry_after is None or attempt >= self.max_attempts:
+                    raise
+                delay = self.delay_for(attempt, retry_after or None)
+                if waited + delay > self.max_total_wait:
+                    raise
+                logging.warning(f"{description} failed ({e}); retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                waited += delay
+                attempt += 1
@@ -0,0 +1,170 @@
+import os
+import time
+import heapq
+import logging
+import threading
+
+def file_signature(filepath):
+    """
+    Returns (size, mtime_ns) if the file exists, is non-empty and can be opened.
+    Returns None otherwise (missing, 0 bytes, or still locked by the sync client).
+    """
+    try:
+        st = os.stat(filepath)
+        if st.st_size == 0:
+            return None
+        with open(filepath, 'rb') as f:
+            f.read(1)
+        return (st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None
+
+def is_file_ready(filepath):
+    """Checks if a file exists, is non-empty and can be opened."""
+    return file_signature(filepath) is not None
+
+def wait_until_stable(filepath, initial_delay=0.5, max_delay=10.0, max_wait=120.0):
+    """
+    Blocking variant of FileStabilityMonitor for a single file.
+
+    Returns:
+        True once size/mtime are unchanged between two polls, False on timeout
+    """
+    deadline = time.monotonic() + max_wait
+    delay = initial_delay
+    last_sig = file_signature(filepath)
+    while time.monotonic() < deadline:
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        sig = file_signature(filepath)
+        if sig is not None and sig == last_sig:
+            return True
+        last_sig = sig
+        delay = min(delay * 2, max_delay)
+    return False
+
+class FileStabilityMonitor:
+    """
+    Waits for many files at once until they stop changing, using a single thread.
+
+    Each watched file is polled for size/mtime with exponential backoff. A file is
+    ready when two consecutive polls see the same non-empty, openable file.
+    """
+
+    def __init__(self, on_ready, on_timeout=None, initial_delay=0.5, max_delay=10.0, max_wait=300.0):
+        """
+        Args:
+            on_ready: Called with the path once the file is stable. If it returns
+                      False (e.g. the work queue is full) the file is checked again later.
+            on_timeout: Called with the path if the file is not stable within max_wait
+            initial_delay: Seconds before the first re-check
+            max_delay: Upper bound for the backoff between checks
+            max_wait: Seconds after which a file is given up on
+        """
+        self.on_ready = on_ready
+        self.on_timeout = on_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.pending = {}  # {abs_path: state dict}
+        self.heap = []  # [(due, seq, abs_path)]
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Starts the polling thread."""
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._run, name="stability-monitor", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the polling thread. Files still pending are left for the next scan."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def watch(self, filepath):
+        """
+        Starts watching a file. Files that are already pending are ignored.
+
+        Returns:
+            True if the file was added, False if it was already pending
+        """
+        abs_path = os.path.abspath(filepath)
+        now = time.monotonic()
+        with self.cond:
+            if abs_path in self.pending:
+                return False
+            self.pending[abs_path] = {
+                "first_seen": now,
+                "last_sig": file_signature(abs_path),
+                "delay": self.initial_delay,
+            }
+            self._schedule(abs_path, now + self.initial_delay)
+        return True
+
+    def pending_count(self):
+        """Returns the number of files waiting to become stable."""
+        with self.cond:
+            return len(self.pending)
+
+    def _schedule(self, abs_path, due):
+        # Caller holds self.cond
+        self.seq += 1
+        heapq.heappush(self.heap, (due, self.seq, abs_path))
+        self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.cond.wait(timeout)
+                if not self.running:
+                    return
+                due_paths = []
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    due_paths.append(heapq.heappop(self.heap)[2])
+            for abs_path in due_paths:
+                try:
+                    self._check(abs_path)
+                except Exception as e:
+                    logging.exception(f"Stability check failed for {abs_path}: {e}")
+                    with self.cond:
+                        self.pending.pop(abs_path, None)
+
+    def _check(self, abs_path):
+        with self.cond:
+            state = self.pending.get(abs_path)
+        if state is None:
+            return
+        sig = file_signature(abs_path)
+        now = time.monotonic()
+        if sig is not None and sig == state["last_sig"]:
+            if self.on_ready(abs_path) is False:
+                # 대기열이 가득 참 → 나중에 다시 전달 (시간 초과로 치지 않음)
+                with self.cond:
+                    state["first_seen"] = now
+                    self._schedule(abs_path, now + self.max_delay)
+                return
+            with self.cond:
+                self.pending.pop(abs_path, None)
+            return
+        if now - state["first_seen"] >= self.max_wait:
+            with self.cond:
+                self.pending.pop(abs_path, None)
+            if self.on_timeout:
+                self.on_timeout(abs_path)
+            return
+        with self.cond:
+            state["last_sig"] = sig
+            state["delay"] = min(state["delay"] * 2, self.max_delay)
+            self._schedule(abs_path, now + state["delay"])
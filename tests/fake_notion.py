@@ -0,0 +1,220 @@
+"""
+Minimal in-process stand-in for the Notion API used by tests.
+"""
+import json
+import uuid
+import threading
+from urllib.parse import parse_qs, unquote, urlsplit
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeNotionServer:
+    """Serves /v1/pages and /v1/databases/{id}/query from an in-memory page list."""
+
+    def __init__(self, database_id="test-db"):
+        self.database_id = database_id
+        self.pages = []  # Notion page objects, oldest first
+        self.requests = []  # [(method, path, body)]
+        self.fail_queue = []  # [(status, headers)] returned before normal handling
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                body = self._body()
+                with server.lock:
+                    server.requests.append((method, self.path, body))
+                    failure = server.fail_queue.pop(0) if server.fail_queue else None
+                if failure:
+                    status, headers = failure
+                    self._send(status, {"object": "error", "status": status}, headers)
+                    return
+                parts = urlsplit(self.path)
+                status, payload = server.dispatch(method, parts.path, body, parse_qs(parts.query))
+                self._send(status, payload)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PATCH(self):
+                self._handle("PATCH")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def add_page(self, properties, created_time=None):
+        """Adds a page with simplified properties: {name: value} (title for 항목, select for 분류, ...)."""
+        page = make_page(properties, created_time)
+        with self.lock:
+            self.pages.append(page)
+        return page
+
+    def live_pages(self):
+        with self.lock:
+            return [p for p in self.pages if not p.get("archived")]
+
+    def count_requests(self, method, path_prefix):
+        with self.lock:
+            return sum(1 for m, p, _ in self.requests if m == method and p.startswith(path_prefix))
+
+    def dispatch(self, method, path, body, params=None):
+        params = params or {}
+        with self.lock:
+            if method == "POST" and path == "/v1/pages":
+                page = {
+                    "object": "page",
+                    "id": str(uuid.uuid4()),
+                    "created_time": _now(),
+                    "last_edited_time": _now(),
+                    "archived": False,
+                    "properties": _typed_properties(body.get("properties", {})),
+                }
+                self.pages.append(page)
+                return 200, page
+            if method == "PATCH" and path.startswith("/v1/pages/"):
+                page_id = path.rsplit("/", 1)[1]
+                for page in self.pages:
+                    if page["id"] == page_id:
+                        if "archived" in body:
+                            page["archived"] = body["archived"]
+                        page["last_edited_time"] = _now()
+                        return 200, page
+                return 404, {"object": "error", "status": 404}
+            if method == "GET" and path == f"/v1/databases/{self.database_id}":
+                properties = {name: {"id": prop_id} for name, prop_id in PROPERTY_IDS.items()}
+                return 200, {"object": "database", "id": self.database_id, "properties": properties}
+            if method == "POST" and path == f"/v1/databases/{self.database_id}/query":
+                results = [p for p in self.pages if not p.get("archived")]
+                if body.get("filter"):
+                    results = [p for p in results if matches_filter(p, body["filter"])]
+                if body.get("sorts"):
+                    for sort in reversed(body["sorts"]):
+                        field = sort.get("timestamp")
+                        results.sort(key=lambda p: p[field], reverse=sort.get("direction") == "descending")
+                page_size = int(body.get("page_size", 100))
+                start = int(body.get("start_cursor") or 0)
+                chunk = results[start:start + page_size]
+                if params.get("filter_properties"):
+                    names = {name for name, prop_id in PROPERTY_IDS.items() if unquote(prop_id) in params["filter_properties"]}
+                    chunk = [dict(p, properties={k: v for k, v in p["properties"].items() if k in names})
+                             for p in chunk]
+                has_more = start + page_size < len(results)
+                return 200, {
+                    "object": "list",
+                    "results": chunk,
+                    "has_more": has_more,
+                    "next_cursor": str(start + page_size) if has_more else None,
+                }
+        return 404, {"object": "error", "status": 404}
+
+
+PROPERTY_IDS = {
+    "항목": "title", "날짜": "d%3Ate", "사용처": "m%3Erc", "합계": "t%3Bot",
+    "단가": "u%3Bpr", "수량": "q%3Bty", "분류": "c%3Bat", "원본파일": "s%3Brc",
+}
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _typed_properties(props):
+    """Adds the 'type' key Notion returns for each property value."""
+    typed = {}
+    for name, value in props.items():
+        if not value:
+            continue
+        prop_type = next(iter(value))
+        typed[name] = {"type": prop_type, prop_type: value[prop_type]}
+    return typed
+
+
+def make_page(properties, created_time=None):
+    """Builds a Notion page object from simplified {name: value} properties."""
+    props = {}
+    for name, value in properties.items():
+        if name == "항목":
+            props[name] = {"title": [{"text": {"content": value}}]}
+        elif name == "날짜":
+            props[name] = {"date": {"start": value} if value else None}
+        elif name in ("합계", "단가", "수량"):
+            props[name] = {"number": value}
+        elif name == "분류":
+            props[name] = {"select": {"name": value} if value else None}
+        else:
+            props[name] = {"rich_text": [{"text": {"content": value}}]}
+    return {
+        "object": "page",
+        "id": str(uuid.uuid4()),
+        "created_time": created_time or _now(),
+        "last_edited_time": created_time or _now(),
+        "archived": False,
+        "properties": {name: {"type": next(iter(v)), **v} for name, v in props.items()},
+    }
+
+
+def _property_value(page, name):
+    prop = page["properties"].get(name) or {}
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+    if prop_type in ("title", "rich_text"):
+        return value[0]["text"]["content"] if value else ""
+    if prop_type in ("date", "select"):
+        return (value or {}).get("start" if prop_type == "date" else "name")
+    return value
+
+
+def matches_filter(page, flt):
+    """Evaluates the subset of Notion query filters used by the application."""
+    if "and" in flt:
+        return all(matches_filter(page, f) for f in flt["and"])
+    if "or" in flt:
+        return any(matches_filter(page, f) for f in flt["or"])
+    if "timestamp" in flt:
+        value = page[flt["timestamp"]]
+        condition = flt[flt["timestamp"]]
+    else:
+        value = _property_value(page, flt["property"])
+        condition = next(v for k, v in flt.items() if k != "property")
+    for op, expected in condition.items():
+        if op == "equals" and value != expected:
+            return False
+        if op == "on_or_after" and (value is None or value < expected):
+            return False
+        if op == "after" and (value is None or value <= expected):
+            return False
+        if op == "is_empty" and bool(value) == expected:
+            return False
+    return True
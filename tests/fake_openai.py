@@ -0,0 +1,141 @@
+"""
+Minimal in-process stand-in for the OpenAI Files and Batch APIs used by tests.
+"""
+import json
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBatchServer:
+    """
+    Serves /v1/files and /v1/batches. A batch moves validating -> in_progress -> completed
+    on successive retrieves; its output is produced by `answer(custom_id, body)`.
+    """
+
+    def __init__(self, answer=None):
+        """
+        Args:
+            answer: answer(custom_id, body) -> chat completion JSON content (a dict), or
+                    None to report the request as failed in the error file
+        """
+        self.answer = answer or (lambda custom_id, body: {"items": []})
+        self.files = {}  # file_id -> bytes
+        self.batches = {}  # batch_id -> batch object
+        self.requests = []  # [(method, path)]
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, raw=None):
+                data = raw if raw is not None else json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with server.lock:
+                    server.requests.append((method, self.path))
+                    status, payload, raw = server.dispatch(method, self.path.split("?")[0], self.headers, body)
+                self._send(status, payload, raw)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count_requests(self, method, path_prefix):
+        with self.lock:
+            return sum(1 for m, p in self.requests if m == method and p.startswith(path_prefix))
+
+    def _add_file(self, data, purpose):
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = data
+        return {"id": file_id, "object": "file", "bytes": len(data), "created_at": 0,
+                "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"}
+
+    def dispatch(self, method, path, headers, body):
+        if method == "POST" and path == "/v1/files":
+            message = BytesParser().parsebytes(
+                f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode("utf-8") + body)
+            fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                      for part in message.get_payload()}
+            return 200, self._add_file(fields["file"], fields["purpose"].decode("utf-8")), None
+
+        if method == "GET" and path.startswith("/v1/files/") and path.endswith("/content"):
+            file_id = path.split("/")[3]
+            if file_id not in self.files:
+                return 404, {"error": {"message": "no such file"}}, None
+            return 200, None, self.files[file_id]
+
+        if method == "POST" and path == "/v1/batches":
+            request = json.loads(body)
+            batch_id = f"batch_{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                "status": "validating", "created_at": 0, "output_file_id": None, "error_file_id": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+            return 200, self.batches[batch_id], None
+
+        if method == "GET" and path.startswith("/v1/batches/"):
+            batch = self.batches.get(path.split("/")[3])
+            if batch is None:
+                return 404, {"error": {"message": "no such batch"}}, None
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                self._complete(batch)
+            return 200, batch, None
+
+        return 404, {"error": {"message": f"unsupported {method} {path}"}}, None
+
+    def _complete(self, batch):
+        output, errors = [], []
+        lines = self.files[batch["input_file_id"]].decode("utf-8").splitlines()
+        for line in lines:
+            request = json.loads(line)
+            content = self.answer(request["custom_id"], request["body"])
+            if content is None:
+                errors.append({"id": "r", "custom_id": request["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "failed"}})
+                continue
+            completion = {
+                "id": "chatcmpl-x", "object": "chat.completion", "created": 0, "model": request["body"]["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            }
+            output.append({"id": "r", "custom_id": request["custom_id"],
+                           "response": {"status_code": 200, "body": completion}, "error": None})
+        batch["status"] = "completed"
+        batch["request_counts"] = {"total": len(lines), "completed": len(output), "failed": len(errors)}
+        if output:
+            batch["output_file_id"] = self._add_file("".join(json.dumps(r) + "\n" for r in output).encode("utf-8"),
+                                                     "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self._add_file("".join(json.dumps(r) + "\n" for r in errors).encode("utf-8"),
+                                                    "batch_output")["id"]
@@ -0,0 +1,47 @@
+"""
+Synthetic receipt photos shared by the image tests (needs Pillow).
+"""
+import random
+
+
+def make_text_receipt(path, seed, size=(1500, 2000)):
+    """White receipt with pseudo text lines on a dark background."""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, (30, 30, 30))
+    draw = ImageDraw.Draw(img)
+    left, right = size[0] // 6, size[0] * 5 // 6
+    draw.rectangle((left, 60, right, size[1] - 60), fill=(245, 245, 240))
+    y = 120
+    while y < size[1] - 120:
+        x = left + 40
+        while x < right - 80:
+            width = rng.randint(20, 160)
+            draw.rectangle((x, y, min(x + width, right - 40), y + 24), fill=(40, 40, 40))
+            x += width + rng.randint(15, 60)
+        y += rng.randint(40, 90)
+    img.save(path, quality=95)
+
+
+def make_receipt_on_table(path, seed, size=(1500, 2000)):
+    """Small receipt on a striped table that is the same in every photo (seed only changes the receipt)."""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    table = random.Random(0)
+    img = Image.new("RGB", size)
+    draw = ImageDraw.Draw(img)
+    for y in range(0, size[1], 8):
+        shade = table.randint(90, 150)
+        draw.rectangle((0, y, size[0], y + 8), fill=(shade, shade * 2 // 3, shade // 2))
+    left, right = size[0] * 3 // 8, size[0] * 5 // 8
+    top, bottom = size[1] // 4, size[1] * 3 // 4
+    draw.rectangle((left, top, right, bottom), fill=(245, 245, 240))
+    y = top + 30
+    while y < bottom - 30:
+        x = left + 15
+        while x < right - 30:
+            width = rng.randint(10, 60)
+            draw.rectangle((x, y, min(x + width, right - 15), y + 10), fill=(40, 40, 40))
+            x += width + rng.randint(8, 25)
+        y += rng.randint(18, 35)
+    img.save(path, quality=95)
@@ -0,0 +1,100 @@
+"""
+Unit tests for AnalysisCache (no network or .env required).
+"""
+import os
+import time
+import tempfile
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_cache import AnalysisCache, file_sha256
+
+
+def test_analysis_cache():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        img1 = os.path.join(tmpdir, "a.jpg")
+        img2 = os.path.join(tmpdir, "copy_of_a.jpg")
+        for path in (img1, img2):
+            with open(path, "wb") as f:
+                f.write(b"same receipt bytes")
+        assert file_sha256(img1) == file_sha256(img2)
+
+        cache = AnalysisCache(cache_dir=os.path.join(tmpdir, "cache"))
+        data = {"merchant": "이마트", "date": "2025-01-15", "items": [{"name": "우유", "total_price": 2500}]}
+        first_key = AnalysisCache.make_key(file_sha256(img1), "gpt-4o:1:first")
+        retry_key = AnalysisCache.make_key(file_sha256(img1), "gpt-4o:1:retry")
+        assert first_key != retry_key
+
+        assert cache.get(first_key) is None
+        cache.put(first_key, data)
+        # Renamed copy with identical bytes hits the same entry
+        assert cache.get(AnalysisCache.make_key(file_sha256(img2), "gpt-4o:1:first")) == data
+        assert cache.get(retry_key) is None
+        assert cache.hits == 1 and cache.misses == 2
+
+        # Reload from disk
+        cache2 = AnalysisCache(cache_dir=os.path.join(tmpdir, "cache"))
+        assert cache2.get(first_key) == data
+    print("[OK] AnalysisCache tests passed.")
+
+
+def test_analysis_cache_eviction():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = AnalysisCache(cache_dir=tmpdir, max_entries=3)
+        for i in range(5):
+            cache.put(f"key{i}", {"items": [i]})
+            past = time.time() - 100 + i
+            os.utime(os.path.join(tmpdir, f"key{i}.json"), (past, past))
+        cache.put("key5", {"items": [5]})
+        assert cache.get_count() <= 3
+        assert cache.get("key0") is None
+        assert cache.get("key5") == {"items": [5]}
+
+        # Age-based expiry
+        expired = AnalysisCache(cache_dir=os.path.join(tmpdir, "old"), max_age_days=0)
+        expired.put("k", {"items": []})
+        time.sleep(0.01)
+        assert expired.get("k") is None
+
+        # Size-based eviction keeps the cache under max_bytes
+        small = AnalysisCache(cache_dir=os.path.join(tmpdir, "small"), max_bytes=300)
+        for i in range(10):
+            small.put(f"k{i}", {"items": ["x" * 50]})
+        assert 0 < small.get_count() < 10
+    print("[OK] AnalysisCache eviction tests passed.")
+
+
+def test_analysis_cache_scans_rarely():
+    import analysis_cache
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scans = []
+        real_scandir = analysis_cache.os.scandir
+
+        def counting_scandir(path):
+            scans.append(path)
+            return real_scandir(path)
+
+        analysis_cache.os.scandir = counting_scandir
+        try:
+            cache = AnalysisCache(cache_dir=tmpdir, max_entries=100)
+            for i in range(250):
+                cache.put(f"key{i}", {"items": [i]})
+        finally:
+            analysis_cache.os.scandir = real_scandir
+        # First put, then once per ~10 puts past the limit, not once per put
+        assert len(scans) <= 20
+        assert cache.get_count() <= 100 and cache.get("key249") == {"items": [249]}
+
+        # Expiry uses the same basis as eviction: time since last use (file mtime)
+        recent = AnalysisCache(cache_dir=os.path.join(tmpdir, "recent"), max_age_days=1)
+        recent.put("k", {"items": []})
+        past = time.time() - 2 * 86400
+        os.utime(os.path.join(tmpdir, "recent", "k.json"), (past, past))
+        assert recent.get("k") is None
+    print("[OK] AnalysisCache scan frequency test passed.")
+
+
+if __name__ == "__main__":
+    test_analysis_cache()
+    test_analysis_cache_eviction()
+    test_analysis_cache_scans_rarely()
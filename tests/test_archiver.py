@@ -30,6 +30,9 @@ def test_archiver():
         assert "2025" in dest and "01" in dest
         assert archiver.is_in_archive(dest) is True
         assert archiver.is_in_archive(test_file) is False  # original gone
+        assert archiver.is_in_archive(archive_root) is True
+        # Folders whose name only starts with "Archive" are not the archive
+        assert archiver.is_in_archive(os.path.join(base, "Archives", "2023", "a.jpg")) is False
         
         # Archive without receipt_date (uses current date)
         test_file2 = os.path.join(base, "receipt2.jpg")
@@ -0,0 +1,101 @@
+"""
+Unit tests for the asyncio engine pieces (no network or .env required).
+"""
+import os
+import asyncio
+import tempfile
+import threading
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_pipeline import AsyncNotionClient, AsyncReceiptEngine, wait_until_stable_async
+from retry_policy import RetryPolicy
+from tests.fake_notion import FakeNotionServer
+
+
+def test_wait_until_stable_async():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "receipt.jpg")
+        with open(path, "wb") as f:
+            f.write(b"data")
+        assert asyncio.run(wait_until_stable_async(path, initial_delay=0.01, max_wait=1)) is True
+        missing = os.path.join(tmpdir, "missing.jpg")
+        assert asyncio.run(wait_until_stable_async(missing, initial_delay=0.01, max_wait=0.1)) is False
+    print("[OK] wait_until_stable_async tests passed.")
+
+
+def test_async_notion_client():
+    async def run(server):
+        client = AsyncNotionClient("secret", base_url=server.base_url,
+                                   retry_policies={"default": RetryPolicy(base_delay=0.01)})
+        server.fail_queue = [(429, {"Retry-After": "0.01"})]
+        responses = await asyncio.gather(*(
+            client.post("/pages", json={"properties": {"항목": {"title": [{"text": {"content": f"item{i}"}}]}}})
+            for i in range(10)
+        ))
+        assert all(r.status_code == 200 for r in responses)
+        assert client.retry_count == 1
+
+        # Ambiguous failure without a check is not retried for page creates
+        server.fail_queue = [(500, {})]
+        response = await client.post("/pages", json={"properties": {}})
+        assert response.status_code == 500
+
+        # ...but the found page is returned when the check says the write went through
+        async def applied():
+            return {"object": "page", "id": "existing"}
+        server.fail_queue = [(502, {})]
+        response = await client.post("/pages", json={"properties": {}}, applied_check=applied)
+        assert response.status_code == 200 and response.json()["id"] == "existing"
+        await client.aclose()
+
+    with FakeNotionServer() as server:
+        asyncio.run(run(server))
+        assert len(server.live_pages()) == 10
+    print("[OK] AsyncNotionClient tests passed.")
+
+
+def test_async_receipt_engine():
+    processed = []
+    release = None
+    started = threading.Event()
+
+    async def process(path):
+        started.set()
+        await release.wait()
+        processed.append(os.path.basename(path))
+
+    engine = AsyncReceiptEngine(process, max_in_flight=3)
+    engine.start()
+    release = engine.run(_make_event())
+
+    assert engine.submit("/photos/a.jpg") is True
+    assert engine.submit("/photos/a.jpg") is False  # already in flight
+    assert engine.submit("/photos/b.jpg") is True
+    assert engine.submit("/photos/c.jpg") is True
+    # All slots taken → backpressure
+    assert engine.submit("/photos/d.jpg", timeout=0.05) is False
+    assert started.wait(2)
+    assert engine.pending_count() == 3
+
+    engine.loop.call_soon_threadsafe(release.set)
+    cleaned = []
+
+    async def cleanup():
+        cleaned.append(True)
+
+    engine.shutdown(wait=True, timeout=5, cleanup=cleanup)
+    assert sorted(processed) == ["a.jpg", "b.jpg", "c.jpg"]
+    assert cleaned == [True]
+    assert engine.submit("/photos/e.jpg") is False
+    print("[OK] AsyncReceiptEngine tests passed.")
+
+
+async def _make_event():
+    return asyncio.Event()
+
+
+if __name__ == "__main__":
+    test_wait_until_stable_async()
+    test_async_notion_client()
+    test_async_receipt_engine()
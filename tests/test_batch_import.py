@@ -0,0 +1,108 @@
+"""
+Tests for the Batch API backlog importer against a local stand-in batch server
+(no network or .env required).
+"""
+import os
+import json
+import tempfile
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+
+from batch_import import BatchImporter
+from tests.fake_openai import FakeBatchServer
+
+
+def _answer(custom_id, body):
+    name = body["messages"][0]["content"]
+    if name.endswith("bad.jpg"):
+        return None
+    return {"merchant": "마트", "date": "2024-01-01", "items": [{"name": os.path.basename(name)}]}
+
+
+def _build_request(path):
+    if path.endswith("skip.jpg"):
+        return None
+    return {"model": "gpt-4o", "messages": [{"role": "user", "content": path}]}
+
+
+def test_submit_resume_and_handle():
+    with tempfile.TemporaryDirectory() as tmpdir, FakeBatchServer(_answer) as server:
+        client = OpenAI(api_key="sk-test", base_url=server.base_url, max_retries=0)
+        manifest = os.path.join(tmpdir, "manifest.json")
+        paths = [os.path.join(tmpdir, name) for name in ("a.jpg", "b.jpg", "bad.jpg", "skip.jpg", "c.jpg")]
+
+        importer = BatchImporter(client, manifest, max_files_per_batch=2, sleep=lambda s: None)
+        assert importer.submit(paths + paths[:1], _build_request) == 4
+        # Chunks of two submitted files: [a, b] and [bad, c]
+        assert len(importer.jobs) == 2
+        assert server.count_requests("POST", "/v1/batches") == 2
+        # One status check, then the process "stops"
+        assert importer.poll() == 2
+
+        # Restart: nothing is submitted again, unfinished batches are polled to the end
+        resumed = BatchImporter(client, manifest, max_files_per_batch=2, sleep=lambda s: None)
+        assert resumed.submit(paths, _build_request) == 0
+        assert server.count_requests("POST", "/v1/batches") == 2
+        assert resumed.wait()
+        assert resumed.pending_count() == 4
+
+        handled = []
+
+        def handle(path, completion):
+            if os.path.basename(path) == "b.jpg" and not any(p.endswith("b.jpg") for p, _ in handled):
+                handled.append((path, "crash"))
+                raise RuntimeError("upload failed")
+            content = json.loads(completion.choices[0].message.content) if completion else None
+            handled.append((path, content))
+            return True
+
+        assert resumed.handle_results(handle) == 4
+        results = dict(handled)
+        assert results[paths[0]]["items"][0]["name"] == "a.jpg"
+        assert results[paths[2]] is None          # failed request, handed over without answer
+        assert results[paths[4]]["date"] == "2024-01-01"
+        assert results[paths[1]] == "crash"
+
+        # Handled files are not handed over again, even after another restart
+        again = BatchImporter(client, manifest, sleep=lambda s: None)
+        assert again.handle_results(handle) == 0
+        states = {entry["path"]: entry["state"] for job in again.jobs for entry in job["files"].values()}
+        assert states[paths[1]] == "failed" and states[paths[0]] == "done"
+        assert again.pending_count() == 0
+
+        # A rerun submits the failed file again (it is excluded from the live watcher by age)
+        assert again.submit(paths, _build_request) == 1
+        assert server.count_requests("POST", "/v1/batches") == 3
+        assert again.wait()
+        assert again.handle_results(handle) == 1
+        assert dict(handled[-1:])[paths[1]]["items"][0]["name"] == "b.jpg"
+        assert again.submit(paths, _build_request) == 0
+    print("[OK] Batch import tests passed.")
+
+
+def test_chunks_are_capped_by_size():
+    with tempfile.TemporaryDirectory() as tmpdir, FakeBatchServer(_answer) as server:
+        client = OpenAI(api_key="sk-test", base_url=server.base_url, max_retries=0)
+        paths = [os.path.join(tmpdir, f"{name}.jpg") for name in ("a", "b", "huge", "c", "d", "e")]
+
+        def build_request(path):
+            image = "x" * (5000 if path.endswith("huge.jpg") else 1000)
+            return {"model": "gpt-4o", "messages": [{"role": "user", "content": path}], "image": image}
+
+        importer = BatchImporter(client, os.path.join(tmpdir, "manifest.json"), max_files_per_batch=500,
+                                 max_bytes_per_batch=2500, sleep=lambda s: None)
+        # Two lines fit under the limit; a line bigger than the limit on its own is left out
+        assert importer.submit(paths, build_request) == 5
+        chunks = [sorted(os.path.basename(entry["path"]) for entry in job["files"].values()) for job in importer.jobs]
+        assert chunks == [["a.jpg", "b.jpg"], ["c.jpg", "d.jpg"], ["e.jpg"]]
+        assert all(len(data) <= 2500 for data in server.files.values())
+        custom_ids = [custom_id for job in importer.jobs for custom_id in job["files"]]
+        assert len(set(custom_ids)) == 5
+    print("[OK] Batch size cap tests passed.")
+
+
+if __name__ == "__main__":
+    test_submit_resume_and_handle()
+    test_chunks_are_capped_by_size()
@@ -0,0 +1,160 @@
+"""
+Unit tests for the incremental directory snapshot (no network or .env required).
+"""
+import os
+import tempfile
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dir_scanner import IncrementalScanner
+
+
+def _touch(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _age_dirs(root, when=1_000_000_000):
+    """Moves directory mtimes into the past, as if nothing had changed for a while."""
+    for dirpath, dirs, files in os.walk(root):
+        os.utime(dirpath, (when, when))
+
+
+def _jpg(name):
+    return name.endswith(".jpg")
+
+
+def test_incremental_scan_and_archive_pruning():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = os.path.join(tmpdir, "Camera Roll")
+        cache = os.path.join(tmpdir, "scan.json")
+        _touch(os.path.join(root, "a.jpg"))
+        _touch(os.path.join(root, "notes.txt"))
+        _touch(os.path.join(root, "2024", "b.jpg"))
+        _touch(os.path.join(root, "Archive", "2024", "01", "old.jpg"))
+        _age_dirs(root)
+
+        # Only the archive at the top is excluded, not any folder that happens to be named Archive
+        _touch(os.path.join(root, "2024", "Archive", "d.jpg"))
+        archive = [os.path.join(root, "Archive")]
+        _age_dirs(root)
+
+        scanner = IncrementalScanner(root, cache, exclude_dirs=archive, match=_jpg, full_scan_interval=0)
+        diff = scanner.scan()
+        assert sorted(os.path.relpath(p, root) for p in diff.files_created) == [
+            os.path.join("2024", "Archive", "d.jpg"), os.path.join("2024", "b.jpg"), "a.jpg"]
+        os.remove(os.path.join(root, "2024", "Archive", "d.jpg"))
+        os.rmdir(os.path.join(root, "2024", "Archive"))
+        _age_dirs(root)
+        assert [os.path.basename(p) for p in scanner.scan().files_deleted] == ["d.jpg"]
+        scanner.save()
+
+        # Restart with the saved snapshot: nothing changed, nothing is listed
+        scanner = IncrementalScanner(root, cache, exclude_dirs=archive, match=_jpg, full_scan_interval=0)
+        assert len(scanner.scan()) == 0
+        assert scanner.stats["dirs_listed"] == 0 and scanner.stats["dirs_skipped"] == 2
+
+        # A new file deep in the tree: only that directory is listed again
+        _touch(os.path.join(root, "2024", "c.jpg"))
+        _touch(os.path.join(root, "Archive", "2024", "01", "new.jpg"))
+        _age_dirs(root, 1_000_000_100)
+        diff = scanner.scan()
+        assert [os.path.basename(p) for p in diff.files_created] == ["c.jpg"]
+        assert scanner.stats["dirs_listed"] == 2  # root mtime moved too (utime above)
+
+        # A file rewritten in place keeps its directory's mtime: only a full scan sees it
+        _touch(os.path.join(root, "a.jpg"), b"rewritten")
+        _age_dirs(root, 1_000_000_100)
+        assert len(scanner.scan()) == 0
+        diff = scanner.scan(full=True)
+        assert diff.full and diff.files_modified == [os.path.join(root, "a.jpg")]
+        assert sorted(map(os.path.basename, scanner.known_files())) == ["a.jpg", "b.jpg", "c.jpg"]
+
+        # Removed directories leave the snapshot
+        os.remove(os.path.join(root, "2024", "b.jpg"))
+        os.remove(os.path.join(root, "2024", "c.jpg"))
+        os.rmdir(os.path.join(root, "2024"))
+        diff = scanner.scan()
+        assert sorted(map(os.path.basename, diff.files_deleted)) == ["b.jpg", "c.jpg"]
+        assert scanner.get_stats()["dirs_cached"] == 1
+    print("[OK] Incremental scanner test passed.")
+
+
+def test_moves_across_restarts():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = os.path.join(tmpdir, "watch")
+        cache = os.path.join(tmpdir, "scan.json")
+        _touch(os.path.join(root, "IMG_1.jpg"), b"one")
+        _touch(os.path.join(root, "sub", "IMG_2.jpg"), b"two")
+        _age_dirs(root)
+        scanner = IncrementalScanner(root, cache, match=_jpg, full_scan_interval=0)
+        scanner.scan()
+        scanner.save()
+
+        # While the program is down: a rename, a move between folders, a new and a deleted file
+        os.rename(os.path.join(root, "IMG_1.jpg"), os.path.join(root, "receipt.jpg"))
+        os.rename(os.path.join(root, "sub", "IMG_2.jpg"), os.path.join(root, "IMG_2.jpg"))
+        _touch(os.path.join(root, "sub", "IMG_3.jpg"), b"three")
+        _age_dirs(root, 1_000_000_100)
+
+        diff = IncrementalScanner(root, cache, match=_jpg, full_scan_interval=0).scan()
+        moved = sorted((os.path.relpath(src, root), os.path.relpath(dest, root)) for src, dest in diff.files_moved)
+        assert moved == [("IMG_1.jpg", "receipt.jpg"), (os.path.join("sub", "IMG_2.jpg"), "IMG_2.jpg")]
+        assert diff.files_created == [os.path.join(root, "sub", "IMG_3.jpg")] and diff.files_deleted == []
+        assert sorted(map(os.path.basename, diff.paths_to_check())) == ["IMG_2.jpg", "IMG_3.jpg", "receipt.jpg"]
+        assert str(diff) == "1 created, 0 modified, 2 moved, 0 deleted"
+    print("[OK] Scanner move detection test passed.")
+
+
+def test_periodic_full_scan_and_recent_directories():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        now = [0.0]
+        _touch(os.path.join(tmpdir, "a.jpg"))
+        scanner = IncrementalScanner(tmpdir, None, full_scan_interval=60, clock=lambda: now[0])
+        assert len(scanner.scan().files_created) == 1
+        # Directory changed just now: listed again, but known files are not reported twice
+        assert len(scanner.scan()) == 0 and scanner.stats["dirs_listed"] == 2
+        _age_dirs(tmpdir)
+        scanner.scan()
+        assert len(scanner.scan()) == 0 and scanner.stats["dirs_listed"] == 3
+        now[0] = 61
+        assert scanner.scan().full and scanner.stats["full_scans"] == 1
+        assert scanner.stats["dirs_listed"] == 4
+    print("[OK] Scanner full-scan test passed.")
+
+
+def test_unreadable_directory_keeps_its_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = os.path.join(tmpdir, "watch")
+        _touch(os.path.join(root, "a.jpg"))
+        _touch(os.path.join(root, "sub", "b.jpg"))
+        _touch(os.path.join(root, "sub", "deeper", "c.jpg"))
+        _age_dirs(root)
+        scanner = IncrementalScanner(root, None, match=_jpg, full_scan_interval=0)
+        assert len(scanner.scan().files_created) == 3
+
+        # "sub" cannot be listed for a moment (access denied, sync lock)
+        real_list = scanner._list
+        def failing_list(path, mtime):
+            return None if os.path.basename(path) == "sub" else real_list(path, mtime)
+        scanner._list = failing_list
+        _touch(os.path.join(root, "sub", "deeper", "d.jpg"))
+        _age_dirs(root, 1_000_000_100)
+        diff = scanner.scan(full=True)
+        # Nothing below it is reported deleted, and its known subdirectories are still scanned
+        assert diff.files_deleted == []
+        assert [os.path.basename(p) for p in diff.files_created] == ["d.jpg"]
+
+        # Once it is readable again nothing is reported twice
+        scanner._list = real_list
+        assert len(scanner.scan()) == 0
+        assert sorted(map(os.path.basename, scanner.known_files())) == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+    print("[OK] Scanner unreadable-directory test passed.")
+
+
+if __name__ == "__main__":
+    test_incremental_scan_and_archive_pruning()
+    test_moves_across_restarts()
+    test_periodic_full_scan_and_recent_directories()
+    test_unreadable_directory_keeps_its_files()
@@ -0,0 +1,96 @@
+"""
+Unit tests for the watcher event filter/coalescer (no network or .env required).
+"""
+import os
+import time
+import tempfile
+import threading
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from watchdog.events import (FileCreatedEvent, FileModifiedEvent, FileMovedEvent, FileDeletedEvent,
+                             FileOpenedEvent, DirCreatedEvent)
+from watchdog.observers import Observer
+
+from event_coalescer import EventCoalescer
+
+WATCH = os.path.abspath(os.path.join(os.sep, "watch"))
+ARCHIVE = os.path.join(WATCH, "Archive")
+
+
+def _path(*parts):
+    return os.path.join(WATCH, *parts)
+
+
+def test_bursts_are_merged_and_archive_is_dropped():
+    now = [0.0]
+    coalescer = EventCoalescer(lambda path: None, exclude_dirs=[ARCHIVE],
+                               match=lambda name: name.endswith(".jpg"), window=1.0, clock=lambda: now[0])
+    # OneDrive-style burst: temp file written, renamed to the final name, touched again
+    coalescer.dispatch(FileCreatedEvent(_path("~tmp123.jpg")))
+    coalescer.dispatch(FileModifiedEvent(_path("~tmp123.jpg")))
+    coalescer.dispatch(FileMovedEvent(_path("~tmp123.jpg"), _path("IMG_1.jpg")))
+    coalescer.dispatch(FileModifiedEvent(_path("IMG_1.jpg")))
+    # Noise: our own read, folder, non-image, our own archive move and a file deleted before it settled
+    coalescer.dispatch(FileOpenedEvent(_path("IMG_1.jpg")))
+    coalescer.dispatch(DirCreatedEvent(_path("2024")))
+    coalescer.dispatch(FileCreatedEvent(_path("notes.txt")))
+    coalescer.dispatch(FileMovedEvent(_path("old.jpg"), os.path.join(ARCHIVE, "2024", "01", "old.jpg")))
+    coalescer.dispatch(FileCreatedEvent(os.path.join(ARCHIVE, "2024", "01", "x.jpg")))
+    coalescer.dispatch(FileCreatedEvent(_path("gone.jpg")))
+    coalescer.dispatch(FileDeletedEvent(_path("gone.jpg")))
+
+    now[0] = 0.5
+    assert coalescer.pop_due() == []
+    # Another event restarts the window for that path
+    coalescer.dispatch(FileModifiedEvent(_path("IMG_1.jpg")))
+    now[0] = 1.2
+    assert coalescer.pop_due() == []
+    now[0] = 1.6
+    assert coalescer.pop_due() == [_path("IMG_1.jpg")]
+    assert coalescer.pending_count() == 0
+
+    stats = coalescer.get_stats()
+    assert stats["received"] == 12 and stats["dispatched"] == 1
+    assert stats["excluded"] == 2 and stats["merged"] == 3 and stats["cancelled"] == 2
+    print("[OK] Event coalescing test passed.")
+
+
+def test_with_real_observer():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ready = []
+        done = threading.Event()
+
+        def on_ready(path):
+            ready.append(path)
+            done.set()
+
+        archive = os.path.join(tmpdir, "Archive")
+        os.makedirs(archive)
+        coalescer = EventCoalescer(on_ready, exclude_dirs=[archive], match=lambda name: name.endswith(".jpg"), window=0.3)
+        coalescer.start()
+        observer = Observer()
+        observer.schedule(coalescer, tmpdir, recursive=True)
+        observer.start()
+        try:
+            photo = os.path.join(tmpdir, "receipt.jpg")
+            with open(photo, "wb") as f:
+                for _ in range(5):
+                    f.write(b"x" * 1000)
+                    f.flush()
+            assert done.wait(5)
+            os.replace(photo, os.path.join(archive, "receipt.jpg"))
+            time.sleep(0.6)
+        finally:
+            observer.stop()
+            observer.join()
+            coalescer.stop()
+        assert ready == [os.path.abspath(photo)]
+        stats = coalescer.get_stats()
+        assert stats["dispatched"] == 1 and stats["received"] > 1 and stats["excluded"] >= 1
+    print("[OK] Event coalescer observer test passed.")
+
+
+if __name__ == "__main__":
+    test_bursts_are_merged_and_archive_is_dropped()
+    test_with_real_observer()
@@ -0,0 +1,71 @@
+"""
+Unit tests for the per-file pipeline state store (no network or .env required).
+"""
+import os
+import tempfile
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_state import FileStateStore
+
+
+def test_stages_pages_and_persistence():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "states.db")
+        photo = os.path.join(tmpdir, "receipt.jpg")
+        with open(photo, "wb") as f:
+            f.write(b"photo-1")
+
+        store = FileStateStore(db_path)
+        assert store.get(photo) is None
+        store.discover(photo)
+        assert store.get(photo)["stage"] == "discovered"
+        store.advance(photo, "stable")
+        data = {"merchant": "마트", "items": [{"name": "우유"}, {"name": "빵"}]}
+        store.advance(photo, "analyzed", data)
+        store.record_page(photo, 0, "page-a")
+        assert store.unfinished() == [os.path.abspath(photo)]
+        store.close()
+
+        # After a restart the data and the uploaded item are still known
+        store = FileStateStore(db_path)
+        state = store.get(photo)
+        assert state["stage"] == "analyzed" and state["data"] == data
+        assert state["page_ids"] == {0: "page-a"}
+        assert FileStateStore.reached(state, "stable") and not FileStateStore.reached(state, "uploaded")
+        store.discover(photo)  # no-op for a known file
+        assert store.get(photo)["stage"] == "analyzed"
+
+        store.advance(photo, "uploaded")
+        store.advance(photo, "validated")
+        store.advance(photo, "archived")
+        assert store.get(photo)["data"] == data
+        assert store.unfinished() == []
+        assert store.count_by_stage() == {"archived": 1}
+        store.close()
+    print("[OK] FileStateStore stage tests passed.")
+
+
+def test_changed_file_starts_over():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = FileStateStore(os.path.join(tmpdir, "states.db"))
+        photo = os.path.join(tmpdir, "receipt.jpg")
+        with open(photo, "wb") as f:
+            f.write(b"photo-1")
+        store.advance(photo, "analyzed", {"items": []})
+        # Another photo saved under the same name
+        with open(photo, "wb") as f:
+            f.write(b"a different photo")
+        assert store.get(photo) is None
+        try:
+            store.advance(photo, "printed")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+        store.close()
+    print("[OK] FileStateStore reset test passed.")
+
+
+if __name__ == "__main__":
+    test_stages_pages_and_persistence()
+    test_changed_file_starts_over()
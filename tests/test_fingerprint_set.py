@@ -0,0 +1,84 @@
+"""
+Unit tests for the compact fingerprint set behind the processed history.
+"""
+import os
+import random
+import sys
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fingerprint_set import FingerprintSet, path_fingerprint
+
+
+def test_matches_python_set():
+    rng = random.Random(7)
+    fingerprints = FingerprintSet()
+    expected = set()
+    # Small values collide heavily in the table, exercising probe runs and wrap-around
+    for _ in range(20000):
+        value = rng.randrange(1, 5000) if rng.random() < 0.7 else rng.randrange(1, 2**63)
+        if rng.random() < 0.35:
+            assert fingerprints.discard(value) == (value in expected)
+            expected.discard(value)
+        else:
+            assert fingerprints.add(value) == (value not in expected)
+            expected.add(value)
+    assert len(fingerprints) == len(expected)
+    assert all(value in fingerprints for value in expected)
+    assert not any(value in fingerprints for value in range(1, 5000) if value not in expected)
+    # Grew past the minimum size while staying at most half full
+    assert len(fingerprints.table) > FingerprintSet.MIN_SIZE
+    assert len(fingerprints) * 2 <= len(fingerprints.table)
+    print("[OK] FingerprintSet operations test passed.")
+
+
+def test_bytes_round_trip_and_paths():
+    paths = [f"C:\\Users\\me\\OneDrive\\사진\\카메라 앨범\\IMG_{i:05d}.jpg" for i in range(3000)]
+    fingerprints = FingerprintSet.from_iterable((path_fingerprint(p) for p in paths), len(paths))
+    restored = FingerprintSet.from_bytes(fingerprints.to_bytes(), len(fingerprints))
+    assert len(restored) == 3000
+    assert all(path_fingerprint(p) in restored for p in paths)
+    assert path_fingerprint("C:\\other.jpg") not in restored
+    assert 0 < path_fingerprint("") < 2**63
+    try:
+        FingerprintSet.from_bytes(b"\0" * 24, 0)
+        assert False, "truncated table accepted"
+    except ValueError:
+        pass
+    print("[OK] FingerprintSet round-trip test passed.")
+
+
+def test_lookups_during_resize_and_discard():
+    rng = random.Random(3)
+    members = [rng.randrange(1, 2**63) for _ in range(500)]
+    fingerprints = FingerprintSet.from_iterable(members)
+    stop = threading.Event()
+    misses, errors = [], []
+
+    def read():
+        try:
+            while not stop.is_set():
+                misses.extend(value for value in members if value not in fingerprints)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    # Many resizes and backward-shift deletions while the members are being looked up
+    for value in range(1, 200001):
+        fingerprints.add(value)
+        if value % 3 == 0:
+            fingerprints.discard(value - 1)
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert not errors and not misses
+    assert all(value in fingerprints for value in members)
+    print("[OK] FingerprintSet concurrency tests passed.")
+
+
+if __name__ == "__main__":
+    test_matches_python_set()
+    test_bytes_round_trip_and_paths()
+    test_lookups_during_resize_and_discard()
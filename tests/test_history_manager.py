@@ -2,6 +2,7 @@
 Unit tests for HistoryManager (no network or .env required).
 """
 import os
+import sqlite3
 import tempfile
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -39,5 +40,117 @@ def test_history_manager():
     print("[OK] HistoryManager tests passed.")
 
 
+
+def test_flat_file_migration():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history_file = os.path.join(tmpdir, ".processed_history")
+        with open(history_file, "w", encoding="utf-8") as f:
+            f.write("/old/a.jpg\n/old/b.jpg\n\n/old/a.jpg\n")
+        hm = HistoryManager(history_file=history_file)
+        assert hm.get_count() == 2
+        assert hm.is_processed("/old/b.jpg")
+        assert hm.get_record("/old/a.jpg")["status"] == "processed"
+        hm.close()
+
+        # Imported once: lines added to the old file later are ignored
+        with open(history_file, "a", encoding="utf-8") as f:
+            f.write("/old/c.jpg\n")
+        hm = HistoryManager(history_file=history_file)
+        assert hm.get_count() == 2
+        hm.close()
+    print("[OK] HistoryManager migration test passed.")
+
+
+def test_metadata_same_content_and_batched_commits():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history_file = os.path.join(tmpdir, ".processed_history")
+        now = [1000.0]
+        hm = HistoryManager(history_file=history_file, commit_batch=3, commit_interval=60, clock=lambda: now[0])
+        photo = os.path.join(tmpdir, "receipt.jpg")
+        with open(photo, "wb") as f:
+            f.write(b"receipt bytes")
+        hm.add_to_history(photo, status="processed")
+        record = hm.get_record(photo)
+        assert record["size"] == 13 and record["hash"] and record["processed_at"] == 1000.0
+
+        copy = os.path.join(tmpdir, "copy of receipt.jpg")
+        with open(copy, "wb") as f:
+            f.write(b"receipt bytes")
+        assert hm.find_same_content(copy) == os.path.abspath(photo)
+        assert hm.find_same_content(photo) is None
+
+        # Not committed yet (1 of 3 pending): another connection does not see it
+        assert HistoryManager(history_file=history_file).get_count() == 0
+        hm.add_to_history("/gone/1.jpg", status="not_receipt")
+        hm.add_to_history("/gone/2.jpg", status="too_old")
+        assert HistoryManager(history_file=history_file).get_count() == 3
+
+        hm.add_to_history("/gone/3.jpg")
+        hm.flush()
+        assert HistoryManager(history_file=history_file).get_count() == 4
+
+        # Compaction drops old records of files that no longer exist
+        now[0] += 40 * 86400
+        assert hm.compact(max_age_days=30) == 3
+        assert hm.get_count() == 1 and hm.is_processed(photo)
+        hm.remove_from_history(photo)
+        assert not hm.is_processed(photo)
+
+        # Skipped by age: the file is not read (it may be a cloud-only placeholder)
+        old = os.path.join(tmpdir, "old.jpg")
+        with open(old, "wb") as f:
+            f.write(b"old receipt")
+        hm.add_to_history(old, status="too_old", hash_file=False)
+        record = hm.get_record(old)
+        assert record["hash"] is None and record["size"] == 11 and record["status"] == "too_old"
+        hm.close()
+    print("[OK] HistoryManager metadata tests passed.")
+
+
+def test_fingerprint_snapshot():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history_file = os.path.join(tmpdir, ".processed_history")
+        hm = HistoryManager(history_file=history_file)
+        for i in range(50):
+            hm.add_to_history(f"/photos/{i}.jpg")
+        hm.close()
+
+        # Clean shutdown: the next start loads the saved snapshot
+        hm = HistoryManager(history_file=history_file)
+        assert hm.snapshot_valid and hm.get_count() == 50
+        hm.add_to_history("/photos/new.jpg")
+        hm.remove_from_history("/photos/0.jpg")
+        assert not hm.snapshot_valid
+        hm.conn.close()  # crash: no snapshot saved
+
+        # The stale snapshot is ignored and the set is rebuilt from the rows
+        hm = HistoryManager(history_file=history_file)
+        assert not hm.snapshot_valid and hm.get_count() == 50
+        assert hm.is_processed("/photos/new.jpg") and not hm.is_processed("/photos/0.jpg")
+        hm.close()
+    print("[OK] HistoryManager snapshot test passed.")
+
+
+def test_database_without_fingerprint_column():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history_file = os.path.join(tmpdir, ".processed_history")
+        conn = sqlite3.connect(history_file + ".db")
+        conn.execute("CREATE TABLE history (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, hash TEXT, "
+                     "status TEXT NOT NULL, first_seen REAL NOT NULL, processed_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT INTO meta VALUES ('migrated_flat_file', '0')")
+        conn.execute("INSERT INTO history (path, status, first_seen, processed_at) VALUES ('/old/a.jpg', 'processed', 1, 1)")
+        conn.commit()
+        conn.close()
+        hm = HistoryManager(history_file=history_file)
+        assert hm.get_count() == 1 and hm.is_processed("/old/a.jpg")
+        hm.close()
+    print("[OK] HistoryManager fingerprint column upgrade test passed.")
+
+
 if __name__ == "__main__":
     test_history_manager()
+    test_flat_file_migration()
+    test_metadata_same_content_and_batched_commits()
+    test_fingerprint_snapshot()
+    test_database_without_fingerprint_column()
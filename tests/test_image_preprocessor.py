@@ -0,0 +1,103 @@
+"""
+Unit tests for ImagePreprocessor (no network or .env required, needs Pillow).
+"""
+import os
+import io
+import base64
+import tempfile
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_preprocessor import ImagePreprocessor
+from near_duplicates import hamming_distance
+from tests.receipt_images import make_text_receipt
+
+
+def _make_receipt_photo(path, size=(4000, 3000), orientation=None):
+    """Noisy 'receipt' in the middle of a uniform dark background."""
+    img = Image.new("RGB", size, (20, 20, 20))
+    receipt = Image.effect_noise((size[0] // 2, size[1] - 200), 60).convert("RGB")
+    img.paste(receipt, (size[0] // 4, 100))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    img.save(path, format="PNG" if path.endswith(".png") else "JPEG", quality=98, exif=exif.tobytes())
+
+
+def test_image_preprocessor():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "receipt.jpg")
+        _make_receipt_photo(path, orientation=6)  # rotated 90° by the camera
+        pre = ImagePreprocessor(max_long_edge=1000, crop_borders=False)
+
+        prepared = pre.prepare(path)
+        assert prepared.mime_type == "image/jpeg"
+        assert max(prepared.width, prepared.height) <= 1000
+        # EXIF orientation applied: landscape sensor image becomes portrait
+        assert prepared.height > prepared.width
+        assert len(prepared.data) < os.path.getsize(path)
+        assert prepared.to_data_url().startswith("data:image/jpeg;base64,")
+        decoded = Image.open(io.BytesIO(base64.b64decode(prepared.to_data_url().split(",", 1)[1])))
+        assert decoded.size == (prepared.width, prepared.height)
+
+        # Same unchanged file → cached object is reused (retry path)
+        assert pre.prepare(path) is prepared
+
+        # PNG input, WEBP output, correct MIME type
+        png_path = os.path.join(tmpdir, "receipt.png")
+        _make_receipt_photo(png_path, size=(1200, 1800))
+        webp = ImagePreprocessor(max_long_edge=800, output_format="WEBP").prepare(png_path)
+        assert webp.mime_type == "image/webp"
+        assert max(webp.width, webp.height) <= 800
+
+        # Unreadable image data falls back to the original bytes with an extension-based MIME type
+        broken = os.path.join(tmpdir, "broken.png")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        raw = pre.prepare(broken)
+        assert raw.data == b"not an image"
+        assert raw.mime_type == "image/png"
+    print("[OK] ImagePreprocessor tests passed.")
+
+
+def test_trim_borders():
+    img = Image.new("RGB", (1000, 1000), (0, 0, 0))
+    img.paste(Image.new("RGB", (600, 800), (255, 255, 255)), (200, 100))
+    trimmed = ImagePreprocessor._trim_borders(img)
+    assert trimmed.size == (600, 800)
+
+    # Mostly-background images are left alone
+    tiny = Image.new("RGB", (1000, 1000), (0, 0, 0))
+    tiny.paste(Image.new("RGB", (50, 50), (255, 255, 255)), (10, 10))
+    assert ImagePreprocessor._trim_borders(tiny).size == (1000, 1000)
+    print("[OK] border trimming tests passed.")
+
+
+def test_perceptual_hash_groups_shots_of_the_same_receipt():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        first = os.path.join(tmpdir, "first.jpg")
+        make_text_receipt(first, seed=1)
+        # Second shot: same receipt, shifted on the background, smaller and more compressed
+        second = os.path.join(tmpdir, "second.jpg")
+        with Image.open(first) as img:
+            img.rotate(0, translate=(40, -25), fillcolor=(30, 30, 30)).resize((1200, 1600)).save(second, quality=70)
+        other = os.path.join(tmpdir, "other.jpg")
+        make_text_receipt(other, seed=2)
+
+        pre = ImagePreprocessor()
+        h1, h2, h3 = (pre.perceptual_hash(p) for p in (first, second, other))
+        assert h1 is not None and h1.bit_length() <= 64
+        assert hamming_distance(h1, h2) <= 10
+        assert hamming_distance(h1, h3) > 10
+        assert pre.perceptual_hash(os.path.join(tmpdir, "missing.jpg")) is None
+    print("[OK] perceptual hash tests passed.")
+
+
+if __name__ == "__main__":
+    test_image_preprocessor()
+    test_trim_borders()
+    test_perceptual_hash_groups_shots_of_the_same_receipt()
@@ -0,0 +1,276 @@
+"""
+Unit tests for LedgerMirror against a local fake Notion server.
+"""
+import os
+import sys
+import tempfile
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notion_api import NotionClient
+from notion_validator import NotionValidator
+from ledger_mirror import LedgerMirror
+from tests.fake_notion import FakeNotionServer, make_page
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _query_bodies(server):
+    return [body for method, path, body in server.requests if path.endswith("/query")]
+
+
+def test_full_then_incremental_sync():
+    with FakeNotionServer() as server, tempfile.TemporaryDirectory() as tmp:
+        for i in range(150):
+            server.add_page({"항목": f"item{i}", "날짜": "2025-01-15", "합계": 1000, "사용처": "이마트",
+                             "원본파일": "a.jpg" if i < 3 else "b.jpg"}, created_time="2025-01-15T10:00:00.000Z")
+        client = NotionClient("secret", base_url=server.base_url)
+        clock = FakeClock()
+        mirror = LedgerMirror(client, server.database_id, db_path=os.path.join(tmp, "m.db"),
+                              refresh_interval=60, clock=clock)
+
+        assert mirror.refresh()
+        assert mirror.count() == 150
+        assert "filter" not in _query_bodies(server)[0]
+        assert len(mirror.find_by_source("a.jpg")) == 3
+        assert len(mirror.find_by_date_merchant("2025-01-15", " 이마트 ")) == 150
+
+        # Within refresh_interval nothing is sent
+        requests_before = len(server.requests)
+        mirror.refresh()
+        assert len(server.requests) == requests_before
+
+        server.add_page({"항목": "new", "날짜": "2025-01-16", "합계": 500, "사용처": "편의점"})
+        clock.now += 61
+        assert mirror.refresh()
+        last_query = _query_bodies(server)[-1]
+        assert last_query["filter"]["timestamp"] == "last_edited_time"
+        assert mirror.count() == 151
+        assert mirror.find_by_date_merchant("2025-01-16", "편의점")
+        mirror.close()
+        client.close()
+    print("[OK] LedgerMirror sync tests passed.")
+
+
+def test_own_writes_and_full_resync():
+    with FakeNotionServer() as server, tempfile.TemporaryDirectory() as tmp:
+        client = NotionClient("secret", base_url=server.base_url)
+        clock = FakeClock()
+        db_path = os.path.join(tmp, "m.db")
+        server.add_page({"항목": "계란", "날짜": "2025-01-31", "합계": 6000, "사용처": "마트"})
+        mirror = LedgerMirror(client, server.database_id, db_path=db_path, full_sync_hours=1, clock=clock)
+        mirror.sync()
+
+        page = make_page({"항목": "우유", "날짜": "2025-02-01", "합계": 2500, "사용처": "마트", "원본파일": "c.jpg"})
+        mirror.upsert(page)
+        assert mirror.find_by_source("c.jpg") == [page["id"]]
+        mirror.remove(page["id"])
+        assert mirror.find_by_source("c.jpg") == []
+
+        # A page only known locally disappears at the next full download
+        mirror.upsert(page)
+        clock.now += 3601
+        assert mirror.sync()
+        assert mirror.count() == 1
+        mirror.close()
+
+        # Watermark survives a restart: the next sync is incremental
+        mirror = LedgerMirror(client, server.database_id, db_path=db_path, full_sync_hours=1, clock=clock)
+        server.add_page({"항목": "빵", "날짜": "2025-02-02", "합계": 3000, "사용처": "빵집"})
+        mirror.sync()
+        assert "filter" in _query_bodies(server)[-1]
+        assert mirror.count() == 2
+        mirror.close()
+        client.close()
+    print("[OK] LedgerMirror write-through tests passed.")
+
+
+def test_writes_not_blocked_by_sync_download():
+    with FakeNotionServer() as server, tempfile.TemporaryDirectory() as tmp:
+        kept = server.add_page({"항목": "계란", "날짜": "2025-01-31", "합계": 6000, "사용처": "마트"})
+        deleted = server.add_page({"항목": "두부", "날짜": "2025-01-31", "합계": 1500, "사용처": "마트"})
+        client = NotionClient("secret", base_url=server.base_url)
+        mirror = LedgerMirror(client, server.database_id, db_path=os.path.join(tmp, "m.db"))
+
+        # Hold the query response until the writes below are done
+        started, release = threading.Event(), threading.Event()
+        original = server.dispatch
+        def slow_query(method, path, body, params=None):
+            if path.endswith("/query"):
+                started.set()
+                release.wait(10)
+            return original(method, path, body, params)
+        server.dispatch = slow_query
+        results = []
+        sync = threading.Thread(target=lambda: results.append(mirror.sync()))
+        sync.start()
+        assert started.wait(10)
+
+        # Our own writes and lookups go through while the download is in flight
+        page = make_page({"항목": "우유", "날짜": "2025-02-01", "합계": 2500, "사용처": "마트", "원본파일": "c.jpg"})
+        mirror.upsert(page)
+        mirror.remove(deleted["id"])
+        assert mirror.find_by_source("c.jpg") == [page["id"]]
+        assert sync.is_alive()
+        release.set()
+        sync.join(10)
+        assert results == [True]
+
+        # The download neither drops the page written meanwhile nor brings back the removed one
+        ids = {entry["id"] for entry in mirror.entries()}
+        assert ids == {kept["id"], page["id"]}
+        mirror.close()
+        client.close()
+    print("[OK] LedgerMirror sync concurrency tests passed.")
+
+
+def test_validator_reads_mirror():
+    with FakeNotionServer() as server, tempfile.TemporaryDirectory() as tmp:
+        for hour in (9, 12, 15):
+            server.add_page({"항목": "사과", "날짜": "2025-01-15", "합계": 1000, "사용처": "이마트", "원본파일": "a.jpg"},
+                            created_time=f"2025-01-15T{hour:02d}:00:00.000Z")
+        client = NotionClient("secret", base_url=server.base_url)
+        mirror = LedgerMirror(client, server.database_id, db_path=os.path.join(tmp, "m.db"))
+        validator = NotionValidator("secret", server.database_id, client=client, mirror=mirror)
+
+        assert len(validator.find_entries_by_source("a.jpg")) == 3
+        queries = len(_query_bodies(server))
+        assert validator.remove_duplicates() == 2
+        assert len(_query_bodies(server)) == queries  # served from the mirror
+        assert len(validator.find_entries_by_source("a.jpg")) == 1
+        assert len(server.live_pages()) == 1
+        mirror.close()
+        client.close()
+    print("[OK] NotionValidator mirror lookup tests passed.")
+
+
+def test_remove_duplicates_for_new_items_only():
+    with FakeNotionServer() as server, tempfile.TemporaryDirectory() as tmp:
+        for i in range(200):
+            server.add_page({"항목": f"item{i}", "날짜": "2025-01-15", "합계": 1000, "사용처": "이마트"})
+        # An unrelated duplicate pair: left for the periodic full reconciliation
+        for hour in (9, 12):
+            server.add_page({"항목": "빵", "날짜": "2025-01-10", "합계": 3000, "사용처": "빵집"},
+                            created_time=f"2025-01-10T{hour:02d}:00:00.000Z")
+        old = server.add_page({"항목": "우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점"},
+                              created_time="2025-03-01T09:00:00.000Z")
+        client = NotionClient("secret", base_url=server.base_url)
+        mirror = LedgerMirror(client, server.database_id, db_path=os.path.join(tmp, "m.db"))
+        validator = NotionValidator("secret", server.database_id, client=client, mirror=mirror)
+        mirror.sync()
+
+        new = make_page({"항목": " 우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점"})
+        server.pages.append(new)
+        validator.record_page(new)
+        queries = len(_query_bodies(server))
+        assert validator.remove_duplicates_for([("우유", "2025-03-01", "편의점", 2500)]) == 1
+        assert len(_query_bodies(server)) == queries
+        live_ids = {p["id"] for p in server.live_pages()}
+        assert new["id"] in live_ids and old["id"] not in live_ids
+        assert mirror.count() == 203
+
+        assert validator.remove_duplicates() == 1
+        assert mirror.count() == 202
+        mirror.close()
+        client.close()
+    print("[OK] per-receipt duplicate check tests passed.")
+
+
+def test_repeated_receipt_lines_are_not_duplicates():
+    with FakeNotionServer() as server, tempfile.TemporaryDirectory() as tmp:
+        client = NotionClient("secret", base_url=server.base_url)
+        mirror = LedgerMirror(client, server.database_id, db_path=os.path.join(tmp, "m.db"))
+        validator = NotionValidator("secret", server.database_id, client=client, mirror=mirror)
+        mirror.sync()
+        receipt = [("우유", "2025-03-01", "편의점", 2500), ("우유", "2025-03-01", "편의점", 2500)]
+
+        # Two "우유 2500" lines on one receipt: both pages stay
+        for _ in receipt:
+            page = make_page({"항목": "우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점"},
+                             created_time="2025-03-01T09:00:00.000Z")
+            server.pages.append(page)
+            validator.record_page(page)
+        assert validator.remove_duplicates_for(receipt) == 0
+        assert validator.remove_duplicates() == 0
+        assert len(server.live_pages()) == 2
+
+        # The receipt uploaded again an hour later: only the older copies go
+        for _ in receipt:
+            page = make_page({"항목": "우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점"},
+                             created_time="2025-03-01T10:00:00.000Z")
+            server.pages.append(page)
+            validator.record_page(page)
+        assert validator.remove_duplicates() == 2
+        assert [p["created_time"] for p in server.live_pages()] == ["2025-03-01T10:00:00.000Z"] * 2
+
+        # Right after an upload only pages beyond the receipt's count are removed
+        extra = make_page({"항목": "우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점"},
+                          created_time="2025-03-01T11:00:00.000Z")
+        server.pages.append(extra)
+        validator.record_page(extra)
+        assert validator.remove_duplicates_for(receipt) == 1
+        assert len(server.live_pages()) == 2
+        mirror.close()
+        client.close()
+    print("[OK] repeated receipt line tests passed.")
+
+
+def test_known_items_skipped_before_upload():
+    with FakeNotionServer() as server, tempfile.TemporaryDirectory() as tmp:
+        client = NotionClient("secret", base_url=server.base_url)
+        mirror = LedgerMirror(client, server.database_id, db_path=os.path.join(tmp, "m.db"))
+        validator = NotionValidator("secret", server.database_id, client=client, mirror=mirror)
+        first = [("우유", "2025-03-01", "편의점", 2500), ("우유", "2025-03-01", "편의점", 2500), ("빵", "2025-03-01", "편의점", 3000)]
+        assert validator.find_known_items(first) == set()
+
+        created = []
+        for name, date, merchant, total in first[:2]:
+            page = make_page({"항목": name, "날짜": date, "합계": total, "사용처": merchant})
+            server.pages.append(page)
+            validator.record_page(page)
+            created.append(page["id"])
+        # Item level: one 우유 exists per occurrence, 빵 is new
+        assert validator.find_known_items(first) == {0, 1}
+        assert validator.find_known_items(first + [("우유", "2025-03-01", "편의점", 2500)]) == {0, 1}
+
+        # A partly uploaded receipt is not treated as complete: the missing 빵 is still posted
+        validator.record_receipt(first, created)
+        assert validator.find_known_items(first) == {0, 1}
+
+        # Receipt level: once every item has its page, a second photo with differently read names matches
+        bread = make_page({"항목": "빵", "날짜": "2025-03-01", "합계": 3000, "사용처": "편의점"})
+        server.pages.append(bread)
+        validator.record_page(bread)
+        validator.record_receipt(first, [bread["id"]])
+        created.append(bread["id"])
+        second = [("우유 1L", "2025-03-01", "편의점", 2500), ("우 유", "2025-03-01", "편의점", 2500), ("식빵", "2025-03-01", "편의점", 3000)]
+        requests_before = len(server.requests)
+        assert validator.find_known_items(second) == {0, 1, 2}
+        assert len(server.requests) == requests_before
+
+        # A page deleted in Notion: the fingerprint no longer covers the receipt, items are checked one by one
+        assert validator.delete_entry(bread["id"])
+        assert validator.find_known_items(second) == set()
+        assert validator.find_known_items(first) == {0, 1}
+        for page_id in created[:2]:
+            assert validator.delete_entry(page_id)
+        assert validator.find_known_items(first) == set()
+        mirror.close()
+        client.close()
+    print("[OK] pre-upload duplicate suppression tests passed.")
+
+
+if __name__ == "__main__":
+    test_full_then_incremental_sync()
+    test_own_writes_and_full_resync()
+    test_writes_not_blocked_by_sync_download()
+    test_validator_reads_mirror()
+    test_remove_duplicates_for_new_items_only()
+    test_repeated_receipt_lines_are_not_duplicates()
+    test_known_items_skipped_before_upload()
@@ -0,0 +1,369 @@
+"""
+Tests for the receipt pipeline in main.py, with the OpenAI and Notion calls stubbed.
+"""
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+
+from archiver import FileArchiver
+from batch_import import BatchImporter
+from file_state import FileStateStore
+from history_manager import HistoryManager
+from near_duplicates import NearDuplicate, NearDuplicateIndex, hamming_distance
+from notion_api import NotionClient
+from notion_validator import NotionValidator
+from tests.fake_notion import FakeNotionServer
+from tests.fake_openai import FakeBatchServer
+
+RECEIPT = {"merchant": "이마트", "date": "2025-01-15", "items": [
+    {"name": "우유", "quantity": 1, "unit_price": 2500, "total_price": 2500, "category": "식재료"},
+    {"name": "사과", "quantity": 1.5, "unit_price": 4000, "total_price": 6000, "category": "과일"}]}
+
+
+def _import_main():
+    """Imports main with test settings; the state files it creates on import go to a temp folder."""
+    if "main" in sys.modules:
+        return sys.modules["main"]
+    os.environ.setdefault("OPEN_AI_API_KEY", "sk-test")
+    os.environ.setdefault("NOTION_TOKEN", "secret")
+    os.environ.setdefault("NOTION_DATABASE_ID", "test-db")
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+def test_analysis_request_schema():
+    main = _import_main()
+    request = main.build_analysis_request("data:image/jpeg;base64,AAAA", model="gpt-4o-mini")
+    assert request["model"] == "gpt-4o-mini"
+    content = request["messages"][1]["content"]
+    assert content[1] == {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AAAA"}}
+    assert "re-analysis" not in content[0]["text"]
+    assert "re-analysis" in main.build_analysis_request("x", is_retry=True)["messages"][1]["content"][0]["text"]
+
+    response_format = request["response_format"]
+    assert response_format["type"] == "json_schema"
+    schema = response_format["json_schema"]["schema"]
+    assert response_format["json_schema"]["strict"] is True
+    # Strict mode: every property is required and nothing else is allowed
+    assert set(schema["required"]) == set(schema["properties"])
+    item = schema["properties"]["items"]["items"]
+    assert set(item["required"]) == set(item["properties"])
+    assert item["additionalProperties"] is False
+
+    # Weighed goods (1.5 kg) must be expressible, and a missing date must not be invented
+    assert item["properties"]["quantity"]["type"] == "number"
+    assert "null" in schema["properties"]["date"]["type"]
+    assert item["properties"]["category"]["enum"] == main.NotionValidator.VALID_CATEGORIES
+    print("[OK] analysis request schema tests passed.")
+
+
+class _Pipeline:
+    """Points main's stores at a temp folder and its Notion client at a fake server; the analyzer is stubbed."""
+
+    STUBBED = ("file_states", "history_manager", "file_archiver", "notion_client", "notion_validator",
+               "near_duplicate_index", "receipt_classifier", "analyze_receipt", "stability_monitor")
+
+    def __init__(self, main, tmpdir, server):
+        self.main = main
+        self.saved = {name: getattr(main, name) for name in self.STUBBED}
+        self.watch_dir = os.path.join(tmpdir, "watch")
+        os.makedirs(self.watch_dir)
+        self.analyzed = []
+        self.answers = {}
+        self.hashes = []
+        main.file_states = FileStateStore(os.path.join(tmpdir, "states.db"))
+        main.history_manager = HistoryManager(os.path.join(tmpdir, "history"))
+        main.file_archiver = FileArchiver(self.watch_dir)
+        main.notion_client = NotionClient("secret", base_url=server.base_url)
+        main.notion_validator = NotionValidator("secret", server.database_id, client=main.notion_client)
+        main.near_duplicate_index = None
+        main.receipt_classifier = None
+        main.stability_monitor = None
+        main.analyze_receipt = self.analyze
+
+    def analyze(self, filepath, is_retry=False, content_hash=None):
+        self.analyzed.append(filepath)
+        self.hashes.append(content_hash)
+        return self.answers.get(os.path.basename(filepath), RECEIPT)
+
+    def photo(self, name):
+        path = os.path.join(self.watch_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"receipt " + name.encode())
+        return path
+
+    def close(self):
+        self.main.file_states.close()
+        self.main.history_manager.close()
+        self.main.notion_client.close()
+        for name, value in self.saved.items():
+            setattr(self.main, name, value)
+
+
+def _page_names(server):
+    return sorted(p["properties"]["항목"]["title"][0]["text"]["content"] for p in server.live_pages())
+
+
+def test_process_file_resumes_saved_stages():
+    main = _import_main()
+    with tempfile.TemporaryDirectory() as tmpdir, FakeNotionServer() as server:
+        pipeline = _Pipeline(main, tmpdir, server)
+        try:
+            # Fresh file: analysed, every item uploaded, archived, state row dropped
+            fresh = pipeline.photo("fresh.jpg")
+            main.process_file(fresh)
+            assert pipeline.analyzed == [fresh]
+            assert _page_names(server) == ["사과", "우유"]
+            assert not os.path.exists(fresh)
+            assert main.history_manager.is_processed(fresh)
+            assert main.file_states.count_by_stage() == {}
+
+            # Stopped mid-upload: item 0 already has its page, only item 1 is posted, no new analysis
+            partial = pipeline.photo("partial.jpg")
+            main.file_states.advance(partial, "analyzed", RECEIPT)
+            existing = main.post_page(main.build_page_payload(RECEIPT["items"][0], "이마트", "2025-01-16"))[0]
+            main.file_states.record_page(partial, 0, existing)
+            posts = server.count_requests("POST", "/v1/pages")
+            main.process_file(partial)
+            assert pipeline.analyzed == [fresh]
+            assert server.count_requests("POST", "/v1/pages") == posts + 1
+            assert not os.path.exists(partial)
+            assert main.file_states.get(partial) is None
+
+            # Stopped after the upload: nothing is posted again, the file is still archived
+            uploaded = pipeline.photo("uploaded.jpg")
+            main.file_states.advance(uploaded, "analyzed", RECEIPT)
+            main.file_states.advance(uploaded, "uploaded")
+            posts = server.count_requests("POST", "/v1/pages")
+            main.process_file(uploaded)
+            assert server.count_requests("POST", "/v1/pages") == posts
+            assert pipeline.analyzed == [fresh]
+            assert not os.path.exists(uploaded)
+            assert main.history_manager.is_processed(uploaded)
+            assert main.file_states.count_by_stage() == {}
+        finally:
+            pipeline.close()
+    print("[OK] process_file resume tests passed.")
+
+
+def test_skipped_files_leave_no_state():
+    main = _import_main()
+    with tempfile.TemporaryDirectory() as tmpdir, FakeNotionServer() as server:
+        pipeline = _Pipeline(main, tmpdir, server)
+        try:
+            # Not a receipt: recorded in the history, left in place, no state row
+            class NotReceipt:
+                def is_receipt(self, filepath):
+                    return False, 0.1
+            main.receipt_classifier = NotReceipt()
+            photo = pipeline.photo("cat.jpg")
+            main.process_file(photo)
+            assert os.path.exists(photo)
+            assert main.history_manager.get_record(photo)["status"] == "not_receipt"
+            assert main.file_states.count_by_stage() == {}
+            assert pipeline.analyzed == []
+
+            # A resumed file is finished even if it looks like another shot of a known receipt
+            class SeenBefore:
+                def find(self, photo_hash, taken):
+                    return NearDuplicate("/elsewhere/original.jpg", 0, None)
+                def is_certain(self, match):
+                    return True
+                def add(self, *args):
+                    pass
+            main.receipt_classifier = None
+            main.near_duplicate_index = SeenBefore()
+            original_hash = main.image_preprocessor.perceptual_hash
+            main.image_preprocessor.perceptual_hash = lambda path: 1
+            try:
+                resumed = pipeline.photo("resumed.jpg")
+                main.file_states.advance(resumed, "analyzed", RECEIPT)
+                main.process_file(resumed)
+                assert _page_names(server) == ["사과", "우유"]
+                assert main.history_manager.get_record(resumed)["status"] == "processed"
+
+                # A new one is skipped as a duplicate and leaves no state either
+                again = pipeline.photo("again.jpg")
+                main.process_file(again)
+                assert main.history_manager.get_record(again)["status"] == "duplicate"
+                assert not os.path.exists(again)
+            finally:
+                main.image_preprocessor.perceptual_hash = original_hash
+            assert main.file_states.count_by_stage() == {}
+        finally:
+            pipeline.close()
+    print("[OK] skipped file state tests passed.")
+
+
+def test_failed_batch_upload_is_submitted_again():
+    main = _import_main()
+    with tempfile.TemporaryDirectory() as tmpdir, FakeNotionServer() as server, \
+            FakeBatchServer(lambda custom_id, body: RECEIPT) as batch_server:
+        pipeline = _Pipeline(main, tmpdir, server)
+        try:
+            photo = pipeline.photo("old.jpg")
+            importer = BatchImporter(OpenAI(api_key="sk-test", base_url=batch_server.base_url, max_retries=0),
+                                     os.path.join(tmpdir, "manifest.json"), sleep=lambda s: None)
+            build_request = lambda path: main.build_analysis_request("data:image/jpeg;base64,AAAA")
+            assert importer.submit([photo], build_request) == 1
+            assert importer.wait()
+
+            # Notion rejects both items: the file stays in place and its entry is failed, not done
+            server.fail_queue.extend([(400, {}), (400, {})])
+            assert importer.handle_results(main.handle_batch_result) == 1
+            assert server.live_pages() == []
+            assert os.path.exists(photo)
+            assert not main.history_manager.is_processed(photo)
+            states = [entry["state"] for job in importer.jobs for entry in job["files"].values()]
+            assert states == ["failed"]
+
+            # The next run submits it again and finishes it from the saved analysis
+            assert importer.submit([photo], build_request) == 1
+            assert importer.wait()
+            assert importer.handle_results(main.handle_batch_result) == 1
+            assert _page_names(server) == ["사과", "우유"]
+            assert not os.path.exists(photo)
+            assert main.history_manager.is_processed(photo)
+            assert importer.pending_count() == 0
+        finally:
+            pipeline.close()
+    print("[OK] failed batch upload tests passed.")
+
+
+def test_backlog_skips_only_the_archive():
+    main = _import_main()
+    with tempfile.TemporaryDirectory() as tmpdir, FakeNotionServer() as server:
+        pipeline = _Pipeline(main, tmpdir, server)
+        try:
+            wanted = [pipeline.photo("a.jpg")]
+            for folder in (os.path.join("ReceiptArchive", "2023"), "Archives", "Archive"):
+                os.makedirs(os.path.join(pipeline.watch_dir, folder))
+                wanted.append(pipeline.photo(os.path.join(folder, "b.jpg")))
+            archived = wanted.pop()
+            assert main.file_archiver.is_in_archive(archived)
+            assert sorted(main.collect_backlog_files(pipeline.watch_dir)) == sorted(wanted)
+            # A backlog folder with "Archive" in its own name is imported too
+            folder = os.path.join(pipeline.watch_dir, "ReceiptArchive")
+            assert list(main.collect_backlog_files(folder)) == [wanted[1]]
+        finally:
+            pipeline.close()
+    print("[OK] backlog file collection tests passed.")
+
+
+def test_old_files_are_not_opened_for_the_stability_check():
+    main = _import_main()
+    with tempfile.TemporaryDirectory() as tmpdir, FakeNotionServer() as server:
+        pipeline = _Pipeline(main, tmpdir, server)
+        try:
+            watched = []
+            class Monitor:
+                def watch(self, filepath):
+                    watched.append(filepath)
+            main.stability_monitor = Monitor()
+            old = pipeline.photo("old.jpg")
+            month_ago = os.path.getmtime(old) - 30 * 86400
+            os.utime(old, (month_ago, month_ago))
+            new = pipeline.photo("new.jpg")
+
+            main.enqueue_file(old)
+            main.enqueue_file(new)
+            assert watched == [new]
+            record = main.history_manager.get_record(old)
+            assert record["status"] == "too_old" and record["hash"] is None
+            # Already in the history: not watched again
+            main.enqueue_file(old)
+            assert watched == [new]
+        finally:
+            pipeline.close()
+    print("[OK] enqueue age check tests passed.")
+
+
+def test_similar_photos_of_different_receipts_are_uploaded():
+    import pytest
+    pytest.importorskip("PIL.Image")
+    from PIL import Image
+    from tests.receipt_images import make_receipt_on_table
+
+    main = _import_main()
+    with tempfile.TemporaryDirectory() as tmpdir, FakeNotionServer() as server:
+        pipeline = _Pipeline(main, tmpdir, server)
+        main.near_duplicate_index = NearDuplicateIndex(os.path.join(tmpdir, "near"), max_distance=6, skip_distance=2)
+        try:
+            # Two receipts photographed one after another on the same table hash almost alike
+            first, second = (os.path.join(pipeline.watch_dir, name) for name in ("first.jpg", "second.jpg"))
+            make_receipt_on_table(first, seed=2)
+            make_receipt_on_table(second, seed=7)
+            hash_of = main.image_preprocessor.perceptual_hash
+            assert 2 < hamming_distance(hash_of(first), hash_of(second)) <= 6
+            # A second shot of the first receipt, a little shifted
+            again = os.path.join(pipeline.watch_dir, "again.jpg")
+            with Image.open(first) as img:
+                img.rotate(0, translate=(20, -15), fillcolor=(120, 80, 50)).resize((1200, 1600)).save(again, quality=70)
+            assert 2 < hamming_distance(hash_of(first), hash_of(again)) <= 6
+            pipeline.answers["second.jpg"] = dict(RECEIPT, merchant="홈플러스")
+
+            main.process_file(first)
+            main.process_file(second)
+            # The analyses differ, so the second receipt is uploaded too
+            assert main.history_manager.get_record(second)["status"] == "processed"
+            assert len(server.live_pages()) == 4
+            # The analysis of the re-shot matches the first receipt: skipped without an upload
+            main.process_file(again)
+            assert pipeline.analyzed == [first, second, again]
+            assert main.history_manager.get_record(again)["status"] == "duplicate"
+            assert len(server.live_pages()) == 4
+            assert not os.path.exists(again)
+            assert main.file_states.count_by_stage() == {}
+        finally:
+            pipeline.close()
+    print("[OK] near-duplicate confirmation tests passed.")
+
+
+def test_each_photo_is_hashed_once():
+    import history_manager
+    from analysis_cache import file_sha256
+
+    main = _import_main()
+    with tempfile.TemporaryDirectory() as tmpdir, FakeNotionServer() as server:
+        pipeline = _Pipeline(main, tmpdir, server)
+        hashed = []
+
+        def counting_sha256(path, *args):
+            hashed.append(path)
+            return file_sha256(path, *args)
+        main.file_sha256, history_manager.file_sha256 = counting_sha256, counting_sha256
+        try:
+            photo = pipeline.photo("receipt.jpg")
+            expected = file_sha256(photo)
+            main.process_file(photo)
+            # Same-content check, analysis and history all use the one hash
+            assert hashed == [photo]
+            assert pipeline.hashes == [expected]
+            assert main.history_manager.find_by_hash(expected) == [photo]
+            # The analysis cache key does not read the file when the hash is passed in
+            if main.analysis_cache is not None:
+                main.lookup_cached_analysis(photo, False, expected)
+                assert hashed == [photo]
+        finally:
+            main.file_sha256, history_manager.file_sha256 = file_sha256, file_sha256
+            pipeline.close()
+    print("[OK] single hash tests passed.")
+
+
+if __name__ == "__main__":
+    test_analysis_request_schema()
+    test_process_file_resumes_saved_stages()
+    test_skipped_files_leave_no_state()
+    test_failed_batch_upload_is_submitted_again()
+    test_backlog_skips_only_the_archive()
+    test_old_files_are_not_opened_for_the_stability_check()
+    test_similar_photos_of_different_receipts_are_uploaded()
+    test_each_photo_is_hashed_once()
@@ -0,0 +1,102 @@
+"""
+Unit tests for the model ladder (no network or .env required).
+"""
+import os
+import asyncio
+import sys
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_router import ModelLadder
+
+GOOD = {"merchant": "마트", "date": "2024-01-01", "confidence": 0.95,
+        "items": [{"item_name": "우유", "quantity": 1, "unit_price": 2000, "total_price": 2000, "category": "식재료"}]}
+USAGE = SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+
+
+def _ladder(validate=None):
+    ticks = iter(range(100))
+    return ModelLadder(["small", "large"], min_confidence=0.8, validate=validate, clock=lambda: next(ticks))
+
+
+def test_accepts_cheap_model_answer():
+    ladder = _ladder()
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        return GOOD, USAGE
+
+    assert ladder.run(call) == GOOD
+    assert calls == ["small"]
+    stats = ladder.get_stats()
+    assert stats["small"]["calls"] == 1 and stats["small"]["prompt_tokens"] == 100
+    assert stats["small"]["avg_seconds"] == 1
+    assert stats["large"]["calls"] == 0
+    print("[OK] Cheap model test passed.")
+
+
+def test_escalates_on_low_confidence_validation_and_errors():
+    answers = {"small": dict(GOOD, confidence=0.3), "large": GOOD}
+    ladder = _ladder()
+    assert ladder.run(lambda model: (answers[model], USAGE)) == GOOD
+
+    ladder = _ladder(validate=lambda data: ["bad date"] if data is not GOOD else [])
+    answers = {"small": dict(GOOD), "large": GOOD}
+    assert ladder.run(lambda model: (answers[model], USAGE)) == GOOD
+
+    def flaky(model):
+        if model == "small":
+            raise RuntimeError("boom")
+        return GOOD, USAGE
+
+    ladder = _ladder()
+    assert ladder.run(flaky) == GOOD
+    stats = ladder.get_stats()
+    assert stats["small"]["errors"] == 1 and stats["small"]["escalations"] == 1
+    assert stats["small"]["escalation_rate"] == 1.0
+    assert stats["large"]["completion_tokens"] == 20
+
+    # Empty answers escalate; the last model's answer is accepted as is
+    ladder = _ladder()
+    assert ladder.run(lambda model: ({"items": []}, None)) == {"items": []}
+    assert ladder.get_stats()["small"]["escalations"] == 1
+    print("[OK] Escalation tests passed.")
+
+
+def test_last_model_errors_propagate_and_subset():
+    ladder = _ladder()
+
+    def failing(model):
+        raise RuntimeError(model)
+
+    try:
+        ladder.run(failing)
+        assert False, "expected RuntimeError"
+    except RuntimeError as e:
+        assert str(e) == "large"
+
+    calls = []
+    ladder.run(lambda model: (calls.append(model), (GOOD, USAGE))[1], [ladder.top_model])
+    assert calls == ["large"]
+    print("[OK] Error/subset tests passed.")
+
+
+def test_run_async():
+    ladder = _ladder()
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        return (dict(GOOD, confidence=0.1) if model == "small" else GOOD), USAGE
+
+    assert asyncio.run(ladder.run_async(call)) == GOOD
+    assert calls == ["small", "large"]
+    print("[OK] Async ladder test passed.")
+
+
+if __name__ == "__main__":
+    test_accepts_cheap_model_answer()
+    test_escalates_on_low_confidence_validation_and_errors()
+    test_last_model_errors_propagate_and_subset()
+    test_run_async()
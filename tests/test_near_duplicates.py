@@ -0,0 +1,64 @@
+"""
+Unit tests for the perceptual-hash near-duplicate index (no network or .env required).
+"""
+import os
+import random
+import tempfile
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from near_duplicates import BKTree, NearDuplicateIndex, hamming_distance
+
+
+def test_bk_tree_matches_brute_force():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    # A few near copies of the first hash
+    hashes += [hashes[0] ^ (1 << bit) for bit in (3, 17, 40)]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+    assert tree.size == len(hashes)
+
+    for query in (hashes[0], rng.getrandbits(64)):
+        for max_distance in (0, 2, 20):
+            expected = sorted(i for i, h in enumerate(hashes) if hamming_distance(h, query) <= max_distance)
+            found = tree.search(query, max_distance)
+            assert sorted(i for _, i in found) == expected
+            assert [d for d, _ in found] == sorted(d for d, _ in found)
+    print("[OK] BKTree tests passed.")
+
+
+def test_index_window_and_persistence():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        index_file = os.path.join(tmpdir, ".near_duplicates")
+        index = NearDuplicateIndex(index_file, max_distance=4, skip_distance=2, window_seconds=600)
+        base = random.Random(1).getrandbits(256)
+        index.add(base, os.path.join(tmpdir, "a.jpg"), 1000.0, receipt="mart|2025-01-15|2|8500")
+
+        match = index.find(base ^ 0b101, 1300.0)
+        assert match.path == os.path.abspath(os.path.join(tmpdir, "a.jpg"))
+        assert match.distance == 2 and index.is_certain(match)
+        # Further away it is only a candidate, to be confirmed by the receipt fingerprint
+        match = index.find(base ^ 0b1111, 1300.0)
+        assert match.distance == 4 and not index.is_certain(match)
+        assert match.receipt == "mart|2025-01-15|2|8500"
+        assert index.find(base ^ 0b11111, 1300.0) is None   # too different
+        assert index.find(base, 1000.0 + 3600) is None       # same picture, but taken much later
+        assert index.skipped == 1
+
+        reloaded = NearDuplicateIndex(index_file, max_distance=4, window_seconds=600)
+        assert reloaded.get_count() == 1
+        assert reloaded.find(base, 1000.0).receipt == "mart|2025-01-15|2|8500"
+
+        # Entries past max_age_days are dropped and the file is compacted
+        expired = NearDuplicateIndex(index_file, max_age_days=-1)
+        assert expired.get_count() == 0
+        with open(index_file, encoding='utf-8') as f:
+            assert f.read() == ""
+    print("[OK] NearDuplicateIndex tests passed.")
+
+
+if __name__ == "__main__":
+    test_bk_tree_matches_brute_force()
+    test_index_window_and_persistence()
@@ -0,0 +1,141 @@
+"""
+Unit tests for NotionClient and NotionValidator against a local fake Notion server.
+"""
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notion_api import NotionClient, NotionQueryError, QueryPaginator
+from notion_validator import NotionValidator
+from tests.fake_notion import FakeNotionServer
+
+
+def test_notion_client_reuses_connections():
+    with FakeNotionServer() as server:
+        client = NotionClient("secret", base_url=server.base_url)
+        assert client.url("/pages") == f"{server.base_url}/pages"
+        assert client.url("https://example.com/x") == "https://example.com/x"
+
+        for i in range(5):
+            response = client.post("/pages", json={"properties": {"항목": {"title": [{"text": {"content": f"item{i}"}}]}}})
+            assert response.status_code == 200
+
+        stats = client.get_stats()
+        assert stats["requests"] == 5
+        assert stats["connections_opened"] == 1
+        assert stats["connections_reused"] == 4
+        client.close()
+    print("[OK] NotionClient connection reuse tests passed.")
+
+
+def test_validator_uses_shared_client():
+    with FakeNotionServer() as server:
+        client = NotionClient("secret", base_url=server.base_url)
+        validator = NotionValidator("secret", server.database_id, client=client)
+        assert validator.client is client
+
+        for i in range(3):
+            server.add_page({"항목": f"item{i}", "날짜": "2025-01-15", "합계": 1000, "사용처": "이마트"})
+        entries = validator.get_all_entries()
+        assert len(entries) == 3
+        assert validator.delete_entry(entries[0]["id"]) is True
+        assert len(validator.get_all_entries()) == 2
+        assert client.get_stats()["connections_opened"] == 1
+    print("[OK] NotionValidator shared client tests passed.")
+
+
+def test_lookups_use_server_side_filters():
+    with FakeNotionServer() as server:
+        client = NotionClient("secret", base_url=server.base_url)
+        validator = NotionValidator("secret", server.database_id, client=client)
+        for i in range(250):
+            server.add_page({"항목": f"item{i}", "날짜": "2025-01-15", "합계": 1000, "사용처": "이마트", "원본파일": "old.jpg"})
+        wanted = [server.add_page({"항목": "우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점", "원본파일": "new.jpg"})["id"]
+                  for _ in range(2)]
+
+        assert validator.find_entries_by_source("new.jpg") == wanted
+        assert validator.find_entries_by_date_merchant("2025-03-01", "편의점") == wanted
+        assert validator.find_entries_by_date_merchant("2025-03-02", "편의점") == []
+
+        queries = [(p, body) for m, p, body in server.requests if p.split("?")[0].endswith("/query")]
+        assert len(queries) == 3  # one small request per lookup, regardless of ledger size
+        path, body = queries[0]
+        assert "filter_properties=s%3Brc" in path
+        assert body["filter"] == {"property": "원본파일", "rich_text": {"equals": "new.jpg"}}
+        assert server.count_requests("GET", "/v1/databases/") == 1  # schema read once
+        client.close()
+    print("[OK] NotionValidator filtered lookup tests passed.")
+
+
+def test_paginator_streams_past_1000_rows_and_resumes():
+    with FakeNotionServer() as server:
+        for i in range(1250):
+            server.add_page({"항목": f"item{i}", "날짜": "2025-01-15", "합계": 1000 + i, "사용처": "이마트"})
+        # Uploaded again a day later: a duplicate, not a repeated line of the same receipt
+        server.add_page({"항목": "item0", "날짜": "2025-01-15", "합계": 1000, "사용처": "이마트"},
+                        created_time="2099-01-01T00:00:00.000Z")
+        client = NotionClient("secret", base_url=server.base_url)
+
+        paginator = QueryPaginator(client, server.database_id)
+        first = next(iter(paginator))
+        assert first["properties"]["항목"]["title"][0]["text"]["content"] == "item0"
+        # The second page is requested while the first one is still being consumed
+        for _ in range(50):
+            if server.count_requests("POST", "/v1/databases/") >= 2:
+                break
+            time.sleep(0.02)
+        assert server.count_requests("POST", "/v1/databases/") == 2
+
+        # Resume from a saved cursor: only the rest of the database is read
+        scan = QueryPaginator(client, server.database_id)
+        seen = 0
+        for _ in scan:
+            seen += 1
+            if seen == 550:
+                break
+        resumed = list(QueryPaginator(client, server.database_id, start_cursor=scan.cursor, prefetch=False))
+        assert scan.cursor == "500"
+        assert len(resumed) == 1251 - 500
+
+        validator = NotionValidator("secret", server.database_id, client=client)
+        assert len(validator.get_all_entries()) == 1251
+        assert len(validator.get_all_entries(max_pages=2)) == 200
+        duplicates = validator.find_duplicates(validator.iter_entries())
+        assert len(duplicates) == 1  # the duplicate is past the old 1000-row cap
+
+        server.fail_queue = [(400, {})]
+        try:
+            list(QueryPaginator(client, server.database_id, prefetch=False))
+            assert False, "expected NotionQueryError"
+        except NotionQueryError:
+            pass
+        client.close()
+    print("[OK] QueryPaginator tests passed.")
+
+
+def test_remove_duplicates_for_uses_filtered_queries():
+    with FakeNotionServer() as server:
+        client = NotionClient("secret", base_url=server.base_url)
+        validator = NotionValidator("secret", server.database_id, client=client)
+        for i in range(150):
+            server.add_page({"항목": f"item{i}", "날짜": "2025-01-15", "합계": 1000, "사용처": "이마트"})
+        server.add_page({"항목": "우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점"},
+                        created_time="2025-03-01T09:00:00.000Z")
+        newest = server.add_page({"항목": "우유", "날짜": "2025-03-01", "합계": 2500, "사용처": "편의점"},
+                                 created_time="2025-03-01T10:00:00.000Z")
+
+        removed = validator.remove_duplicates_for([("우유", "2025-03-01", "편의점", 2500), ("빵", "2025-03-01", "편의점", 3000)])
+        assert removed == 1
+        assert [p["id"] for p in server.live_pages() if p["id"] == newest["id"]]
+        assert server.count_requests("POST", f"/v1/databases/{server.database_id}/query") == 2
+        client.close()
+    print("[OK] filtered duplicate check tests passed.")
+
+
+if __name__ == "__main__":
+    test_notion_client_reuses_connections()
+    test_validator_uses_shared_client()
+    test_lookups_use_server_side_filters()
+    test_paginator_streams_past_1000_rows_and_resumes()
+    test_remove_duplicates_for_uses_filtered_queries()
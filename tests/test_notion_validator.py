@@ -0,0 +1,44 @@
+"""
+Unit tests for NotionValidator.validate_receipt_data (no network or .env required).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notion_validator import NotionValidator
+
+
+def _receipt(**item):
+    base = {"name": "우유", "quantity": 1, "unit_price": 2500, "total_price": 2500, "category": "식재료"}
+    base.update(item)
+    return {"date": "2024-05-01", "merchant": "마트", "items": [base]}
+
+
+def test_validate_receipt_data():
+    validator = NotionValidator("token", "db")
+    assert validator.validate_receipt_data(_receipt()) == []
+
+    # Each bad field is reported against its item
+    data = _receipt(name="", total_price=0, category="음료")
+    data["date"] = "2024/05/01"
+    errors = validator.validate_receipt_data(data)
+    assert len(errors) == 4
+    assert all(e.startswith("Item 1") for e in errors)
+
+    # No printed date (null in the answer) is accepted, so it does not trigger re-analysis
+    data = _receipt()
+    data["date"] = None
+    assert validator.validate_receipt_data(data) == []
+    data["date"] = ""
+    assert len(validator.validate_receipt_data(data)) == 1
+
+    # Non-numeric price and bad quantity
+    assert len(validator.validate_receipt_data(_receipt(total_price="2,500"))) == 1
+    assert len(validator.validate_receipt_data(_receipt(quantity=0))) == 1
+
+    assert validator.validate_receipt_data({"date": "2024-05-01"}) == ["Missing items list"]
+    print("[OK] validate_receipt_data tests passed.")
+
+
+if __name__ == "__main__":
+    test_validate_receipt_data()
@@ -0,0 +1,75 @@
+"""
+Unit tests for TokenBucket (no network or .env required).
+"""
+import os
+import time
+import threading
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import TokenBucket
+from notion_api import NotionClient
+from tests.fake_notion import FakeNotionServer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=3, capacity=6, clock=clock, sleep=clock.sleep)
+
+    # Burst allowance is available immediately
+    for _ in range(6):
+        assert bucket.try_acquire() is True
+    assert bucket.try_acquire() is False
+
+    # Afterwards requests are paced at the average rate
+    for _ in range(9):
+        bucket.acquire()
+    assert abs(clock.now - 3.0) < 1e-6
+
+    # Idle time refills up to capacity only
+    clock.now += 100
+    for _ in range(6):
+        assert bucket.try_acquire() is True
+    assert bucket.try_acquire() is False
+    print("[OK] TokenBucket tests passed.")
+
+
+def test_token_bucket_shared_across_threads():
+    bucket = TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 20 tokens, 5 from the burst, 15 at 50/s → at least ~0.3 s
+    assert time.monotonic() - start >= 0.25
+    print("[OK] TokenBucket threading tests passed.")
+
+
+def test_notion_client_rate_limited():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=3, capacity=2, clock=clock, sleep=clock.sleep)
+    with FakeNotionServer() as server:
+        client = NotionClient("secret", base_url=server.base_url, rate_limiter=bucket)
+        for _ in range(5):
+            assert client.post("/pages", json={"properties": {}}).status_code == 200
+    assert abs(clock.now - 1.0) < 1e-6
+    print("[OK] NotionClient rate limit tests passed.")
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_token_bucket_shared_across_threads()
+    test_notion_client_rate_limited()
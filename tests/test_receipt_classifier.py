@@ -0,0 +1,57 @@
+"""
+Unit tests for ReceiptClassifier (no network or .env required, needs Pillow).
+"""
+import os
+import tempfile
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import ImageDraw
+
+from receipt_classifier import ReceiptClassifier
+from tests.receipt_images import make_text_receipt
+
+
+def _make_landscape(path):
+    img = Image.new("RGB", (4000, 3000))
+    draw = ImageDraw.Draw(img)
+    for y in range(3000):
+        color = (80 + y // 40, 140 + y // 60, 230 - y // 30) if y < 1600 else (40, 120 + y % 50, 40)
+        draw.line((0, y, 4000, y), fill=color)
+    Image.blend(img, Image.effect_noise((4000, 3000), 40).convert("RGB"), 0.2).save(path, quality=90)
+
+
+def _make_portrait(path):
+    img = Image.new("RGB", (3000, 4000), (120, 90, 160))
+    ImageDraw.Draw(img).ellipse((700, 800, 2300, 2800), fill=(225, 180, 150))
+    img.save(path, quality=90)
+
+
+def test_receipt_classifier():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        classifier = ReceiptClassifier(threshold=0.35)
+
+        receipt = os.path.join(tmpdir, "receipt.jpg")
+        make_text_receipt(receipt, seed=3)
+        is_receipt, score = classifier.is_receipt(receipt)
+        assert is_receipt and score > 0.7
+
+        for make in (_make_landscape, _make_portrait):
+            path = os.path.join(tmpdir, make.__name__ + ".jpg")
+            make(path)
+            is_receipt, score = classifier.is_receipt(path)
+            assert not is_receipt and score < 0.35
+
+        # Unreadable images are passed on to the AI rather than dropped
+        broken = os.path.join(tmpdir, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        assert classifier.is_receipt(broken) == (True, None)
+    print("[OK] ReceiptClassifier tests passed.")
+
+
+if __name__ == "__main__":
+    test_receipt_classifier()
@@ -0,0 +1,173 @@
+"""
+Unit tests for RetryPolicy and NotionClient retries (no network or .env required).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retry_policy import RetryPolicy, parse_retry_after
+from notion_api import NotionClient, endpoint_name
+from rate_limiter import TokenBucket
+from notion_validator import NotionValidator
+from tests.fake_notion import FakeNotionServer
+
+
+def _policy(sleeps, **kwargs):
+    return RetryPolicy(sleep=sleeps.append, rng=lambda: 1.0, **kwargs)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("0.5") == 0.5
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # date in the past
+    print("[OK] parse_retry_after tests passed.")
+
+
+def test_retry_policy_call():
+    sleeps = []
+    policy = _policy(sleeps, max_attempts=4, base_delay=1.0, max_delay=3.0, max_total_wait=100)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 4:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert policy.call(flaky, classify=lambda e: 0.0) == "ok"
+    assert sleeps == [1.0, 2.0, 3.0]  # exponential, capped at max_delay
+
+    # Retry-After is a lower bound for the delay
+    assert policy.delay_for(1, retry_after=10) == 10
+
+    # Non-retryable errors are raised immediately
+    sleeps.clear()
+    try:
+        policy.call(lambda: (_ for _ in ()).throw(ValueError("bad")), classify=lambda e: None)
+        assert False
+    except ValueError:
+        pass
+    assert sleeps == []
+
+    # Total wait budget stops retries early
+    budget = _policy(sleeps, max_attempts=10, base_delay=1.0, max_total_wait=2.5)
+    try:
+        budget.call(lambda: (_ for _ in ()).throw(ConnectionError()), classify=lambda e: 0.0)
+        assert False
+    except ConnectionError:
+        pass
+    assert sum(sleeps) <= 2.5
+    print("[OK] RetryPolicy tests passed.")
+
+
+def test_endpoint_name():
+    assert endpoint_name("POST", "/pages") == "pages.create"
+    assert endpoint_name("POST", "https://api.notion.com/v1/pages") == "pages.create"
+    assert endpoint_name("PATCH", "https://api.notion.com/v1/pages/abc") == "pages.patch"
+    assert endpoint_name("POST", "http://127.0.0.1:1/v1/databases/db/query") == "databases.query"
+    print("[OK] endpoint_name tests passed.")
+
+
+def test_notion_client_retries_throttling():
+    sleeps = []
+    with FakeNotionServer() as server:
+        limiter = TokenBucket(rate=1000, capacity=1000)
+        client = NotionClient("secret", base_url=server.base_url, rate_limiter=limiter,
+                              retry_policies={"default": _policy(sleeps, base_delay=0.01)})
+        server.fail_queue = [(429, {"Retry-After": "0.05"}), (503, {})]
+        response = client.post("/pages", json={"properties": {"항목": {"title": [{"text": {"content": "우유"}}]}}})
+        assert response.status_code == 200
+        assert len(server.live_pages()) == 1
+        assert client.get_stats()["retries"] == 2
+        # Retry-After was applied to the shared limiter
+        assert limiter.waited_seconds >= 0.04
+
+        # Persistent failure returns the last response once the budget is used up
+        server.fail_queue = [(502, {})] * 10
+        response = client.get(f"/databases/{server.database_id}")
+        assert response.status_code == 502
+    print("[OK] NotionClient throttling retry tests passed.")
+
+
+def test_page_create_not_duplicated_after_ambiguous_error():
+    sleeps = []
+    with FakeNotionServer() as server:
+        client = NotionClient("secret", base_url=server.base_url,
+                              retry_policies={"default": _policy(sleeps, base_delay=0.01)})
+        validator = NotionValidator("secret", server.database_id, client=client)
+        payload = {"parent": {"database_id": server.database_id}, "properties": {
+            "항목": {"title": [{"text": {"content": "우유"}}]},
+            "날짜": {"date": {"start": "2025-01-15"}},
+            "합계": {"number": 2500},
+            "사용처": {"rich_text": [{"text": {"content": "이마트"}}]},
+        }}
+        since = "2000-01-01T00:00:00.000Z"
+        check = lambda: validator.find_created_page(payload["properties"], since)
+
+        # 500 and nothing was written → the create is retried once the check finds no page
+        server.fail_queue = [(500, {})]
+        assert client.post("/pages", json=payload, applied_check=check).status_code == 200
+        assert len(server.live_pages()) == 1
+
+        # Ambiguous 500 without a check → not retried
+        server.fail_queue = [(500, {})]
+        assert client.post("/pages", json=payload).status_code == 500
+        assert len(server.live_pages()) == 1
+
+        # The page already exists (write went through before the error) → no second create
+        original = server.dispatch
+        def create_then_fail(method, path, body, params=None):
+            status, result = original(method, path, body, params)
+            if method == "POST" and path == "/v1/pages":
+                return 504, {"object": "error", "status": 504}
+            return status, result
+        server.dispatch = create_then_fail
+        before = len(server.live_pages())
+        response = client.post("/pages", json=payload, applied_check=check)
+        assert response.status_code == 200
+        assert response.json()["object"] == "page"
+        assert len(server.live_pages()) == before + 1
+    print("[OK] idempotent page create tests passed.")
+
+
+def test_ambiguous_create_does_not_claim_identical_sibling():
+    sleeps = []
+    with FakeNotionServer() as server:
+        client = NotionClient("secret", base_url=server.base_url,
+                              retry_policies={"default": _policy(sleeps, base_delay=0.01)})
+        validator = NotionValidator("secret", server.database_id, client=client)
+        payload = {"parent": {"database_id": server.database_id}, "properties": {
+            "항목": {"title": [{"text": {"content": "우유"}}]},
+            "날짜": {"date": {"start": "2025-01-15"}},
+            "합계": {"number": 2500},
+            "사용처": {"rich_text": [{"text": {"content": "이마트"}}]},
+        }}
+        since = "2000-01-01T00:00:00.000Z"
+
+        # The first of two identical lines is created normally
+        claimed = [client.post("/pages", json=payload).json()["id"]]
+
+        # The second fails with nothing written: the sibling's page must not count as its own
+        server.fail_queue = [(502, {})]
+        check = lambda: validator.find_created_page(payload["properties"], since, claimed)
+        response = client.post("/pages", json=payload, applied_check=check)
+        assert response.status_code == 200
+        assert response.json()["id"] not in claimed
+        assert len(server.live_pages()) == 2
+
+        # Once both are claimed, no match is left
+        claimed.append(response.json()["id"])
+        assert validator.find_created_page(payload["properties"], since, claimed) is None
+        assert validator.find_created_page(payload["properties"], since)["id"] in claimed
+    print("[OK] identical-line applied-check tests passed.")
+
+
+if __name__ == "__main__":
+    test_parse_retry_after()
+    test_retry_policy_call()
+    test_endpoint_name()
+    test_notion_client_retries_throttling()
+    test_page_create_not_duplicated_after_ambiguous_error()
+    test_ambiguous_create_does_not_claim_identical_sibling()
@@ -0,0 +1,98 @@
+"""
+Unit tests for the file stability monitor (no network or .env required).
+"""
+import os
+import time
+import tempfile
+import threading
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stability import FileStabilityMonitor, file_signature, is_file_ready, wait_until_stable
+
+
+def test_file_signature():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "receipt.jpg")
+        assert file_signature(path) is None
+        open(path, "wb").close()
+        assert is_file_ready(path) is False  # 0 bytes
+        with open(path, "wb") as f:
+            f.write(b"data")
+        assert is_file_ready(path) is True
+        assert wait_until_stable(path, initial_delay=0.01, max_wait=1) is True
+        assert wait_until_stable(os.path.join(tmpdir, "missing.jpg"), initial_delay=0.01, max_wait=0.1) is False
+    print("[OK] file_signature tests passed.")
+
+
+def test_stability_monitor():
+    ready = []
+    timed_out = []
+    done = threading.Event()
+
+    def on_ready(path):
+        ready.append(os.path.basename(path))
+        if len(ready) == 2:
+            done.set()
+
+    monitor = FileStabilityMonitor(on_ready, on_timeout=lambda p: timed_out.append(os.path.basename(p)),
+                                   initial_delay=0.02, max_delay=0.1, max_wait=0.5)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        complete = os.path.join(tmpdir, "complete.jpg")
+        growing = os.path.join(tmpdir, "growing.jpg")
+        missing = os.path.join(tmpdir, "missing.jpg")
+        with open(complete, "wb") as f:
+            f.write(b"x" * 100)
+        with open(growing, "wb") as f:
+            f.write(b"x")
+
+        monitor.start()
+        assert monitor.watch(complete) is True
+        assert monitor.watch(complete) is False  # already pending
+        monitor.watch(growing)
+        monitor.watch(missing)
+
+        # Keep the growing file changing for a while
+        for _ in range(3):
+            time.sleep(0.03)
+            with open(growing, "ab") as f:
+                f.write(b"x")
+
+        assert done.wait(3)
+        time.sleep(0.7)
+        monitor.stop(timeout=2)
+
+    assert sorted(ready) == ["complete.jpg", "growing.jpg"]
+    assert timed_out == ["missing.jpg"]
+    assert monitor.pending_count() == 0
+    print("[OK] FileStabilityMonitor tests passed.")
+
+
+def test_stability_monitor_requeues_when_not_accepted():
+    attempts = []
+    accepted = threading.Event()
+
+    def on_ready(path):
+        attempts.append(path)
+        if len(attempts) < 3:
+            return False  # queue full
+        accepted.set()
+        return True
+
+    monitor = FileStabilityMonitor(on_ready, initial_delay=0.01, max_delay=0.02, max_wait=0.05)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "receipt.jpg")
+        with open(path, "wb") as f:
+            f.write(b"data")
+        monitor.start()
+        monitor.watch(path)
+        assert accepted.wait(3)
+        monitor.stop(timeout=2)
+    assert len(attempts) == 3
+    print("[OK] FileStabilityMonitor requeue tests passed.")
+
+
+if __name__ == "__main__":
+    test_file_signature()
+    test_stability_monitor()
+    test_stability_monitor_requeues_when_not_accepted()
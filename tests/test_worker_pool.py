@@ -0,0 +1,66 @@
+"""
+Unit tests for ReceiptWorkerPool (no network or .env required).
+"""
+import os
+import threading
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker_pool import ReceiptWorkerPool
+
+
+def test_worker_pool():
+    processed = []
+    started = threading.Semaphore(0)
+    release = threading.Event()
+
+    def handler(filepath):
+        started.release()
+        release.wait(5)
+        processed.append(filepath)
+
+    pool = ReceiptWorkerPool(handler, num_workers=2, max_queue_size=2)
+    pool.start()
+
+    # Duplicate submissions of an in-flight path are ignored
+    assert pool.submit("/photos/a.jpg") is True
+    assert pool.submit("/photos/a.jpg") is False
+    assert pool.is_in_flight("/photos/a.jpg") is True
+
+    # Two workers busy + two queued slots; the next non-blocking submit hits backpressure
+    assert pool.submit("/photos/b.jpg") is True
+    # Both workers have taken their file off the queue
+    assert started.acquire(timeout=5) and started.acquire(timeout=5)
+    assert pool.submit("/photos/c.jpg") is True
+    assert pool.submit("/photos/d.jpg") is True
+    assert pool.submit("/photos/e.jpg", block=False) is False
+    assert pool.pending_count() == 4
+
+    # Shutdown drains everything that was accepted
+    release.set()
+    pool.shutdown(wait=True, timeout=5)
+    assert sorted(os.path.basename(p) for p in processed) == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+    assert pool.pending_count() == 0
+
+    # No new work after shutdown
+    assert pool.submit("/photos/f.jpg") is False
+
+    # Handler exceptions do not kill the worker
+    results = []
+
+    def flaky(filepath):
+        if filepath.endswith("bad.jpg"):
+            raise RuntimeError("boom")
+        results.append(filepath)
+
+    pool2 = ReceiptWorkerPool(flaky, num_workers=1, max_queue_size=10)
+    pool2.start()
+    pool2.submit("/photos/bad.jpg")
+    pool2.submit("/photos/good.jpg")
+    pool2.shutdown(wait=True, timeout=5)
+    assert [os.path.basename(p) for p in results] == ["good.jpg"]
+    print("[OK] ReceiptWorkerPool tests passed.")
+
+
+if __name__ == "__main__":
+    test_worker_pool()
@@ -0,0 +1,112 @@
+import os
+import queue
+import logging
+import threading
+
+class ReceiptWorkerPool:
+    """Bounded work queue with a fixed pool of worker threads for receipt files."""
+
+    _STOP = object()
+
+    def __init__(self, handler, num_workers=2, max_queue_size=100):
+        """
+        Args:
+            handler: Callable invoked with a file path for each queued file
+            num_workers: Number of worker threads
+            max_queue_size: Maximum number of queued (not yet started) files
+        """
+        self.handler = handler
+        self.num_workers = max(1, int(num_workers))
+        self.queue = queue.Queue(maxsize=max(1, int(max_queue_size)))
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.accepting = False
+
+    def start(self):
+        """Starts the worker threads."""
+        if self.workers:
+            return
+        self.accepting = True
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"receipt-worker-{i + 1}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        logging.info(f"Started {self.num_workers} receipt workers (queue size {self.queue.maxsize})")
+
+    def submit(self, filepath, block=True, timeout=None):
+        """
+        Queues a file for processing.
+
+        Blocks while the queue is full (backpressure) unless block=False.
+        Files that are already queued or being processed are ignored.
+
+        Returns:
+            True if the file was queued, False otherwise
+        """
+        abs_path = os.path.abspath(filepath)
+        with self.lock:
+            if not self.accepting or abs_path in self.in_flight:
+                return False
+            self.in_flight.add(abs_path)
+        try:
+            self.queue.put(abs_path, block=block, timeout=timeout)
+        except queue.Full:
+            with self.lock:
+                self.in_flight.discard(abs_path)
+            logging.warning(f"[대기열 가득 참] 나중에 다시 시도: {abs_path}")
+            return False
+        return True
+
+    def is_in_flight(self, filepath):
+        """Checks if a file is queued or currently being processed."""
+        with self.lock:
+            return os.path.abspath(filepath) in self.in_flight
+
+    def pending_count(self):
+        """Returns the number of queued or in-progress files."""
+        with self.lock:
+            return len(self.in_flight)
+
+    def _worker_loop(self):
+        while True:
+            filepath = self.queue.get()
+            try:
+                if filepath is self._STOP:
+                    return
+                try:
+                    self.handler(filepath)
+                except Exception as e:
+                    logging.exception(f"Worker error processing {filepath}: {e}")
+                finally:
+                    with self.lock:
+                        self.in_flight.discard(filepath)
+            finally:
+                self.queue.task_done()
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stops accepting new files and stops the workers.
+
+        Args:
+            wait: If True, files already queued are processed before workers exit.
+                  If False, queued files are discarded.
+            timeout: Maximum seconds to wait for each worker to finish
+        """
+        with self.lock:
+            self.accepting = False
+        if not wait:
+            while True:
+                try:
+                    filepath = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                with self.lock:
+                    self.in_flight.discard(filepath)
+                self.queue.task_done()
+        for _ in self.workers:
+            self.queue.put(self._STOP)
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+        logging.info("Receipt workers stopped.")